@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+Readable Filenames - 強い保存の材料集め（StrongSaveWindow）の順序の確認
+
+StrongSaveWindow._genre_index（applied_current.genres の索引）+ _materials_from_selected_genres が、
+索引を使わずにキーの並び順で集めた結果と、順序まで同じかを見る。
+正規化すると同じジャンルになるキー（"アニメ" / " アニメ "、"" / "その他"）と、キーをまたいで重なる材料を混ぜる。
+Tk の窓は作らない。違えば内容を出して終了コード 1。
+
+使い方:
+    python ReadableFilenames_check_materials.py
+"""
+import sys
+from types import SimpleNamespace
+
+from ReadableFilenames_workshop import StrongSaveWindow, normalize_genre
+
+# 「音楽」が「アニメ」と「 アニメ 」の間にあるのが肝（まとめると順序が変わる）
+GENRES = {
+    "アニメ": ["a1", "shared", "a2"],
+    "音楽": ["m1", "shared2", "x"],
+    " アニメ ": ["a3", "m1", "a1"],
+    "": ["e1", " ", "shared"],
+    "ドラマ": ["d1"],
+    "その他": ["o1", "e1", "shared2"],
+    "未分類": [],
+}
+SELECTIONS = (
+    ["アニメ"],
+    ["その他"],
+    ["音楽", "アニメ"],
+    ["アニメ", "音楽"],
+    ["その他", "音楽"],
+    ["アニメ", "音楽", "ドラマ", "その他", "未分類"],
+    [],
+)
+
+
+def reference(gs: dict, selected):
+    """索引を使わない材料集め（キーの並び順に見て、選択ジャンルの材料を重複なしで）。"""
+    want = set(normalize_genre(g) for g in selected if str(g).strip())
+    out = []
+    seen = set()
+    for g, lst in gs.items():
+        if normalize_genre(g) not in want:
+            continue
+        for p in lst:
+            p2 = str(p).strip()
+            if p2 and p2 not in seen:
+                seen.add(p2)
+                out.append(p2)
+    return out
+
+
+def check(gs: dict = GENRES, selections=SELECTIONS) -> list:
+    """Returns: 違った選択の [(選択, 期待, 実際), ...]（空なら一致）"""
+    names, mats = StrongSaveWindow._genre_index(None, gs)
+    cache = {"genres": names, "materials": mats}
+    empty = {"genres": [], "materials": []}
+    host = SimpleNamespace(_state_cache=lambda: cache, _weakmid_cache=lambda: empty)
+    bad = []
+    for sel in selections:
+        got = StrongSaveWindow._materials_from_selected_genres(host, sel)
+        want = reference(gs, sel)
+        if got != want:
+            bad.append((sel, want, got))
+    return bad
+
+
+def main() -> int:
+    bad = check()
+    for sel, want, got in bad:
+        print(f"NG {sel!r}\n  want: {want}\n  got : {got}")
+    if bad:
+        return 1
+    print(f"ok ({len(SELECTIONS)} selections)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,699 @@
+# -*- coding: utf-8 -*-
+"""
+Readable Filenames - 中身（Tk なし）
+
+viewer / workshop の両方が使う処理をここに置く。tkinter を読まないので、
+ベンチマーク・一括処理・プロセスプールの子プロセス（強の検証）からも軽く読める。
+
+- 検索モードの候補生成: compile_genre_patterns / apply_compiled_patterns / apply_patterns_for_genre
+- 候補 key の数字割合: key_filter_stats / key_digit_ratio
+- フォルダ → ジャンルの割当: normalize_genre_map / PathTrie / build_genre_trie
+- フォルダの走査: scan_folder（viewer の読み込み）/ scan_raw_names（工房の検証）
+- 工房の式: extract_bracket_tokens / parse_ai_blocks / compile_rule / apply_rules_once / apply_rules_trace
+- 保存工房（強）のローカル合成と検証: literal_from_pattern / build_trie_regex / merge_literal_materials /
+  diff_pattern_outputs / verify_merged_patterns
+
+GUI 側は同じ名前で読み直して使う（ReadableFilenames_viewer.apply_patterns_for_genre なども今まで通り）。
+"""
+import os
+import re
+import time
+from array import array
+
+import ReadableFilenames_metrics as rf_metrics
+import ReadableFilenames_rowindex as rf_rows
+
+
+# =====================
+# 検索モードの候補生成
+# =====================
+def minimal_clean_for_search(title: str) -> str:
+    s = (title or "").strip()
+    while "  " in s:
+        s = s.replace("  ", " ")
+    return s
+
+
+def compile_genre_patterns(applied_state: dict, genre_name: str):
+    """apply_patterns_for_genre の「式の選択・並べ替え・コンパイル」だけを1回行う。
+
+    フォルダ全体に同じジャンルを当てるときは、これを使い回して apply_compiled_patterns で当てる。
+    Returns: コンパイル済みの式リスト。何もしない（元の文字列のまま返す）場合は None
+    """
+    if not applied_state or not isinstance(applied_state, dict):
+        return None
+
+    genres = applied_state.get("genres")
+    if not isinstance(genres, dict):
+        return None
+
+    # mix: 未分類 + 選択ジャンル
+    selected = []
+    for g in ("未分類", genre_name):
+        lst = genres.get(g)
+        if isinstance(lst, list):
+            selected.extend([str(x) for x in lst])
+
+    if not selected:
+        return None
+
+    order = applied_state.get("order")
+    if isinstance(order, list) and order:
+        sel_set = set(selected)
+        ordered = [p for p in order if p in sel_set]
+        # allow patterns present but not in order
+        ord_set = set(ordered)
+        tail = [p for p in selected if p not in ord_set]
+        patterns = ordered + tail
+    else:
+        patterns = selected
+
+    compiled = []
+    for pat in patterns:
+        try:
+            compiled.append(re.compile(pat))
+        except Exception:
+            # ignore broken patterns; user responsibility
+            continue
+    return compiled
+
+
+def apply_compiled_patterns(raw_title: str, compiled) -> str:
+    s = (raw_title or "")
+    if compiled is None:
+        return s
+    for rx in compiled:
+        try:
+            s = rx.sub(" ", s)
+        except Exception:
+            continue
+    # normalize spaces after removals (avoid word-join accidents)
+    s = re.sub(r"\s+", " ", s).strip()
+    return s
+
+
+def apply_patterns_for_genre(raw_title: str, applied_state: dict, genre_name: str) -> str:
+    """保存工房で最後に［適用］した式を、検索モードの候補生成にだけ反映する。
+
+    ルール（確定仕様）:
+    - 検索モードは「最後に適用した状態」だけを見る
+    - ジャンルを選ぶと、そのジャンルに属する式（＋未分類）を混ぜて適用する
+    - 失敗（例: 正規表現エラー）はその式だけ無視する（候補生成を止めない）
+    """
+    return apply_compiled_patterns(raw_title, compile_genre_patterns(applied_state, genre_name))
+
+
+# ---------- key filter (数字だらけ・短すぎる候補を隠す) ----------
+_KEY_SEP_RE = re.compile(r"[\s\-_.()\[\]{}<>【】『』「」]+")
+
+
+def key_filter_stats(key: str):
+    """候補 key の (記号を除いた長さ, 数字数, 文字数)。key を作ったときに1回だけ数える。"""
+    t = (key or "").strip()
+    t2 = _KEY_SEP_RE.sub("", t) if t else ""
+    return len(t2), sum(ch.isdigit() for ch in t2), sum(ch.isalpha() for ch in t2)
+
+
+def key_digit_ratio(digits: int, letters: int) -> float:
+    """数字の割合。数字なしは 0.0、文字なしで数字だけなら 1.0（どの強さでも隠れる）。"""
+    if digits == 0:
+        return 0.0
+    if letters == 0:
+        return 1.0
+    return digits / max(1, digits + letters)
+
+
+# ---------- folder prefix -> genre ----------
+def normalize_genre_map(entries):
+    """[{"prefix": "anime", "genre": "アニメ"}, ...] を整える（空は捨てる。同じ prefix は後勝ち）。"""
+    out = {}
+    if isinstance(entries, list):
+        for d in entries:
+            if not isinstance(d, dict):
+                continue
+            prefix = str(d.get("prefix", "") or "").strip().rstrip("\\/")
+            genre = str(d.get("genre", "") or "").strip()
+            if prefix and genre:
+                out[prefix] = genre
+    return [{"prefix": k, "genre": v} for k, v in out.items()]
+
+
+def _path_parts(path: str):
+    p = os.path.normcase(os.path.normpath(path or ""))
+    return [x for x in re.split(r"[\\/]+", p) if x]
+
+
+class PathTrie:
+    """フォルダの部品ごとの木。lookup は一番深く一致した prefix の値を返す（O(深さ)）。"""
+
+    def __init__(self):
+        self.root = {}
+        self.size = 0
+
+    def insert(self, path: str, value):
+        node = self.root
+        for part in _path_parts(path):
+            node = node.setdefault(part, {})
+        if None not in node:
+            self.size += 1
+        node[None] = value
+
+    def lookup(self, path: str):
+        node = self.root
+        found = node.get(None)
+        for part in _path_parts(path):
+            node = node.get(part)
+            if node is None:
+                break
+            if None in node:
+                found = node[None]
+        return found
+
+
+def build_genre_trie(genre_map, base_folder: str):
+    """相対 prefix は読み込んだフォルダ（base_folder）からの相対として扱う。割当が無ければ None。"""
+    entries = normalize_genre_map(genre_map)
+    if not entries:
+        return None
+    trie = PathTrie()
+    for d in entries:
+        prefix = d["prefix"]
+        if not os.path.isabs(prefix):
+            prefix = os.path.join(base_folder or "", prefix)
+        trie.insert(prefix, d["genre"])
+    return trie
+
+
+# =====================
+# フォルダの走査（viewer の読み込み）
+# =====================
+def scan_folder(folder: str, args: dict, *, open_writers=None, discard=None, auto_rows=None):
+    """フォルダを1回歩いて (RowStore か MmapRowStore, key 列) を返す。Tk には触らない（裏スレッドでも呼ぶ）。
+
+    「フォルダ → 割当ジャンル」はディレクトリごとに1回引き、そのジャンルの式で key まで作る。
+    args: {"genre_map", "genre", "applied", "mode"}（mode は "memory" / "mmap" / "auto"）
+    open_writers() -> (RowIndexWriter, KeyColumnWriter): mmap に流すときの書き手（無ければいつもメモリ）
+    auto: 走査中に auto_rows 件を超えたら、そこまでの行を書き手へ移して残りも流す
+    discard(path): 失敗したときに書きかけのファイルを消す
+    """
+    scan = rf_rows.RowStore()
+    keys = []
+    disk = None  # (RowIndexWriter, KeyColumnWriter)
+    mode = args["mode"] if open_writers is not None else "memory"
+    trie = build_genre_trie(args["genre_map"], folder)
+    applied = args["applied"]
+    pipes = {}
+    try:
+        if mode == "mmap":
+            disk = open_writers()
+        for root, _dirs, files in os.walk(folder):
+            mapped = trie.lookup(root) if trie is not None else None  # ディレクトリごとに1回
+            g = mapped or args["genre"]
+            if g not in pipes:
+                pipes[g] = compile_genre_patterns(applied, g)
+            compiled = pipes[g]
+            dir_id = None
+            for name in files:
+                p = os.path.join(root, name)
+                if not os.path.isfile(p):
+                    continue
+                if dir_id is None:
+                    dir_id = scan.add_dir(os.path.basename(root) or "", root, mapped)
+                raw = os.path.splitext(name)[0]
+                key = minimal_clean_for_search(apply_compiled_patterns(raw, compiled))
+                if disk is not None:
+                    disk[0].append(raw, dir_id)
+                    disk[1].add(key, dir_id)
+                    continue
+                scan.append(raw, dir_id)
+                keys.append(key)
+                if mode == "auto" and auto_rows and len(keys) >= auto_rows:
+                    disk = open_writers()
+                    for i, k in enumerate(keys):
+                        disk[0].append(scan.raws[i], scan.dir_ids[i])
+                        disk[1].add(k, scan.dir_ids[i])
+                    scan.raws, scan.dir_ids, keys = [], array("I"), []
+        if disk is not None:
+            scan = disk[0].finish(scan.dirs)
+            keys = disk[1].finish(scan.dirs)
+    except Exception:
+        if disk is not None:
+            for w in disk:
+                w.abort()
+                if discard is not None:
+                    discard(w.path)
+        raise
+    return scan, keys
+
+
+# =====================
+# Bracket pairs (Stage1: bracket token observation)
+# =====================
+DEFAULT_BRACKET_PAIRS = [
+    ("(", ")"),
+    ("[", "]"),
+    ("{", "}"),
+    ("<", ">"),
+    ("（", "）"),
+    ("［", "］"),
+    ("｛", "｝"),
+    ("＜", "＞"),
+    ("【", "】"),
+    ("〔", "〕"),
+    ("〈", "〉"),
+    ("《", "》"),
+    ("「", "」"),
+    ("『", "』"),
+    ("〝", "〟"),
+    ("｢", "｣"),
+    ("‹", "›"),
+    ("«", "»"),
+]
+
+@rf_metrics.timed("workshop.extract_bracket_tokens")
+def extract_bracket_tokens(lines, bracket_pairs=None):
+    """Mechanical observation only.
+
+    - Extract 'open + inside + close' as ONE token (no splitting).
+    - No interpretation. No generalization.
+    - Deduplicate by exact string match; also count occurrences.
+
+    Returns: list of dicts: {"token": str, "count": int}
+    """
+    if bracket_pairs is None:
+        bracket_pairs = DEFAULT_BRACKET_PAIRS
+    pairs = [(str(a), str(b)) for a, b in bracket_pairs if str(a) and str(b)]
+    counts = {}
+    for raw in (lines or []):
+        s = str(raw or "")
+        if not s:
+            continue
+        for op, cl in pairs:
+            start = 0
+            while True:
+                i = s.find(op, start)
+                if i < 0:
+                    break
+                j = s.find(cl, i + len(op))
+                if j < 0:
+                    break
+                tok = s[i:j + len(cl)]
+                if tok:
+                    counts[tok] = counts.get(tok, 0) + 1
+                start = j + len(cl)
+    items = [{"token": k, "count": v} for k, v in counts.items()]
+    items.sort(key=lambda d: (-d["count"], d["token"]))
+    return items
+
+
+# =====================
+# 工房の式（AI 回答の取り込み・弱ルールの適用）
+# =====================
+def parse_ai_blocks(text: str):
+    """ブラウザのAI回答を取り込み。
+
+    Stage1（括弧トークン）では、AIは **pattern: 行のみ** を返す運用がある。
+    そのため、次の2系統を受け入れる。
+
+    A) 従来ブロック:
+       name: ...
+       pattern: ...
+       注意: ...
+
+    B) 最小ブロック（推奨）:
+       pattern: ...
+
+    取り込み時のルール:
+    - 1行=1式（pattern）
+    - name が無い場合は空文字のまま保存する（命名しない方針）
+    - why は無視（保存しない）
+    """
+    lines = text.splitlines()
+    blocks = []
+    cur = {"name": "", "pattern": "", "note": ""}
+    state = None
+
+    def flush():
+        nonlocal cur
+        pat = (cur.get("pattern") or "").strip()
+        if pat:
+            blocks.append({
+                "enabled": True,
+                "tier": "WEAK",
+                "name": (cur.get("name") or "").strip(),
+                "pattern": pat,
+                "note": (cur.get("note") or "").strip(),
+            })
+        cur = {"name": "", "pattern": "", "note": ""}
+
+    for raw in lines:
+        line = raw.rstrip("\n")
+        m = re.match(r"^\s*(name|pattern|why|注意)\s*:\s*(.*)$", line)
+        if m:
+            key = m.group(1)
+            val = m.group(2)
+            if key == "name":
+                if (cur.get("pattern") or "").strip():
+                    flush()
+                state = "name"
+                cur["name"] = val
+            elif key == "pattern":
+                if (cur.get("pattern") or "").strip():
+                    flush()
+                state = "pattern"
+                cur["pattern"] = val
+            elif key == "注意":
+                state = "note"
+                cur["note"] = val
+            else:
+                state = "why"
+            continue
+
+        if state == "pattern":
+            if line.strip():
+                cur["pattern"] = (cur["pattern"] + " " + line.strip()).strip()
+        elif state == "note":
+            if line.strip():
+                cur["note"] = (cur["note"] + "\n" + line.strip()).strip()
+
+    flush()
+    return blocks
+
+def _strip_rule_quotes(pattern: str) -> str:
+    p = (pattern or "").strip()
+    # r"..." / r'...' 形式を剥ぐ
+    if (p.startswith('r"') and p.endswith('"')) or (p.startswith("r'") and p.endswith("'")):
+        p = p[2:-1]
+    # "..." / '...' を剥ぐ
+    if (p.startswith('"') and p.endswith('"')) or (p.startswith("'") and p.endswith("'")):
+        p = p[1:-1]
+    return p
+
+
+def compile_rule(pattern: str):
+    return re.compile(_strip_rule_quotes(pattern))
+
+
+def apply_rules_once(s: str, rules):
+    out = s
+    for r in rules:
+        if not r.get("enabled", True):
+            continue
+        pat = (r.get("pattern") or "").strip()
+        if not pat:
+            continue
+        try:
+            rx = compile_rule(pat)
+            out = rx.sub(" ", out)
+        except Exception:
+            continue
+    out = re.sub(r"\s+", " ", out).strip()
+    return out
+
+
+def apply_rules_trace(s: str, rules):
+    """Apply rules sequentially and return (result, hits).
+    hits is a list of rule labels that actually changed the text.
+    """
+    out = s
+    hits = []
+    for i, r in enumerate(rules):
+        if not r.get("enabled", True):
+            continue
+        pat = (r.get("pattern") or "").strip()
+        if not pat:
+            continue
+        try:
+            rx = compile_rule(pat)
+            before = out
+            out = rx.sub(" ", out)
+            if out != before:
+                name = str(r.get("name") or "").strip()
+                label = f"#{i+1} {name}".strip()
+                hits.append(label)
+        except Exception:
+            continue
+    out = re.sub(r"\s+", " ", out).strip()
+    return out, hits
+
+
+# =====================
+# 保存工房（強）: ローカル合成（リテラル材料 → 1本の trie 正規表現）
+# =====================
+_RX_SPECIAL = set(".^$*+?{}[]\\|()")
+_DIGIT_RUN = object()  # trie 上の「\d+」ノード
+
+
+def literal_from_pattern(pattern: str):
+    """材料 pattern が re.escape 相当のリテラルなら元の文字列を返す。そうでなければ None。
+
+    - \\ + 英数字（\\d, \\b など）は式とみなす
+    - エスケープされていない特殊文字があれば式とみなす
+    """
+    p = _strip_rule_quotes(pattern)
+    if not p:
+        return None
+    out = []
+    i = 0
+    while i < len(p):
+        ch = p[i]
+        if ch == "\\":
+            if i + 1 >= len(p):
+                return None
+            nxt = p[i + 1]
+            if nxt.isascii() and nxt.isalnum():
+                return None
+            out.append(nxt)
+            i += 2
+            continue
+        if ch in _RX_SPECIAL:
+            return None
+        out.append(ch)
+        i += 1
+    return "".join(out)
+
+
+def _literal_units(s: str, generalize_digits: bool):
+    if not generalize_digits:
+        return tuple(s)
+    units = []
+    for part in re.split(r"([0-9]+)", s):
+        if not part:
+            continue
+        if part.isdigit():
+            units.append(_DIGIT_RUN)
+        else:
+            units.extend(part)
+    return tuple(units)
+
+
+def _trie_alternatives(node):
+    """node 直下の分岐を正規表現の断片（選択肢）のリストにする。"""
+    groups = {}  # rendered suffix -> [unit]
+    for unit, child in node.get("children", {}).items():
+        groups.setdefault(_render_trie(child), []).append(unit)
+
+    def _unit_key(u):
+        return (1, "") if u is _DIGIT_RUN else (0, u)
+
+    alts = []
+    for suffix, units in groups.items():
+        units.sort(key=_unit_key)
+        chars = [u for u in units if u is not _DIGIT_RUN]
+        if len(chars) >= 2:
+            cls = "[" + "".join(re.escape(c) for c in chars) + "]"
+            alts.append((_unit_key(chars[0]), cls + suffix))
+        elif chars:
+            alts.append((_unit_key(chars[0]), re.escape(chars[0]) + suffix))
+        if _DIGIT_RUN in units:
+            alts.append((_unit_key(_DIGIT_RUN), r"\d+" + suffix))
+    alts.sort(key=lambda a: a[0])
+    return [a[1] for a in alts]
+
+
+def _render_trie(node) -> str:
+    parts = _trie_alternatives(node)
+    if not parts:
+        return ""
+    if len(parts) == 1:
+        body = parts[0]
+        if not node.get("end"):
+            return body
+        atom = len(body) == 1 or re.fullmatch(r"\\.|\[[^\]]*\]", body)
+        return body + "?" if atom else "(?:" + body + ")?"
+    return "(?:" + "|".join(parts) + ")" + ("?" if node.get("end") else "")
+
+
+def build_trie_regex(literals, *, generalize_digits=False) -> str:
+    """リテラル列を prefix-trie にまとめた 1本の正規表現を返す（決定的）。
+
+    - 共通接頭辞をくくり出し、同じ後続をもつ1文字の分岐は文字クラスにまとめる
+    - generalize_digits=True のとき、数字の並びだけが違うリテラル同士を \\d+ にまとめる
+      （数字違いの仲間がいないリテラルはそのまま残す）
+    """
+    lits = []
+    seen = set()
+    for s in (literals or []):
+        s = str(s or "")
+        if s and s not in seen:
+            seen.add(s)
+            lits.append(s)
+    if not lits:
+        return ""
+
+    shapes = {}
+    if generalize_digits:
+        for s in lits:
+            shapes.setdefault(re.sub(r"[0-9]+", "0", s), []).append(s)
+
+    root = {"children": {}}
+    for s in lits:
+        gen = generalize_digits and len(shapes.get(re.sub(r"[0-9]+", "0", s), [])) >= 2
+        node = root
+        for u in _literal_units(s, gen):
+            node = node["children"].setdefault(u, {"children": {}})
+        node["end"] = True
+
+    # top-level: 外側のグループは不要
+    return "|".join(_trie_alternatives(root))
+
+
+def merge_literal_materials(patterns, *, generalize_digits=False):
+    """材料 pattern 群をローカルで合成する。
+
+    Returns: (merged_patterns, literal_count)
+      merged_patterns … [trie式] + リテラルでなかった材料（元の順序のまま）
+    """
+    literals = []
+    others = []
+    for p in (patterns or []):
+        lit = literal_from_pattern(p)
+        if lit is None:
+            others.append(str(p).strip())
+        else:
+            literals.append(lit)
+    merged = []
+    rx = build_trie_regex(literals, generalize_digits=generalize_digits)
+    if rx:
+        merged.append(rx)
+    merged.extend(p for p in others if p)
+    return merged, len(literals)
+
+
+def diff_pattern_outputs(before_patterns, after_patterns, lines):
+    """同じ lines に before / after の式列を適用し、結果が食い違う行を返す。
+
+    Returns: list of (line, before_result, after_result)
+    """
+    rules_a = [{"pattern": p} for p in (before_patterns or [])]
+    rules_b = [{"pattern": p} for p in (after_patterns or [])]
+    out = []
+    for s in (lines or []):
+        s = str(s or "")
+        a = apply_rules_once(s, rules_a)
+        b = apply_rules_once(s, rules_b)
+        if a != b:
+            out.append((s, a, b))
+    return out
+
+
+def _compile_pattern_list(patterns):
+    out = []
+    for p in (patterns or []):
+        p = str(p or "").strip()
+        if not p:
+            continue
+        try:
+            out.append(compile_rule(p))
+        except Exception:
+            # apply_rules_once と同じく、壊れた式は無視
+            continue
+    return out
+
+
+def _apply_compiled(s: str, compiled) -> str:
+    for rx in compiled:
+        s = rx.sub(" ", s)
+    return re.sub(r"\s+", " ", s).strip()
+
+
+def _verify_chunk(args):
+    """(materials, merged, names) を1チャンク分検証する（プロセスプール用にモジュール直下）。"""
+    materials, merged, names = args
+    rx_a = _compile_pattern_list(materials)
+    rx_b = _compile_pattern_list(merged)
+
+    t0 = time.perf_counter()
+    res_a = [_apply_compiled(str(s or ""), rx_a) for s in names]
+    t1 = time.perf_counter()
+    res_b = [_apply_compiled(str(s or ""), rx_b) for s in names]
+    t2 = time.perf_counter()
+
+    diffs = [(s, a, b) for s, a, b in zip(names, res_a, res_b) if a != b]
+    return diffs, t1 - t0, t2 - t1, len(names)
+
+
+def verify_merged_patterns(materials, merged, names, *, workers=None, chunk_size=5000, parallel=True):
+    """材料（元の式列）と合成済みの式を全 names に適用し、食い違いをすべて返す。
+
+    - names をチャンクに分けてプロセスプールで並列実行（失敗したら逐次にフォールバック）
+    - 材料側／合成側それぞれの処理時間から throughput（件/秒）を出す
+
+    Returns: dict
+      total, diffs[(name, before, after)], elapsed, materials_sec, merged_sec,
+      materials_rate, merged_rate, workers
+    """
+    names = [str(s or "") for s in (names or [])]
+    materials = [str(p) for p in (materials or [])]
+    merged = [str(p) for p in (merged or [])]
+    chunk_size = max(1, int(chunk_size))
+    chunks = [(materials, merged, names[i:i + chunk_size]) for i in range(0, len(names), chunk_size)]
+
+    t0 = time.perf_counter()
+    results = None
+    used_workers = 1
+    if parallel and len(chunks) > 1:
+        try:
+            from concurrent.futures import ProcessPoolExecutor
+            n = workers or min(len(chunks), os.cpu_count() or 1)
+            if n > 1:
+                with ProcessPoolExecutor(max_workers=n) as ex:
+                    results = list(ex.map(_verify_chunk, chunks))
+                used_workers = n
+        except Exception:
+            results = None
+    if results is None:
+        results = [_verify_chunk(c) for c in chunks]
+        used_workers = 1
+    elapsed = time.perf_counter() - t0
+
+    diffs = []
+    sec_a = 0.0
+    sec_b = 0.0
+    for d, ta, tb, _n in results:
+        diffs.extend(d)
+        sec_a += ta
+        sec_b += tb
+    total = len(names)
+    return {
+        "total": total,
+        "diffs": diffs,
+        "elapsed": elapsed,
+        "materials_sec": sec_a,
+        "merged_sec": sec_b,
+        "materials_rate": (total / sec_a) if sec_a > 0 else 0.0,
+        "merged_rate": (total / sec_b) if sec_b > 0 else 0.0,
+        "workers": used_workers,
+    }
+
+
+def scan_raw_names(folder: str):
+    """フォルダ配下のファイル名（拡張子なし）を列挙する（viewer の _load_folder と同じ raw）。"""
+    out = []
+    if not folder or not os.path.isdir(folder):
+        return out
+    for root, _dirs, files in os.walk(folder):
+        for name in files:
+            if os.path.isfile(os.path.join(root, name)):
+                out.append(os.path.splitext(name)[0])
+    return out
@@ -0,0 +1,704 @@
+# -*- coding: utf-8 -*-
+"""
+Readable Filenames - viewer / workshop 間のメッセージ（IPC）
+
+- 従来: _ai_title_workshop_inbox.jsonl へ1行追記 → workshop が定期的に読む
+- 追加: workshop が localhost TCP で待ち受けていれば、cmd メッセージ（SHOW / OPEN_STRONG_SAVE …）は
+  そちらへ直接送る（届いた瞬間に処理できる。ファイルのポーリング待ちがない）
+- 待ち受け先（port / token）は lock ファイル（_ai_title_workshop_lock.json）に書く
+- 送れない・待ち受けていない・cmd を持たない payload は、従来どおり jsonl inbox に追記する
+
+tkinter には依存しない（ベンチマークからも使う）。
+"""
+import os
+import json
+import time
+import difflib
+import hashlib
+import socket
+import secrets
+import threading
+
+import ReadableFilenames_metrics as rf_metrics
+
+SOCKET_HOST = "127.0.0.1"
+SOCKET_TIMEOUT = 0.5  # 接続・応答待ち（秒）。詰まったら inbox へ逃がす
+
+
+@rf_metrics.timed("json.load")
+def _read_json(path: str, default):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return default
+
+
+def _process_alive(pid: int) -> bool:
+    if not pid or pid <= 0:
+        return False
+    try:
+        os.kill(pid, 0)
+        return True
+    except Exception:
+        return False
+
+
+def _tag_session(msg: dict) -> dict:
+    # 送り手のセッション id を載せる（トレースで viewer / workshop を突き合わせる）
+    if "trace_session" not in msg:
+        msg = dict(msg)
+        msg["trace_session"] = rf_metrics.SESSION_ID
+    return msg
+
+
+def append_inbox_line(inbox_path: str, msg: dict) -> None:
+    """jsonl inbox へ1行追記する（従来の経路）。"""
+    msg = _tag_session(msg)
+    with open(inbox_path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(msg, ensure_ascii=False) + "\n")
+
+
+def iter_lines_reversed(path: str, block: int = 8192):
+    """ファイル末尾から1行ずつ（bytes, 改行なし）返す。先頭まで全部読む必要はない。"""
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        end = f.tell()
+        buf = b""
+        while end > 0:
+            n = min(block, end)
+            end -= n
+            f.seek(end)
+            buf = f.read(n) + buf
+            lines = buf.split(b"\n")
+            buf = lines[0]  # 行の途中かもしれないので次のブロックへ持ち越す
+            for ln in reversed(lines[1:]):
+                yield ln
+        if buf:
+            yield buf
+
+
+def is_payload(msg: dict) -> bool:
+    """cmd を持たない行（NOISE/KEEP/PREP などの状態レコード）。"""
+    return isinstance(msg, dict) and not msg.get("cmd")
+
+
+def read_last_message(path: str, want=None):
+    """末尾から seek して最後のメッセージ（want(msg) が True のもの）を返す。無ければ None。
+
+    inbox が何MBになっても、読むのは末尾の数ブロックだけ。
+    """
+    try:
+        for raw in iter_lines_reversed(path):
+            s = raw.strip()
+            if not s:
+                continue
+            try:
+                msg = json.loads(s.decode("utf-8"))
+            except Exception:
+                continue
+            if isinstance(msg, dict) and (want is None or want(msg)):
+                return msg
+    except Exception:
+        pass
+    return None
+
+
+INBOX_MAX_BYTES = 256 * 1024  # これを超えたら読み手（工房）が compact する
+
+
+def rotated_inbox_path(inbox_path: str) -> str:
+    return inbox_path + ".1"
+
+
+def _read_messages_from(path: str, pos: int):
+    """path の pos 以降のメッセージ（dict）と、読み終えた位置。途中までしか無い最後の行は読まない。"""
+    out = []
+    end = pos
+    try:
+        with open(path, "rb") as f:
+            f.seek(pos)
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break  # 書きかけ（次の読み直しで拾う）
+                end += len(raw)
+                s = raw.strip()
+                if not s:
+                    continue
+                try:
+                    msg = json.loads(s.decode("utf-8"))
+                except Exception:
+                    continue
+                if isinstance(msg, dict):
+                    out.append(msg)
+    except Exception:
+        pass
+    return out, end
+
+
+def compact_inbox(inbox_path: str, pos: int):
+    """読み手が pos まで処理し終えた inbox を退避して小さく作り直す。
+
+    1) 最後の payload 行（load_latest_prep_state 用）だけを書いた新しい inbox を一時ファイルに作る
+    2) 今の inbox を inbox.1 へ hard link してから、一時ファイルを inbox へ os.replace する
+       （inbox が無い瞬間を作らない。書き手は古い方＝inbox.1 か、持ち越し行の後ろに追記する）
+    3) inbox.1 の pos 以降（差し替えの前後に古い方へ書かれた分）を読み、少し置いてもう一度末尾まで読む
+    4) その中に payload があれば、最新のものを新しい inbox へ追記する（持ち越し行が最後の payload のままにしない）
+
+    Returns: pos 以降にあった未処理メッセージのリスト（4 で inbox へ移した payload は除く。次の読みで届く）。
+    差し替えできなかったら None（Windows で書き手が開いている・hard link できない等。次回また試す）。
+    読み手は成功したら cursor を 0 に戻すこと（持ち越し行は payload なので再処理されても害はない）。
+    """
+    old = rotated_inbox_path(inbox_path)
+    tmp = inbox_path + ".new"
+    last = read_last_message(inbox_path, want=is_payload)
+    carried = _tag_session(last) if last is not None else None
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            if carried is not None:
+                f.write(json.dumps(carried, ensure_ascii=False) + "\n")
+        try:
+            os.remove(old)
+        except FileNotFoundError:
+            pass
+        os.link(inbox_path, old)
+    except Exception:
+        try:
+            os.remove(tmp)
+        except Exception:
+            pass
+        return None
+    try:
+        os.replace(tmp, inbox_path)
+    except Exception:
+        for p in (old, tmp):
+            try:
+                os.remove(p)
+            except Exception:
+                pass
+        return None
+
+    leftover, end = _read_messages_from(old, pos)
+    time.sleep(0.05)  # 差し替え直前に古い方を開いた書き手の1行を待つ
+    more, _end = _read_messages_from(old, end)
+    leftover += more
+
+    latest = None
+    for i in range(len(leftover) - 1, -1, -1):
+        if is_payload(leftover[i]):
+            latest = leftover.pop(i)
+            break
+    if latest is not None:
+        # 新しい inbox に書き手がもう新しい payload を足していたら、そちらが最新（触らない）
+        try:
+            if read_last_message(inbox_path, want=is_payload) not in (None, carried):
+                raise FileExistsError
+            append_inbox_line(inbox_path, latest)
+        except Exception:
+            leftover.append(latest)
+    return leftover
+
+
+# ---------------- applied state（適用スナップショット）の版 ----------------
+# STATE_JSON（ReadableFilenames_last_send.json）に applied_generation / applied_hash を持たせ、
+# 同じ内容を小さな stamp ファイルにも書く。viewer は stamp だけを見て、
+# 世代が進んだときだけ本体を読み、hash が同じなら再計算しない。
+APPLIED_STAMP_JSON = "ReadableFilenames_applied_stamp.json"
+APPLIED_KEYS = ("applied_current", "applied_prev", "applied_generation", "applied_hash", "applied_history")
+APPLIED_HISTORY_MAX = 30  # 戻す / やり直す の段数
+
+
+def applied_hash(applied) -> str:
+    """applied_current の内容ハッシュ（キー順・空白に依存しない）。None は空文字。"""
+    if not isinstance(applied, dict):
+        return ""
+    s = json.dumps(applied, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(s.encode("utf-8")).hexdigest()
+
+
+def applied_stamp_path(state_path: str) -> str:
+    return os.path.join(os.path.dirname(state_path), APPLIED_STAMP_JSON)
+
+
+def read_applied_stamp(state_path: str):
+    """stamp を読む。Returns: (generation, hash) or None（stamp が無い＝旧形式）"""
+    d = _read_json(applied_stamp_path(state_path), None)
+    if not isinstance(d, dict):
+        return None
+    try:
+        return int(d.get("generation", 0) or 0), str(d.get("hash", "") or "")
+    except Exception:
+        return None
+
+
+@rf_metrics.timed("json.save")
+def _save_json_atomic(path: str, obj) -> None:
+    d = os.path.dirname(path)
+    if d:
+        os.makedirs(d, exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(obj, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def write_applied_state(state_path: str, st: dict):
+    """st（applied_current を更新済み）に世代と hash を付けて保存し、stamp も更新する。
+
+    世代は「ファイル上の世代」と stamp の大きい方 + 1（単調増加）。
+    本体 → stamp の順に書く（stamp を見た読み手は必ずその世代以降の本体を読む）。
+    Returns: (generation, hash)
+    """
+    prev = 0
+    try:
+        prev = int(st.get("applied_generation", 0) or 0)
+    except Exception:
+        prev = 0
+    stamp = read_applied_stamp(state_path)
+    if stamp is not None:
+        prev = max(prev, stamp[0])
+    gen = prev + 1
+    h = applied_hash(st.get("applied_current"))
+    st["applied_generation"] = gen
+    st["applied_hash"] = h
+    _save_json_atomic(state_path, st)
+    _save_json_atomic(applied_stamp_path(state_path), {"generation": gen, "hash": h})
+    return gen, h
+
+
+def write_state_keep_applied(state_path: str, payload: dict):
+    """applied_* 以外（PREP の payload・強度など）を書き換える。applied_* はファイル上のものを引き継ぐ。
+
+    STATE_JSON を書く人は必ず write_applied_state を通す（stamp が進まないと読み手が古い版を使い続ける）。
+    Returns: (generation, hash)
+    """
+    st = {k: v for k, v in dict(payload).items() if k not in APPLIED_KEYS}
+    disk = _read_json(state_path, {})
+    if isinstance(disk, dict):
+        for k in APPLIED_KEYS:
+            if k in disk:
+                st[k] = disk[k]
+    return write_applied_state(state_path, st)
+
+
+# ---- 履歴（差分で持つ） ----
+# applied_history = {"undo": [delta, ...], "redo": [delta, ...]}
+# delta は a（古い）→ b（新しい）の両方向に使える差分：
+#   "genres" : {genre: ops}  両方にあるジャンルの式リストの差分
+#   "genres_keys": [keys_a, keys_b]  ジャンルの並びが変わったとき
+#   "genres_only": [{genre: list}, {genre: list}]  片側にしか無いジャンル
+#   "order"  : ops
+#   "meta"   : [meta_a, meta_b]  genres/order 以外のキーが変わったとき
+#   "none"   : [a is None, b is None]
+#   "hash"   : [hash_a, hash_b]  適用後の確認用
+# ops = [[i1, i2, j1, j2, a[i1:i2], b[j1:j2]], ...]（difflib の equal 以外。追加・削除・移動）
+
+def _list_ops(a, b):
+    sm = difflib.SequenceMatcher(a=a, b=b, autojunk=False)
+    return [
+        [i1, i2, j1, j2, a[i1:i2], b[j1:j2]]
+        for tag, i1, i2, j1, j2 in sm.get_opcodes()
+        if tag != "equal"
+    ]
+
+
+def _apply_ops(src, ops, reverse=False):
+    out = list(src)
+    # 後ろから置き換えれば前の位置はずれない（opcodes は a 側 / b 側とも昇順）
+    for i1, i2, j1, j2, a_part, b_part in reversed(ops):
+        if reverse:
+            out[j1:j2] = a_part
+        else:
+            out[i1:i2] = b_part
+    return out
+
+
+def _split_applied(d):
+    d = d if isinstance(d, dict) else {}
+    gs = d.get("genres") if isinstance(d.get("genres"), dict) else {}
+    order = d.get("order") if isinstance(d.get("order"), list) else []
+    meta = {k: v for k, v in d.items() if k not in ("genres", "order")}
+    return gs, order, meta
+
+
+def applied_delta(a, b) -> dict:
+    """applied_current a → b の差分。"""
+    ga, oa, ma = _split_applied(a)
+    gb, ob, mb = _split_applied(b)
+    delta = {
+        "none": [not isinstance(a, dict), not isinstance(b, dict)],
+        "hash": [applied_hash(a), applied_hash(b)],
+        "order": _list_ops(oa, ob),
+    }
+    if ma != mb:
+        delta["meta"] = [ma, mb]
+    if list(ga.keys()) != list(gb.keys()):
+        delta["genres_keys"] = [list(ga.keys()), list(gb.keys())]
+    only_a = {g: list(v) for g, v in ga.items() if g not in gb}
+    only_b = {g: list(v) for g, v in gb.items() if g not in ga}
+    if only_a or only_b:
+        delta["genres_only"] = [only_a, only_b]
+    ops = {}
+    for g, va in ga.items():
+        if g in gb and va != gb[g]:
+            ops[g] = _list_ops(list(va), list(gb[g]))
+    if ops:
+        delta["genres"] = ops
+    return delta
+
+
+def apply_applied_delta(src, delta: dict, reverse=False):
+    """src に delta を当てる（reverse=True なら b → a）。"""
+    side = 0 if reverse else 1
+    if delta.get("none", [False, False])[side]:
+        return None
+    gs, order, meta = _split_applied(src)
+    if "meta" in delta:
+        meta = dict(delta["meta"][side])
+    keys = delta["genres_keys"][side] if "genres_keys" in delta else list(gs.keys())
+    only = delta.get("genres_only", [{}, {}])[side]
+    ops = delta.get("genres") or {}
+    genres = {}
+    for g in keys:
+        if g in only:
+            genres[g] = list(only[g])
+        elif g in ops:
+            genres[g] = _apply_ops(gs.get(g, []), ops[g], reverse)
+        else:
+            genres[g] = list(gs.get(g, []))
+    out = dict(meta)
+    out["genres"] = genres
+    out["order"] = _apply_ops(order, delta.get("order") or [], reverse)
+    return out
+
+
+def _history(st: dict) -> dict:
+    h = st.get("applied_history")
+    if not isinstance(h, dict):
+        h = {}
+    undo = h.get("undo") if isinstance(h.get("undo"), list) else []
+    redo = h.get("redo") if isinstance(h.get("redo"), list) else []
+    # 旧形式（applied_prev だけ）からの移行：1段だけ戻せるようにする
+    prev = st.get("applied_prev")
+    if not undo and isinstance(prev, dict):
+        undo = [applied_delta(prev, st.get("applied_current"))]
+    return {"undo": undo, "redo": redo}
+
+
+def applied_history_depth(st) -> tuple:
+    """Returns: (戻せる段数, やり直せる段数)"""
+    if not isinstance(st, dict):
+        return 0, 0
+    h = _history(st)
+    return len(h["undo"]), len(h["redo"])
+
+
+def push_applied_state(state_path: str, payload: dict):
+    """applied_current を payload に差し替え、差分を履歴に積んで世代を進める。
+
+    全量の applied_prev は書かない（履歴の差分から戻せる）。やり直し履歴は捨てる。
+    """
+    st = _read_json(state_path, {})
+    if not isinstance(st, dict):
+        st = {}
+    cur = st.get("applied_current")
+    h = _history(st)
+    if applied_hash(cur) != applied_hash(payload):
+        h["undo"].append(applied_delta(cur if isinstance(cur, dict) else None, payload))
+        h["undo"] = h["undo"][-APPLIED_HISTORY_MAX:]
+        h["redo"] = []
+    st.pop("applied_prev", None)
+    st["applied_history"] = h
+    st["applied_current"] = payload
+    return write_applied_state(state_path, st)
+
+
+class AppliedHistoryMismatch(Exception):
+    """履歴の差分が今の applied_current に合わない（手で書き換えられた等）。
+
+    履歴は今の状態を起点に捨て直してある。version は書き直した後の (generation, hash)。
+    """
+
+    def __init__(self, message: str, version=None):
+        super().__init__(message)
+        self.version = version
+
+
+def step_applied_state(state_path: str, redo=False):
+    """履歴を1段戻す（redo=True ならやり直す）。
+
+    Returns: (generation, hash)。戻せる / やり直せるものが無ければ None（ファイルは触らない）
+    Raises: AppliedHistoryMismatch 差分が今の状態に合わないとき。履歴は今の状態を起点に空にする
+    （残しておくと以後ずっと戻せない）。applied_current はそのまま。
+    """
+    st = _read_json(state_path, {})
+    if not isinstance(st, dict):
+        return None
+    h = _history(st)
+    src, dst = ("redo", "undo") if redo else ("undo", "redo")
+    if not h[src]:
+        return None
+    delta = h[src][-1]
+    cur = st.get("applied_current")
+    want_now = delta.get("hash", ["", ""])[0 if redo else 1]
+    if applied_hash(cur) != want_now:
+        # 手で書き換えられた / 履歴を持たない書き手が applied_current を差し替えた等
+        st.pop("applied_prev", None)
+        st["applied_history"] = {"undo": [], "redo": []}
+        ver = write_applied_state(state_path, st)
+        raise AppliedHistoryMismatch(
+            "適用状態が履歴の外で書き換えられていたため、"
+            + ("やり直せません" if redo else "戻せません")
+            + "。履歴を今の状態から取り直しました。",
+            ver,
+        )
+    st["applied_current"] = apply_applied_delta(cur, delta, reverse=not redo)
+    h[src].pop()
+    h[dst].append(delta)
+    h[dst] = h[dst][-APPLIED_HISTORY_MAX:]
+    st.pop("applied_prev", None)
+    st["applied_history"] = h
+    return write_applied_state(state_path, st)
+
+
+def socket_endpoint(lock_path: str):
+    """lock ファイルから待ち受け先を読む。生きていなければ None。
+
+    Returns: (port, token) or None
+    """
+    d = _read_json(lock_path, None)
+    if not isinstance(d, dict):
+        return None
+    try:
+        port = int(d.get("port", 0) or 0)
+        pid = int(d.get("pid", 0) or 0)
+    except Exception:
+        return None
+    token = str(d.get("token", "") or "")
+    if port <= 0 or not token or not _process_alive(pid):
+        return None
+    return port, token
+
+
+def send_socket(port: int, token: str, msg: dict, *, timeout=SOCKET_TIMEOUT) -> bool:
+    """1メッセージを送り、受け手の ack を待つ。届いたら True。"""
+    m = dict(msg)
+    m["token"] = token
+    data = (json.dumps(m, ensure_ascii=False) + "\n").encode("utf-8")
+    try:
+        with socket.create_connection((SOCKET_HOST, int(port)), timeout=timeout) as s:
+            s.settimeout(timeout)
+            s.sendall(data)
+            s.shutdown(socket.SHUT_WR)
+            ack = s.recv(16)
+        return ack.startswith(b"ok")
+    except Exception:
+        return False
+
+
+def send_message(msg: dict, *, lock_path: str, inbox_path: str, prefer_socket=True) -> str:
+    """cmd メッセージは socket 優先、だめなら（または payload は）inbox へ。
+
+    Returns: "socket" / "inbox"
+    """
+    m = _tag_session(dict(msg or {}))
+    if prefer_socket and m.get("cmd"):
+        ep = socket_endpoint(lock_path)
+        if ep is not None and send_socket(ep[0], ep[1], m):
+            rf_metrics.event("ipc.send", via="socket", cmd=m.get("cmd"), msg_id=m.get("id"))
+            return "socket"
+    append_inbox_line(inbox_path, m)
+    rf_metrics.event("ipc.send", via="inbox", cmd=m.get("cmd"), msg_id=m.get("id"))
+    return "inbox"
+
+
+class MessageServer:
+    """localhost TCP の待ち受け（workshop 側）。
+
+    - 1接続 = 1行以上の JSON。token が一致したものだけ on_message(msg) に渡す
+    - on_message はサーバスレッドから呼ばれる（Tk を直接触らないこと。queue に積む）
+    """
+
+    def __init__(self, on_message, *, host=SOCKET_HOST, port=0):
+        self.on_message = on_message
+        self.host = host
+        self.port = int(port)
+        self.token = secrets.token_hex(16)
+        self.received = 0
+        self._sock = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self) -> int:
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        s.bind((self.host, self.port))
+        s.listen(16)
+        s.settimeout(0.5)  # stop() を拾うため
+        self._sock = s
+        self.port = s.getsockname()[1]
+        self._thread = threading.Thread(target=self._serve, name="rf-ipc", daemon=True)
+        self._thread.start()
+        return self.port
+
+    def stop(self):
+        self._stop.set()
+        try:
+            if self._sock is not None:
+                self._sock.close()
+        except Exception:
+            pass
+        self._sock = None
+
+    def _serve(self):
+        while not self._stop.is_set():
+            try:
+                conn, _addr = self._sock.accept()
+            except socket.timeout:
+                continue
+            except Exception:
+                break
+            try:
+                self._handle(conn)
+            except Exception:
+                pass
+            finally:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+
+    def _handle(self, conn):
+        conn.settimeout(SOCKET_TIMEOUT)
+        buf = b""
+        while True:
+            chunk = conn.recv(65536)
+            if not chunk:
+                break
+            buf += chunk
+        ok = False
+        for line in buf.decode("utf-8", errors="replace").splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                msg = json.loads(line)
+            except Exception:
+                continue
+            if not isinstance(msg, dict) or msg.pop("token", None) != self.token:
+                continue
+            ok = True
+            self.received += 1
+            try:
+                self.on_message(msg)
+            except Exception:
+                pass
+        try:
+            conn.sendall(b"ok\n" if ok else b"ng\n")
+        except Exception:
+            pass
+
+
+def new_message_id(prefix: str) -> str:
+    return f"{prefix}_{int(time.time()*1000)}_{os.getpid()}"
+
+
+class AdaptivePoller:
+    """after() ベースのポーリング。何も起きない間は間隔を伸ばし、操作・フォーカスで最短に戻す。
+
+    - func() は「仕事をしたら True」を返す（False/None なら空振り）
+    - 空振りが idle_after 回続いたら間隔を factor 倍（max_ms まで）
+    - 仕事をした / poke() されたら min_ms に戻す
+    - wakeups（起きた回数）/ works（仕事をした回数）を数える
+    tkinter は import しない（widget の after / after_cancel / bind だけ使う）。
+    """
+
+    def __init__(self, widget, func, *, min_ms=500, max_ms=8000, factor=2.0, idle_after=4, name=""):
+        self.widget = widget
+        self.func = func
+        self.min_ms = int(min_ms)
+        self.max_ms = max(int(max_ms), self.min_ms)
+        self.factor = float(factor)
+        self.idle_after = int(idle_after)
+        self.name = name or getattr(func, "__name__", "poll")
+        self.interval = self.min_ms
+        self.wakeups = 0
+        self.works = 0
+        self._idle = 0
+        self._job = None
+        self._stopped = True
+
+    def start(self, delay_ms=None):
+        self._stopped = False
+        self._schedule(self.min_ms if delay_ms is None else int(delay_ms))
+        return self
+
+    def stop(self):
+        self._stopped = True
+        self._cancel()
+
+    def _cancel(self):
+        if self._job is not None:
+            try:
+                self.widget.after_cancel(self._job)
+            except Exception:
+                pass
+            self._job = None
+
+    def _schedule(self, ms):
+        self._cancel()
+        if self._stopped:
+            return
+        try:
+            self._job = self.widget.after(int(ms), self._tick)
+        except Exception:
+            self._job = None
+
+    def _tick(self):
+        self._job = None
+        self.wakeups += 1
+        did = False
+        try:
+            with rf_metrics.span("poll." + self.name):
+                did = bool(self.func())
+        except Exception:
+            did = False
+        if did:
+            self.works += 1
+            rf_metrics.count("poll." + self.name + ".work")
+            self._idle = 0
+            self.interval = self.min_ms
+        else:
+            self._idle += 1
+            if self._idle >= self.idle_after:
+                self.interval = min(self.max_ms, int(self.interval * self.factor))
+        self._schedule(self.interval)
+
+    def poke(self, *_):
+        """操作があった：最短間隔に戻す（既に最短なら何もしない）。"""
+        self._idle = 0
+        if self._stopped or self.interval <= self.min_ms:
+            return
+        self.interval = self.min_ms
+        self._schedule(self.min_ms)
+
+    def attach_activity(self, widget=None):
+        """widget の toplevel で フォーカス・キー・クリック を見て poke する。"""
+        w = widget if widget is not None else self.widget
+        try:
+            top = w.winfo_toplevel()
+        except Exception:
+            top = w
+        for seq in ("<FocusIn>", "<KeyPress>", "<ButtonPress>"):
+            try:
+                top.bind(seq, self.poke, add="+")
+            except Exception:
+                pass
+        return self
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "wakeups": self.wakeups,
+            "works": self.works,
+            "interval_ms": self.interval,
+        }
@@ -0,0 +1,607 @@
+# -*- coding: utf-8 -*-
+"""
+Readable Filenames - 処理時間の計測（viewer / workshop 共通）
+
+- span("名前") で囲んだ区間の時間を、名前ごとに 件数・合計・最大・直近の標本（p50/p95 用）で集める
+- count("名前") は件数だけ数える
+- 計測は既定で止めてある（環境変数 RF_METRICS=1 か、計測ウィンドウのチェックで開始）
+  止めている間の span は共有の空オブジェクトを返すだけ（時計も辞書も触らない）
+- 計測ウィンドウは隠し機能: Ctrl+Shift+M（open_metrics_window / bind_metrics_window）
+- プロファイル採取も隠し機能: Ctrl+Shift+P（cProfile）/ Ctrl+Shift+O（+ tracemalloc）で次の N 操作ぶん
+  （ProfileCapture / bind_profile_capture）。.prof と .txt を app_dir（_workshop_crash.log の隣）に書く
+- トレース（任意）: RF_TRACE=1（または RF_TRACE=出力先フォルダ）か起動引数 --trace[=フォルダ] で、
+  span ごとに1行の JSON（名前・開始・時間・件数・スレッド・入れ子）を
+  ReadableFilenames_trace_<role>_<pid>.jsonl に書く。サイズで .1 .. .N に回す
+  セッション id（RF_SESSION）は子プロセスに引き継ぎ、IPC メッセージにも載せる（trace_session）
+  まとめは ReadableFilenames_trace_summary.py
+
+集計は Tk に依存しない（ベンチマークからも使う）。ウィンドウだけ tkinter を関数の中で読む。
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import atexit
+import threading
+from collections import deque
+
+METRICS_SAMPLES = 512  # 名前ごとに残す直近の標本数（p50/p95 はこの中で計算）
+TRACE_MAX_BYTES = 8 * 1024 * 1024  # これを超えたら回す
+TRACE_BACKUPS = 3
+TRACE_PREFIX = "ReadableFilenames_trace_"
+
+SESSION_ID = os.environ.get("RF_SESSION") or uuid.uuid4().hex[:12]
+
+
+class _Op:
+    __slots__ = ("count", "total", "max", "samples")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = deque(maxlen=METRICS_SAMPLES)
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __setattr__(self, name, value):
+        pass  # sp.items = n を止めている間も書けるように
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("_m", "_name", "_t0", "_ts", "items")
+
+    def __init__(self, m, name):
+        self._m = m
+        self._name = name
+        self._ts = None
+        self.items = None
+
+    def __enter__(self):
+        if self._m.tracer is not None:
+            self._ts = time.time()
+            self._m._stack().append(self._name)
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        dt = time.perf_counter() - self._t0
+        m = self._m
+        if m.enabled:
+            m.add(self._name, dt)
+        if self._ts is None:
+            return False
+        st = m._stack()
+        path = ";".join(st)
+        if st:
+            st.pop()  # 途中でトレースが外れても入れ子は戻す
+        tr = m.tracer
+        if tr is not None:
+            rec = {
+                "name": self._name,
+                "ts": round(self._ts, 6),
+                "dur_ms": round(dt * 1000.0, 3),
+                "thread": threading.current_thread().name,
+                "stack": path,
+            }
+            if self.items is not None:
+                rec["items"] = self.items
+            m._trace_write(tr, rec)
+        return False
+
+
+class TraceLog:
+    """1行1 JSON の追記ファイル。max_bytes を超えたら path.1 .. path.<backups> に回す。"""
+
+    def __init__(self, path: str, *, role="", max_bytes=TRACE_MAX_BYTES, backups=TRACE_BACKUPS):
+        self.path = path
+        self.role = role
+        self.max_bytes = int(max_bytes)
+        self.backups = int(backups)
+        self._lock = threading.Lock()
+        self._f = open(path, "ab")
+        self._size = self._f.tell()
+        self._base = {"sid": SESSION_ID, "pid": os.getpid(), "role": role}
+
+    def write(self, rec: dict) -> bool:
+        """1行書く。書けなかったら（ディスクがいっぱい・回したあと開けない など）ファイルを閉じて False。
+        トレースは計測の付録なので、ここから例外を外へ出さない（測っている処理を止めない）。"""
+        try:
+            d = dict(self._base)
+            d.update(rec)
+            line = (json.dumps(d, ensure_ascii=False, separators=(",", ":"), default=str) + "\n").encode("utf-8")
+            with self._lock:
+                if self._f is None:
+                    return False
+                self._f.write(line)
+                self._size += len(line)
+                if self._size > self.max_bytes:
+                    self._rotate()
+            return True
+        except Exception:
+            self.close()
+            return False
+
+    def _rotate(self):
+        # 呼び手（write）がロックを持っている。開き直しに失敗したら例外のまま write に返す
+        f, self._f = self._f, None
+        try:
+            f.close()
+            for i in range(self.backups - 1, 0, -1):
+                src = f"{self.path}.{i}"
+                if os.path.exists(src):
+                    os.replace(src, f"{self.path}.{i + 1}")
+            if self.backups > 0:
+                os.replace(self.path, self.path + ".1")
+        except Exception:
+            pass
+        self._f = open(self.path, "wb" if self.backups > 0 else "ab")
+        self._size = self._f.tell()
+
+    def close(self):
+        with self._lock:
+            if self._f is not None:
+                try:
+                    self._f.close()
+                except Exception:
+                    pass
+                self._f = None
+
+
+def _pct(xs, p):
+    return xs[min(len(xs) - 1, int(round(p * (len(xs) - 1))))]
+
+
+class Metrics:
+    def __init__(self, enabled=False):
+        self.enabled = bool(enabled)
+        self.tracer = None  # TraceLog（enable_trace）
+        self._tls = threading.local()  # span の入れ子（トレース用）
+        self._ops = {}  # name -> _Op
+        self._counters = {}  # name -> int
+        self._lock = threading.Lock()  # 裏スレッド（走査・受信）からも記録する
+        self.started_at = time.time()
+
+    def _stack(self):
+        st = getattr(self._tls, "stack", None)
+        if st is None:
+            st = self._tls.stack = []
+        return st
+
+    def span(self, name: str):
+        if not self.enabled and self.tracer is None:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def timed(self, name: str, items=None):
+        """関数を span(name) で囲むデコレータ（止めている間は属性を2つ見るだけ）
+        items(result) -> 件数 を渡すとトレースに件数も書く。"""
+
+        def deco(func):
+            def wrapper(*args, **kwargs):
+                if not self.enabled and self.tracer is None:
+                    return func(*args, **kwargs)
+                with _Span(self, name) as sp:
+                    r = func(*args, **kwargs)
+                    if items is not None and self.tracer is not None:
+                        try:
+                            sp.items = items(r)
+                        except Exception:
+                            pass
+                    return r
+
+            wrapper.__name__ = getattr(func, "__name__", name)
+            wrapper.__doc__ = getattr(func, "__doc__", None)
+            wrapper.__wrapped__ = func
+            return wrapper
+
+        return deco
+
+    def add(self, name: str, seconds: float):
+        if not self.enabled:
+            return
+        with self._lock:
+            op = self._ops.get(name)
+            if op is None:
+                op = self._ops[name] = _Op()
+            op.count += 1
+            op.total += seconds
+            if seconds > op.max:
+                op.max = seconds
+            op.samples.append(seconds)
+
+    def count(self, name: str, n: int = 1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def event(self, name: str, **fields):
+        """トレースに瞬間のできごと（IPC の受信など）を1行書く。"""
+        tr = self.tracer
+        if tr is None:
+            return
+        rec = {"name": name, "ts": round(time.time(), 6), "dur_ms": 0.0, "thread": threading.current_thread().name, "event": True}
+        rec.update(fields)
+        self._trace_write(tr, rec)
+
+    def _trace_write(self, tr, rec):
+        # 書けなくなったトレースは外す（以後の span は計測だけ、または素通り）
+        if not tr.write(rec) and self.tracer is tr:
+            self.tracer = None
+
+    def enable_trace(self, folder=None, role=""):
+        """トレースを書き始める。folder が無ければこのファイルの隣。子プロセスにも引き継ぐ（環境変数）。"""
+        if self.tracer is not None:
+            return self.tracer
+        d = folder or os.path.dirname(os.path.abspath(__file__))
+        os.makedirs(d, exist_ok=True)
+        path = os.path.join(d, f"{TRACE_PREFIX}{role or 'proc'}_{os.getpid()}.jsonl")
+        self.tracer = TraceLog(path, role=role)
+        os.environ["RF_TRACE"] = d
+        os.environ["RF_SESSION"] = SESSION_ID
+        atexit.register(self.disable_trace)
+        self.event("trace.start", argv=list(sys.argv))
+        return self.tracer
+
+    def disable_trace(self):
+        tr = self.tracer
+        self.tracer = None
+        if tr is not None:
+            tr.close()
+
+    def reset(self):
+        with self._lock:
+            self._ops = {}
+            self._counters = {}
+            self.started_at = time.time()
+
+    def snapshot(self):
+        """[{"name", "count", "p50_ms", "p95_ms", "max_ms", "total_ms"}, ...]（合計の大きい順）と counters"""
+        with self._lock:
+            items = [(name, op.count, op.total, op.max, sorted(op.samples)) for name, op in self._ops.items()]
+            counters = dict(self._counters)
+        rows = []
+        for name, n, total, mx, xs in items:
+            rows.append({
+                "name": name,
+                "count": n,
+                "p50_ms": round(_pct(xs, 0.50) * 1000.0, 3) if xs else 0.0,
+                "p95_ms": round(_pct(xs, 0.95) * 1000.0, 3) if xs else 0.0,
+                "max_ms": round(mx * 1000.0, 3),
+                "total_ms": round(total * 1000.0, 1),
+            })
+        rows.sort(key=lambda r: -r["total_ms"])
+        return {"ops": rows, "counters": counters, "since": self.started_at}
+
+
+METRICS = Metrics(enabled=bool(os.environ.get("RF_METRICS")))
+span = METRICS.span
+timed = METRICS.timed
+count = METRICS.count
+event = METRICS.event
+
+
+def init_trace(argv=None, role=""):
+    """起動引数 --trace / --trace=フォルダ か 環境変数 RF_TRACE を見てトレースを始める。
+    Returns: 始めたら True"""
+    folder = None
+    on = False
+    for a in list(argv or []):
+        if a == "--trace":
+            on = True
+        elif a.startswith("--trace="):
+            on = True
+            folder = a.split("=", 1)[1] or None
+    env = os.environ.get("RF_TRACE", "")
+    if not on and env:
+        on = True
+        folder = None if env in ("1", "true", "yes", "on") else env
+    if not on:
+        return False
+    try:
+        METRICS.enable_trace(folder, role=role)
+        return True
+    except Exception:
+        return False
+
+
+# =====================
+# プロファイル採取（隠し機能）
+# =====================
+PROFILE_ACTIONS = 20  # 開始してからこの回数の操作（クリック/キー）で自動的に止めて保存
+PROFILE_TAIL_MS = 500  # 最後の操作のあと after() で走る処理も拾うための待ち
+PROFILE_TOP = 40  # レポートに出す関数の数（累積時間順）
+ALLOC_TOP = 25  # レポートに出す確保場所の数
+_MODIFIER_KEYS = {
+    "Shift_L", "Shift_R", "Control_L", "Control_R", "Alt_L", "Alt_R",
+    "Meta_L", "Meta_R", "Super_L", "Super_R", "Caps_Lock", "ISO_Level3_Shift",
+}
+
+
+class ProfileCapture:
+    """cProfile（と任意で tracemalloc）を「次の N 操作」のあいだだけ回し、out_dir に書き出す。
+
+    - 書き出し: _profile_<role>_<時刻>.prof（pstats / snakeviz で開く）と 同名 .txt（上位の関数・確保場所）
+    - cProfile はメインスレッド（Tk のイベント処理）だけを見る。裏スレッドの走査は計測/トレースで見る
+    - 再起動せずに何度でも採れる
+    """
+
+    def __init__(self, out_dir: str, role="", actions=PROFILE_ACTIONS):
+        self.out_dir = out_dir
+        self.role = role or "proc"
+        self.actions = int(actions)
+        self.left = 0
+        self.memory = False
+        self.started_at = None
+        self.last_paths = []
+        self._prof = None
+
+    @property
+    def active(self) -> bool:
+        return self._prof is not None
+
+    def start(self, memory=False, actions=None) -> bool:
+        if self._prof is not None:
+            return False
+        import cProfile
+
+        self.memory = False
+        if memory:
+            # 先に始める（tracemalloc の import をプロファイルに混ぜない）
+            try:
+                import tracemalloc
+
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start(10)
+                    self.memory = True  # 自分で始めたものだけ止める
+                else:
+                    self.memory = None  # 既に誰かが回している: 読むだけ
+            except Exception:
+                pass
+        prof = cProfile.Profile()
+        try:
+            prof.enable()
+        except Exception:
+            # 別のプロファイラが動いている
+            if self.memory:
+                import tracemalloc
+
+                tracemalloc.stop()
+            self.memory = False
+            return False
+        self._prof = prof
+        self.left = int(actions or self.actions)
+        self.started_at = time.time()
+        return True
+
+    def note_action(self) -> bool:
+        """操作を1回数える。Returns: N 回に達したら True（止めるのは呼び手）"""
+        if self._prof is None or self.left <= 0:
+            return False
+        self.left -= 1
+        return self.left <= 0
+
+    def stop(self):
+        """止めて書き出す。Returns: 書いたファイルのパス一覧"""
+        prof = self._prof
+        if prof is None:
+            return []
+        self._prof = None
+        try:
+            prof.disable()
+        except Exception:
+            pass
+        snap, peak = None, None
+        if self.memory is not False:
+            try:
+                import tracemalloc
+
+                if tracemalloc.is_tracing():
+                    snap = tracemalloc.take_snapshot()
+                    peak = tracemalloc.get_traced_memory()[1]
+                    if self.memory:
+                        tracemalloc.stop()
+            except Exception:
+                pass
+
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(self.started_at or time.time()))
+        base = os.path.join(self.out_dir, f"_profile_{self.role}_{stamp}")
+        paths = []
+        try:
+            os.makedirs(self.out_dir, exist_ok=True)
+            prof.dump_stats(base + ".prof")
+            paths.append(base + ".prof")
+        except Exception:
+            pass
+        try:
+            with open(base + ".txt", "w", encoding="utf-8") as f:
+                self._write_report(f, prof, snap, peak)
+            paths.append(base + ".txt")
+        except Exception:
+            pass
+        self.last_paths = paths
+        return paths
+
+    def _write_report(self, f, prof, snap, peak):
+        import pstats
+
+        took = time.time() - (self.started_at or time.time())
+        f.write(f"role={self.role} pid={os.getpid()} session={SESSION_ID} seconds={took:.1f} actions={self.actions - self.left}\n\n")
+        f.write(f"== cProfile（累積時間の上位 {PROFILE_TOP}）\n")
+        st = pstats.Stats(prof, stream=f)
+        st.sort_stats("cumulative").print_stats(PROFILE_TOP)
+        if snap is None:
+            return
+        f.write(f"\n== tracemalloc（確保場所の上位 {ALLOC_TOP}）peak={peak or 0} bytes\n")
+        try:
+            stats = snap.statistics("lineno")
+        except Exception:
+            return
+        total = sum(s.size for s in stats)
+        f.write(f"live={total} bytes in {sum(s.count for s in stats)} blocks\n")
+        for s in stats[:ALLOC_TOP]:
+            fr = s.traceback[0]
+            f.write(f"{s.size:>12} B {s.count:>8}  {fr.filename}:{fr.lineno}\n")
+
+
+def bind_profile_capture(root, out_dir: str, role="", actions=None):
+    """root に Ctrl+Shift+P（cProfile）/ Ctrl+Shift+O（cProfile + tracemalloc）を付ける（メニューには出さない）。
+
+    もう一度押すとその場で止めて保存。押さなければ次の N 操作で止まる。保存先はメッセージで知らせる。
+    Returns: ProfileCapture
+    """
+    cap = ProfileCapture(out_dir, role=role, actions=actions or int(os.environ.get("RF_PROFILE_ACTIONS") or PROFILE_ACTIONS))
+    state = {"after": None}
+
+    def _finish():
+        state["after"] = None
+        paths = cap.stop()
+        try:
+            from tkinter import messagebox
+
+            if paths:
+                messagebox.showinfo("プロファイル", "保存しました:\n" + "\n".join(paths), parent=root)
+            else:
+                messagebox.showwarning("プロファイル", "保存できませんでした。", parent=root)
+        except Exception:
+            pass
+
+    def _toggle(memory):
+        if cap.active:
+            if state["after"] is not None:
+                try:
+                    root.after_cancel(state["after"])
+                except Exception:
+                    pass
+            _finish()
+        elif cap.start(memory=memory):
+            try:
+                root.bell()
+            except Exception:
+                pass
+        return "break"
+
+    def _action(e=None):
+        if not cap.active or state["after"] is not None:
+            return
+        if getattr(e, "keysym", None) in _MODIFIER_KEYS:
+            return
+        if cap.note_action():
+            try:
+                state["after"] = root.after(PROFILE_TAIL_MS, _finish)
+            except Exception:
+                _finish()
+
+    binds = (
+        (("<Control-Shift-P>", "<Control-Shift-p>"), lambda _e=None: _toggle(False)),
+        (("<Control-Shift-O>", "<Control-Shift-o>"), lambda _e=None: _toggle(True)),
+        (("<KeyPress>", "<ButtonRelease>"), _action),
+    )
+    for seqs, fn in binds:
+        for seq in seqs:
+            try:
+                root.bind_all(seq, fn, add="+")
+            except Exception:
+                pass
+    root._rf_profile = cap
+    return cap
+
+
+# =====================
+# 計測ウィンドウ（隠し機能）
+# =====================
+def open_metrics_window(master, metrics=None, title="計測"):
+    """集計を表で見る。1秒ごとに更新。計測の開始/停止・リセットもここで行う。"""
+    import tkinter as tk
+    from tkinter import ttk
+
+    m = metrics or METRICS
+    win = getattr(master, "_rf_metrics_win", None)
+    if win is not None:
+        try:
+            if win.winfo_exists():
+                win.deiconify()
+                win.lift()
+                return win
+        except Exception:
+            pass
+
+    win = tk.Toplevel(master)
+    win.title(title)
+    win.geometry("720x420")
+    master._rf_metrics_win = win
+
+    top = ttk.Frame(win, padding=(8, 8, 8, 0))
+    top.pack(fill="x")
+    var_on = tk.BooleanVar(value=m.enabled)
+
+    def _toggle():
+        m.enabled = bool(var_on.get())
+
+    ttk.Checkbutton(top, text="計測する", variable=var_on, command=_toggle).pack(side="left")
+    ttk.Button(top, text="リセット", command=m.reset).pack(side="left", padx=(8, 0))
+    lbl = ttk.Label(top, text="")
+    lbl.pack(side="right")
+
+    cols = ("name", "count", "p50", "p95", "max", "total")
+    heads = ("処理", "回数", "p50 ms", "p95 ms", "max ms", "合計 ms")
+    tree = ttk.Treeview(win, columns=cols, show="headings")
+    for c, h in zip(cols, heads):
+        tree.heading(c, text=h)
+        tree.column(c, width=260 if c == "name" else 80, anchor=("w" if c == "name" else "e"))
+    tree.pack(fill="both", expand=True, padx=8, pady=8)
+
+    def _render():
+        try:
+            if not win.winfo_exists():
+                return
+        except Exception:
+            return
+        snap = m.snapshot()
+        want = []
+        for r in snap["ops"]:
+            want.append(("op:" + r["name"], (r["name"], r["count"], r["p50_ms"], r["p95_ms"], r["max_ms"], r["total_ms"])))
+        for name, n in sorted(snap["counters"].items()):
+            want.append(("cnt:" + name, (name, n, "", "", "", "")))
+        keep = {iid for iid, _v in want}
+        for iid in tree.get_children():
+            if iid not in keep:
+                tree.delete(iid)
+        for pos, (iid, values) in enumerate(want):
+            if tree.exists(iid):
+                tree.item(iid, values=values)
+                tree.move(iid, "", pos)
+            else:
+                tree.insert("", pos, iid=iid, values=values)
+        lbl.config(text=("計測中" if m.enabled else "停止中") + time.strftime("（%H:%M:%S から）", time.localtime(snap["since"])))
+        win.after(1000, _render)
+
+    _render()
+    return win
+
+
+def bind_metrics_window(root, metrics=None, title="計測"):
+    """root に Ctrl+Shift+M を付ける（メニューには出さない）。"""
+    def _open(_e=None):
+        try:
+            open_metrics_window(root, metrics, title=title)
+        except Exception:
+            pass
+        return "break"
+
+    for seq in ("<Control-Shift-M>", "<Control-Shift-m>"):
+        try:
+            root.bind_all(seq, _open, add="+")
+        except Exception:
+            pass
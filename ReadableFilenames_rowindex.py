@@ -0,0 +1,921 @@
+# -*- coding: utf-8 -*-
+"""
+ReadableFilenames row store / on-disk row index
+
+走査結果の行（raw・親フォルダ）と key 列の入れ物。Tk には依存しない。
+- RowStore: メモリ上の列（親フォルダは表に1回だけ、行は dir_id + raw）
+- MmapRowStore / MmapKeyColumn: 数百万〜数千万ファイル用。列をファイルに書き、mmap で読む
+- write_key_snapshot / read_key_snapshot: 前回の key 一覧（起動直後にすぐ出す用）
+
+ファイルの形（.rfidx）:
+    ヘッダ  MAGIC(8) + セクション数(uint64) + [名前(16) + 位置(uint64) + 長さ(uint64)] * セクション数
+    本体    セクションを 8 バイト境界で並べる
+文字列列は「name.off（uint64, n+1 個）+ name.blob（UTF-8）」。
+数値はこのマシンのバイト順（その場で書いて読むキャッシュなので持ち運ばない）。
+書くときはセクションごとの一時ファイルに流し、最後に1本へ連結する（全部をメモリに溜めない）。
+key 列の索引（key の並べ替え・key -> 親フォルダ）は外部ソート（一時ファイルの run + k-way merge）で作る。
+"""
+import os
+import sys
+import json
+import heapq
+import itertools
+import mmap
+import pickle
+import shutil
+import struct
+import tempfile
+from array import array
+
+MAGIC = b"RFIDX001"
+_HDR = struct.Struct("<8sQ")
+_SEC = struct.Struct("<16sQQ")
+_FLUSH = 65536  # 数値列はこの件数ごとに書き出す
+NO_KEY = 0xFFFFFFFF  # 空の key（索引には入れない）
+_RUN = 65536  # 外部ソート：この件数ごとに並べ替えて run（一時ファイル）にする
+_CHUNK = 1024  # run は pickle したこの件数ずつの塊（merge 中は run ごとに1塊だけ読む）
+_FANIN = 32  # 一度に merge する run の数（多ければ先にまとめる）
+_MAX_IDS = 1 << 17  # KeyColumnWriter が key -> kid をメモリで引く key 数の上限（超えた分は外部ソート）
+
+
+def _enc(s: str) -> bytes:
+    # POSIX のファイル名は surrogateescape 由来の孤立サロゲートを含むことがある
+    return s.encode("utf-8", "surrogatepass")
+
+
+def _dec(b) -> str:
+    return bytes(b).decode("utf-8", "surrogatepass")
+
+
+# =====================
+# in-memory rows
+# =====================
+class RowView:
+    """RowStore の1行（読み取り専用）。旧 rows の dict と同じ名前で読める。"""
+
+    __slots__ = ("raw", "key", "parent_name", "parent_path")
+
+    def __init__(self, raw, key, parent_name, parent_path):
+        self.raw = raw
+        self.key = key
+        self.parent_name = parent_name
+        self.parent_path = parent_path
+
+    def get(self, name, default=None):
+        return getattr(self, name, default)
+
+    def __getitem__(self, name):
+        try:
+            return getattr(self, name)
+        except AttributeError:
+            raise KeyError(name) from None
+
+
+class RowStore:
+    """走査結果の行を列で持つ（1ファイル1 dict にしない）。
+
+    - 親フォルダは dirs に1回だけ入れる: [(parent_name, parent_path, 割当ジャンル or None), ...]
+    - 行は dir_ids（array('I')、dirs の位置）と raws（拡張子なしのファイル名）
+    - keys は今の key 列（_apply_key_column が差し替える。raws と同じ並び）
+    row(i) / 反復で RowView が取れるが、大量に回すところは列を直接読むこと。
+    """
+
+    def __init__(self):
+        self.dirs = []
+        self.dir_ids = array("I")
+        self.raws = []
+        self.keys = []
+
+    def add_dir(self, parent_name: str, parent_path: str, mapped=None) -> int:
+        self.dirs.append((parent_name, parent_path, mapped))
+        return len(self.dirs) - 1
+
+    def append(self, raw: str, dir_id: int):
+        self.raws.append(raw)
+        self.dir_ids.append(dir_id)
+
+    def __len__(self):
+        return len(self.raws)
+
+    def parent(self, i: int):
+        d = self.dirs[self.dir_ids[i]]
+        return d[0], d[1]
+
+    def mapped(self, i: int):
+        return self.dirs[self.dir_ids[i]][2]
+
+    def key(self, i: int) -> str:
+        return self.keys[i] if i < len(self.keys) else ""
+
+    def row(self, i: int) -> RowView:
+        pn, pp, _m = self.dirs[self.dir_ids[i]]
+        return RowView(self.raws[i], self.key(i), pn, pp)
+
+    def __iter__(self):
+        for i in range(len(self.raws)):
+            yield self.row(i)
+
+    def memory_bytes(self) -> int:
+        """おおよその使用量（文字列本体を含む。keys は別の列と共有することがあるので数えない）"""
+        n = sys.getsizeof(self.raws) + sys.getsizeof(self.dir_ids) + self._dirs_bytes()
+        n += sum(sys.getsizeof(r) for r in self.raws)
+        return n
+
+    def _dirs_bytes(self) -> int:
+        n = sys.getsizeof(self.dirs)
+        for d in self.dirs:
+            n += sys.getsizeof(d) + sys.getsizeof(d[0]) + sys.getsizeof(d[1])
+        return n
+
+    def close(self):
+        pass
+
+
+# =====================
+# section file
+# =====================
+class SectionWriter:
+    """セクションごとに一時ファイルへ追記し、close() で1本の .rfidx にまとめる。"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._tmp = tempfile.mkdtemp(prefix=".rfidx_", dir=os.path.dirname(os.path.abspath(path)))
+        self._files = {}  # name -> file（書いた順がそのままファイル内の順）
+        self._n_scratch = 0
+
+    def _f(self, name: str):
+        f = self._files.get(name)
+        if f is None:
+            if len(name.encode("ascii")) > 16:
+                raise ValueError(f"section name too long: {name}")
+            f = self._files[name] = open(os.path.join(self._tmp, name), "wb")
+        return f
+
+    def write(self, name: str, data: bytes):
+        self._f(name).write(data)
+
+    def write_array(self, name: str, arr):
+        arr.tofile(self._f(name))
+
+    def touch(self, name: str):
+        self._f(name)
+
+    def scratch(self) -> str:
+        """作業用の一時ファイルのパス（セクションにはならない。close / abort で一緒に消える）。"""
+        self._n_scratch += 1
+        return os.path.join(self._tmp, f"~scratch{self._n_scratch}")
+
+    def close(self):
+        names = list(self._files)
+        for f in self._files.values():
+            f.close()
+        sizes = [os.path.getsize(os.path.join(self._tmp, n)) for n in names]
+        pos = _HDR.size + _SEC.size * len(names)
+        table = []
+        for n, size in zip(names, sizes):
+            pos = (pos + 7) & ~7
+            table.append((n, pos, size))
+            pos += size
+        tmp = self.path + ".tmp"
+        try:
+            with open(tmp, "wb") as out:
+                out.write(_HDR.pack(MAGIC, len(names)))
+                for n, off, size in table:
+                    out.write(_SEC.pack(n.encode("ascii"), off, size))
+                for n, off, _size in table:
+                    out.write(b"\0" * (off - out.tell()))
+                    with open(os.path.join(self._tmp, n), "rb") as src:
+                        shutil.copyfileobj(src, out, 1 << 20)
+            os.replace(tmp, self.path)
+        finally:
+            shutil.rmtree(self._tmp, ignore_errors=True)
+
+    def abort(self):
+        for f in self._files.values():
+            try:
+                f.close()
+            except Exception:
+                pass
+        shutil.rmtree(self._tmp, ignore_errors=True)
+
+
+class SectionFile:
+    """.rfidx を読み取り専用で mmap する。セクションは memoryview（コピーしない）。"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._f = open(path, "rb")
+        try:
+            self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            self._f.close()
+            raise
+        self._views = []
+        magic, count = _HDR.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"not a row index: {path}")
+        self._sections = {}
+        for i in range(count):
+            name, off, size = _SEC.unpack_from(self._mm, _HDR.size + _SEC.size * i)
+            self._sections[name.rstrip(b"\0").decode("ascii")] = (off, size)
+
+    def __contains__(self, name):
+        return name in self._sections
+
+    def bytes(self, name: str):
+        off, size = self._sections[name]
+        v = memoryview(self._mm)[off:off + size]
+        self._views.append(v)
+        return v
+
+    def array(self, name: str, typecode: str):
+        v = self.bytes(name).cast(typecode)
+        self._views.append(v)
+        return v
+
+    def close(self):
+        # mmap を閉じる前に memoryview を全部手放す（残っていると BufferError）
+        for v in reversed(self._views):
+            try:
+                v.release()
+            except Exception:
+                pass
+        self._views = []
+        try:
+            self._mm.close()
+        except Exception:
+            pass
+        try:
+            self._f.close()
+        except Exception:
+            pass
+
+
+class StrColumnWriter:
+    """文字列列を name.off / name.blob に流す。"""
+
+    def __init__(self, sw: SectionWriter, name: str):
+        self._sw = sw
+        self._name = name
+        self._pos = 0
+        self._off = array("Q", [0])
+        self.count = 0
+
+    def add(self, s: str):
+        b = _enc(s or "")
+        self._sw.write(self._name + ".blob", b)
+        self._pos += len(b)
+        self._off.append(self._pos)
+        self.count += 1
+        if len(self._off) >= _FLUSH:
+            self._sw.write_array(self._name + ".off", self._off)
+            self._off = array("Q")
+
+    def finish(self):
+        self._sw.touch(self._name + ".blob")
+        self._sw.write_array(self._name + ".off", self._off)
+        self._off = array("Q")
+
+
+class MmapStrings:
+    """mmap 上の文字列列（list のように len / [i] / 反復できる。読むたびに decode）"""
+
+    def __init__(self, sf: SectionFile, name: str):
+        self._off = sf.array(name + ".off", "Q")
+        self._blob = sf.bytes(name + ".blob")
+
+    def __len__(self):
+        return len(self._off) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return _dec(self._blob[self._off[i]:self._off[i + 1]])
+
+    def __iter__(self):
+        off, blob = self._off, self._blob
+        for i in range(len(off) - 1):
+            yield _dec(blob[off[i]:off[i + 1]])
+
+
+class _ArrayBuf:
+    """数値列をためて _FLUSH 件ごとにセクションへ書き出す。"""
+
+    def __init__(self, sw: SectionWriter, name: str, typecode: str):
+        self._sw = sw
+        self._name = name
+        self._buf = array(typecode)
+
+    def append(self, v: int):
+        self._buf.append(v)
+        if len(self._buf) >= _FLUSH:
+            self.flush()
+
+    def extend(self, vs):
+        self._buf.extend(vs)
+        if len(self._buf) >= _FLUSH:
+            self.flush()
+
+    def flush(self):
+        self._sw.write_array(self._name, self._buf)
+        del self._buf[:]
+
+
+# =====================
+# external sort
+# =====================
+class _Spill:
+    """tuple を書いた順に一時ファイルへ溜め、書いた順に読み返す。"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._f = open(path, "wb")
+        self._buf = []
+
+    def add(self, rec):
+        self._buf.append(rec)
+        if len(self._buf) >= _CHUNK:
+            self._dump()
+
+    def extend(self, recs):
+        if self._buf:
+            self._dump()
+        for i in range(0, len(recs), _CHUNK):
+            pickle.dump(recs[i:i + _CHUNK], self._f, pickle.HIGHEST_PROTOCOL)
+
+    def _dump(self):
+        pickle.dump(self._buf, self._f, pickle.HIGHEST_PROTOCOL)
+        self._buf = []
+
+    def close(self):
+        if self._f is not None:
+            if self._buf:
+                self._dump()
+            self._f.close()
+            self._f = None
+
+    def __iter__(self):
+        self.close()
+        with open(self.path, "rb") as f:
+            while True:
+                try:
+                    chunk = pickle.load(f)
+                except EOFError:
+                    return
+                yield from chunk
+
+    def remove(self):
+        self.close()
+        try:
+            os.remove(self.path)
+        except Exception:
+            pass
+
+
+class _ArrayFile:
+    """数値列を一時ファイルに流し、_FLUSH 件ずつの array で読み返す。"""
+
+    def __init__(self, path: str, typecode: str):
+        self.path = path
+        self._typecode = typecode
+        self._f = open(path, "wb")
+        self._buf = array(typecode)
+
+    def append(self, v: int):
+        self._buf.append(v)
+        if len(self._buf) >= _FLUSH:
+            self._buf.tofile(self._f)
+            del self._buf[:]
+
+    def close(self):
+        if self._f is not None:
+            self._buf.tofile(self._f)
+            del self._buf[:]
+            self._f.close()
+            self._f = None
+
+    def chunks(self):
+        self.close()
+        with open(self.path, "rb") as f:
+            while True:
+                a = array(self._typecode)
+                try:
+                    a.fromfile(f, _FLUSH)
+                except EOFError:  # 最後の塊（足りない分だけ読めている）
+                    if a:
+                        yield a
+                    return
+                yield a
+
+    def remove(self):
+        self.close()
+        try:
+            os.remove(self.path)
+        except Exception:
+            pass
+
+
+class _ExternalSort:
+    """tuple を件数によらず一定のメモリで並べ替える（tuple の大小順）。
+
+    _RUN 件ごとに並べ替えて run に書き、読むときに heapq.merge でつなぐ。
+    全部が1つの run に収まればディスクには書かない。読めるのは1回だけ（読み終えた run は消す）。
+    """
+
+    def __init__(self, scratch):
+        self._scratch = scratch  # () -> 一時ファイルのパス
+        self._buf = []
+        self._runs = []
+
+    def add(self, rec):
+        self._buf.append(rec)
+        if len(self._buf) >= _RUN:
+            self._flush()
+
+    def _flush(self):
+        self._buf.sort()
+        run = _Spill(self._scratch())
+        run.extend(self._buf)
+        run.close()
+        self._runs.append(run)
+        self._buf = []
+
+    def _merge_to(self, runs):
+        out = _Spill(self._scratch())
+        for rec in heapq.merge(*runs):
+            out.add(rec)
+        out.close()
+        for r in runs:
+            r.remove()
+        return out
+
+    def __iter__(self):
+        if not self._runs:
+            buf, self._buf = self._buf, []
+            buf.sort()
+            yield from buf
+            return
+        if self._buf:
+            self._flush()
+        while len(self._runs) > _FANIN:
+            runs = self._runs
+            self._runs = [self._merge_to(runs[i:i + _FANIN]) for i in range(0, len(runs), _FANIN)]
+        merged = heapq.merge(*self._runs)
+        try:
+            yield from merged
+        finally:
+            merged.close()
+            del merged
+            self.remove()
+
+    def remove(self):
+        for r in self._runs:
+            r.remove()
+        self._runs = []
+        self._buf = []
+
+
+# =====================
+# on-disk rows
+# =====================
+class RowIndexWriter:
+    """走査しながら raw と dir_id を .rfidx に流す。親フォルダの表（dirs）はメモリに残す。"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._sw = SectionWriter(path)
+        self._raws = StrColumnWriter(self._sw, "raw")
+        self._dir_ids = _ArrayBuf(self._sw, "dir_id", "I")
+
+    def append(self, raw: str, dir_id: int):
+        self._raws.add(raw)
+        self._dir_ids.append(dir_id)
+
+    def __len__(self):
+        return self._raws.count
+
+    def finish(self, dirs) -> "MmapRowStore":
+        self._raws.finish()
+        self._dir_ids.flush()
+        self._sw.close()
+        return MmapRowStore(self.path, dirs)
+
+    def abort(self):
+        self._sw.abort()
+
+
+class MmapRowStore(RowStore):
+    """RowStore と同じ読み方で、raws / dir_ids は mmap から読む（常駐は dirs と触ったページだけ）。"""
+
+    def __init__(self, path: str, dirs):
+        self.path = path
+        self._sf = SectionFile(path)
+        self.dirs = list(dirs)
+        self.dir_ids = self._sf.array("dir_id", "I")
+        self.raws = MmapStrings(self._sf, "raw")
+        self.keys = []
+
+    def add_dir(self, parent_name, parent_path, mapped=None):
+        raise TypeError("MmapRowStore is read-only")
+
+    def append(self, raw, dir_id):
+        raise TypeError("MmapRowStore is read-only")
+
+    def memory_bytes(self) -> int:
+        return self._dirs_bytes()
+
+    def close(self):
+        self.raws = []
+        self.dir_ids = array("I")
+        self._sf.close()
+
+
+# =====================
+# on-disk key column + index
+# =====================
+class KeyColumnWriter:
+    """key 列を .rfidx に書く。同時に KeyIndex と同じ引き方（key -> 親フォルダ・件数）の表も作る。
+
+    行ごとの key は kid（重複なしの key 表の位置、出現順）で持つ。
+    作る間のメモリは行数・ユニーク key 数によらず頭打ちにする:
+    - 初めの _MAX_IDS 個の key は key -> kid の dict で引く（kid がその場で決まる）
+    - それより後に初めて出た key は (key, 行, dir_id) を外部ソートへ回し、finish() で kid を振る
+      （出現順なので、あふれた key の kid は必ず dict の key より後ろ）
+    - 行ごとの kid・(kid, dir_id) の組は一時ファイルへ流す
+    stats_func(key) -> (長さ, 数字数, 文字数) はユニーク key ごとに1回だけ呼ぶ。
+    """
+
+    def __init__(self, path: str, stats_func):
+        self.path = path
+        self._stats_func = stats_func
+        sw = self._sw = SectionWriter(path)
+        self._ids = {}
+        self._keys = StrColumnWriter(sw, "key")
+        self._stat = _ArrayBuf(sw, "stat", "I")
+        self._cnt = array("I")  # dict の key の件数（あふれた key の件数は finish で数える）
+        self._col = _ArrayFile(sw.scratch(), "I")  # 行ごとの kid。あふれた key の行は仮に NO_KEY
+        self._pairs = _ExternalSort(sw.scratch)  # (kid, dir_id)：dict の key が出た親フォルダ
+        self._over = None  # _ExternalSort (key, 行, dir_id)：あふれた key の行
+        self._dir = None
+        self._seen = set()  # 今のフォルダで出た kid
+        self.count = 0
+
+    def add(self, key: str, dir_id: int):
+        row = self.count
+        self.count += 1
+        k = (key or "").strip()
+        if not k:
+            self._col.append(NO_KEY)
+            return
+        kid = self._ids.get(k)
+        if kid is None:
+            if len(self._ids) >= _MAX_IDS:
+                if self._over is None:
+                    self._over = _ExternalSort(self._sw.scratch)
+                self._over.add((k, row, dir_id))
+                self._col.append(NO_KEY)  # finish で埋める
+                return
+            kid = self._ids[k] = len(self._ids)
+            self._keys.add(k)
+            self._stat.extend(self._stats_func(k))
+            self._cnt.append(0)
+        self._col.append(kid)
+        self._cnt[kid] += 1
+        if dir_id != self._dir:
+            self._dir = dir_id
+            self._seen = set()
+        if kid not in self._seen:
+            self._seen.add(kid)
+            self._pairs.add((kid, dir_id))
+
+    def __len__(self):
+        return self.count
+
+    def finish(self, dirs) -> "MmapKeyColumn":
+        sw = self._sw
+        scratch = sw.scratch
+        nd = len(self._ids)
+        # 親フォルダ（名前の空いたものは出さない）は kid ごとに (name, path) 順で並べる
+        named = bytearray(1 if d[0].strip() else 0 for d in dirs)
+        rank = array("I", [0]) * len(dirs)
+        for r, d in enumerate(sorted(range(len(dirs)), key=lambda j: (dirs[j][0].strip(), dirs[j][1].strip()))):
+            rank[d] = r
+
+        def parents(ds):
+            # ds は並び順に来るので、同じフォルダは隣どうしの重複だけ除いてある
+            return tuple(sorted(set(ds), key=rank.__getitem__)) if len(ds) > 1 else tuple(ds)
+
+        # 1) あふれた key を key 順に読み、key ごとに最初の行・件数・親フォルダをまとめて
+        #    最初の行の順（= kid の順）へ並べ替えに回す。行は (key 順の位置, 行) で順に書いておく
+        by_first = _ExternalSort(scratch)  # (最初の行, key, 件数, 親フォルダ)
+        row_s = _Spill(scratch())  # (あふれた key の中での key 順の位置, 行)
+        if self._over is not None:
+            s = -1
+            cur = None
+            first = n = 0
+            ds = []
+            add_row = row_s.add
+            for k, row, d in self._over:
+                if k != cur:
+                    if cur is not None:
+                        by_first.add((first, cur, n, parents(ds)))
+                    s += 1
+                    cur, first, n, ds = k, row, 0, []
+                n += 1
+                if named[d] and (not ds or ds[-1] != d):
+                    ds.append(d)
+                add_row((s, row))
+            if cur is not None:
+                by_first.add((first, cur, n, parents(ds)))
+            self._over = None
+
+        # 2) kid の順に件数・親フォルダ（CSR）を書く。dict の key は (kid, dir_id) の組から、
+        #    あふれた key は 1) から（key 表・統計もここで後ろへ足す）
+        cnt = _ArrayBuf(sw, "cnt", "I")
+        cnt.extend(self._cnt)
+        self._cnt = None
+        start = _ArrayBuf(sw, "kdir.off", "Q")
+        kdir = _ArrayBuf(sw, "kdir", "I")
+        start.append(0)
+        pos = 0
+        nxt = 0
+        for kid, grp in itertools.groupby(self._pairs, key=lambda p: p[0]):
+            for _ in range(nxt, kid):
+                start.append(pos)
+            ds = []
+            for _kid, d in grp:
+                if named[d] and (not ds or ds[-1] != d):
+                    ds.append(d)
+            ps = parents(ds)
+            kdir.extend(ps)
+            pos += len(ps)
+            start.append(pos)
+            nxt = kid + 1
+        for _ in range(nxt, nd):
+            start.append(pos)
+        self._pairs = None
+        over = _ExternalSort(scratch)  # (key, kid)：あふれた key を key 順へ
+        for kid, (_first, k, n, ps) in enumerate(by_first, nd):
+            self._keys.add(k)
+            self._stat.extend(self._stats_func(k))
+            cnt.append(n)
+            kdir.extend(ps)
+            pos += len(ps)
+            start.append(pos)
+            over.add((k, kid))
+        self._keys.finish()
+        for buf in (self._stat, cnt, start, kdir):
+            buf.flush()
+
+        # 3) key の並べ替え（二分探索で key -> kid を引く）：dict の key とあふれた key を key 順に merge。
+        #    あふれた key の行は (行, kid) にして行順へ並べ替えに回す
+        table = sorted(self._ids.items())
+        self._ids = None
+        order = _ArrayBuf(sw, "sorted", "I")
+        row_kid = _ExternalSort(scratch)
+        rows = iter(row_s)
+        pending = next(rows, None)
+        s = 0
+        for _k, kid in heapq.merge(table, over):
+            order.append(kid)
+            if kid >= nd:
+                while pending is not None and pending[0] == s:
+                    row_kid.add((pending[1], kid))
+                    pending = next(rows, None)
+                s += 1
+        order.flush()
+        del table
+        row_s.remove()
+
+        # 4) 行ごとの kid：仮の列のうち、あふれた key の行だけ埋める
+        fill = iter(row_kid)
+        p = next(fill, None)
+        base = 0
+        for chunk in self._col.chunks():
+            end = base + len(chunk)
+            while p is not None and p[0] < end:
+                chunk[p[0] - base] = p[1]
+                p = next(fill, None)
+            sw.write_array("kid", chunk)
+            base = end
+        sw.touch("kid")
+        self._col.remove()
+        sw.close()
+        return MmapKeyColumn(self.path, dirs)
+
+    def abort(self):
+        for x in (self._col, self._pairs, self._over):
+            if x is not None:
+                x.remove()
+        self._sw.abort()
+
+
+class MmapKeyColumn:
+    """.rfidx の key 列。list と同じく行の位置で key を返す（len は行数）。索引は .index。"""
+
+    def __init__(self, path: str, dirs):
+        self.path = path
+        self._sf = SectionFile(path)
+        self._kid = self._sf.array("kid", "I")
+        self.index = MmapKeyIndex(self._sf, dirs)
+
+    def __len__(self):
+        return len(self._kid)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        kid = self._kid[i]
+        return "" if kid == NO_KEY else self.index.keys[kid]
+
+    def __iter__(self):
+        keys = self.index.keys
+        for kid in self._kid:
+            yield "" if kid == NO_KEY else keys[kid]
+
+    def close(self):
+        self._kid = array("I")
+        self.index = None
+        self._sf.close()
+
+    def remove_file(self):
+        self.close()
+        try:
+            os.remove(self.path)
+        except Exception:
+            pass
+
+
+class _StatRows:
+    """key の並び（kid）どおりの (長さ, 数字数, 文字数)"""
+
+    def __init__(self, flat):
+        self._flat = flat
+
+    def __len__(self):
+        return len(self._flat) // 3
+
+    def __getitem__(self, kid):
+        j = 3 * kid
+        return self._flat[j], self._flat[j + 1], self._flat[j + 2]
+
+
+class MmapKeyIndex:
+    """KeyIndex と同じ読み方（parents / file_count / keys_in_order / stats）を .rfidx から引く。"""
+
+    version = 0  # 書き換えないので版は固定（列が替われば別オブジェクト）
+
+    def __init__(self, sf: SectionFile, dirs):
+        self.keys = MmapStrings(sf, "key")
+        self.stats = _StatRows(sf.array("stat", "I"))
+        self._cnt = sf.array("cnt", "I")
+        self._sorted = sf.array("sorted", "I")
+        self._kdir_off = sf.array("kdir.off", "Q")
+        self._kdir = sf.array("kdir", "I")
+        self._dirs = dirs
+
+    def __len__(self):
+        return len(self.keys)
+
+    def id_of(self, key: str):
+        k = (key or "").strip()
+        keys, order = self.keys, self._sorted
+        lo, hi = 0, len(order)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if keys[order[mid]] < k:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(order) and keys[order[lo]] == k:
+            return order[lo]
+        return None
+
+    def file_count(self, key: str) -> int:
+        kid = self.id_of(key)
+        return 0 if kid is None else self._cnt[kid]
+
+    def file_count_at(self, kid: int) -> int:
+        return self._cnt[kid]
+
+    def parents(self, key: str):
+        """ソート済みの親フォルダ [{"name", "path"}, ...]"""
+        kid = self.id_of(key)
+        return [] if kid is None else self.parents_at(kid)
+
+    def parents_at(self, kid: int):
+        out = []
+        for d in self._kdir[self._kdir_off[kid]:self._kdir_off[kid + 1]]:
+            pn, pp, _m = self._dirs[d]
+            out.append({"name": pn.strip(), "path": pp.strip()})
+        return out
+
+    def keys_in_order(self):
+        return self.keys
+
+
+# =====================
+# warm-start snapshot
+# =====================
+KEY_SNAPSHOT_VERSION = 1
+
+
+class SnapshotKeyIndex:
+    """前回の key 一覧（スナップショット）。KeyIndex と同じ読み方だけできる（走査し直すまでのつなぎ）。"""
+
+    version = 0
+
+    def __init__(self, keys, stats, dirs, parents, counts):
+        self.keys = keys
+        self.stats = stats  # keys と同じ並びの (長さ, 数字数, 文字数)
+        self._dirs = dirs
+        self._parents = parents
+        self._counts = counts
+        self._ids = {k: i for i, k in enumerate(keys)}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def id_of(self, key: str):
+        return self._ids.get((key or "").strip())
+
+    def file_count(self, key: str) -> int:
+        i = self.id_of(key)
+        return 0 if i is None else self._counts[i]
+
+    def parents(self, key: str):
+        i = self.id_of(key)
+        if i is None:
+            return []
+        return [{"name": self._dirs[d][0], "path": self._dirs[d][1]} for d in self._parents[i]]
+
+    def keys_in_order(self):
+        return self.keys
+
+
+def write_key_snapshot(path: str, meta: dict, idx, max_keys: int) -> int:
+    """idx（KeyIndex / MmapKeyIndex）の key・親フォルダ・件数・統計を JSON に書く（先頭 max_keys 件まで）。
+
+    dirs は (name, path) の表にまとめ、各 key からは表の位置で指す。
+    Returns: 書いた key 数
+    """
+    keys = idx.keys_in_order()
+    n = min(len(keys), int(max_keys))
+    stats = idx.stats
+    by_pos = not hasattr(stats, "get")
+    at = hasattr(idx, "parents_at")  # mmap の索引は位置で引く（key で引くと二分探索になる）
+    dir_ids = {}
+    out_keys, out_stats, out_parents, out_counts = [], [], [], []
+    for i in range(n):
+        k = keys[i]
+        ps = idx.parents_at(i) if at else idx.parents(k)
+        ids = []
+        for p in ps:
+            dk = (p["name"], p["path"])
+            d = dir_ids.get(dk)
+            if d is None:
+                d = dir_ids[dk] = len(dir_ids)
+            ids.append(d)
+        out_keys.append(k)
+        out_stats.append(list(stats[i] if by_pos else stats[k]))
+        out_parents.append(ids)
+        out_counts.append(idx.file_count_at(i) if at else idx.file_count(k))
+    data = dict(meta)
+    data.update({
+        "v": KEY_SNAPSHOT_VERSION,
+        "truncated": n < len(keys),
+        "dirs": [list(dk) for dk in dir_ids],
+        "keys": out_keys,
+        "stats": out_stats,
+        "parents": out_parents,
+        "counts": out_counts,
+    })
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp, path)
+    return n
+
+
+def read_key_snapshot(path: str):
+    """Returns: (meta dict, SnapshotKeyIndex) or None（無い・壊れている・版違い）"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if not isinstance(data, dict) or data.get("v") != KEY_SNAPSHOT_VERSION:
+            return None
+        idx = SnapshotKeyIndex(
+            data.pop("keys"),
+            [tuple(x) for x in data.pop("stats")],
+            [tuple(x) for x in data.pop("dirs")],
+            data.pop("parents"),
+            data.pop("counts"),
+        )
+        return data, idx
+    except Exception:
+        return None
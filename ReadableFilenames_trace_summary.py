@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+Readable Filenames - トレース（ReadableFilenames_trace_*.jsonl）のまとめ
+
+span の入れ子（stack）ごとに 合計・自分だけの時間・回数 を足し、プロセスごとに木で出す（flame graph の文字版）。
+IPC（ipc.send / ipc.recv）は msg_id で突き合わせて遅れを出す。
+
+使い方:
+    python ReadableFilenames_trace_summary.py                 # このファイルの隣のトレースを全部
+    python ReadableFilenames_trace_summary.py DIR_OR_FILE ... [--min-ms 1] [--width 40]
+"""
+import os
+import sys
+import glob
+import json
+import argparse
+
+TRACE_GLOB = "ReadableFilenames_trace_*.jsonl*"
+
+
+def _files(paths):
+    out = []
+    for p in paths:
+        if os.path.isdir(p):
+            out.extend(sorted(glob.glob(os.path.join(p, TRACE_GLOB))))
+        else:
+            out.append(p)
+    return out
+
+
+def read_records(paths):
+    for path in _files(paths):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        rec = json.loads(line)
+                    except Exception:
+                        continue  # 書きかけの行
+                    if isinstance(rec, dict):
+                        yield rec
+        except OSError:
+            continue
+
+
+class Node:
+    __slots__ = ("name", "total", "count", "children", "items")
+
+    def __init__(self, name):
+        self.name = name
+        self.total = 0.0
+        self.count = 0
+        self.items = 0
+        self.children = {}
+
+    def child(self, name):
+        c = self.children.get(name)
+        if c is None:
+            c = self.children[name] = Node(name)
+        return c
+
+    def self_ms(self):
+        return max(0.0, self.total - sum(c.total for c in self.children.values()))
+
+
+def build(records):
+    """Returns: procs {(sid, role, pid): {"root": Node, "first": ts, "last": ts, "spans": n}}, sends, recvs"""
+    procs = {}
+    sends, recvs = [], []
+    for r in records:
+        key = (r.get("sid", "?"), r.get("role", ""), r.get("pid", 0))
+        p = procs.get(key)
+        if p is None:
+            p = procs[key] = {"root": Node(""), "first": None, "last": None, "spans": 0}
+        ts = r.get("ts")
+        if isinstance(ts, (int, float)):
+            p["first"] = ts if p["first"] is None else min(p["first"], ts)
+            end = ts + float(r.get("dur_ms", 0.0)) / 1000.0
+            p["last"] = end if p["last"] is None else max(p["last"], end)
+        if r.get("event"):
+            if r.get("name") == "ipc.send":
+                sends.append(r)
+            elif r.get("name") == "ipc.recv":
+                recvs.append(r)
+            continue
+        p["spans"] += 1
+        stack = (r.get("stack") or r.get("name") or "?").split(";")
+        node = p["root"]
+        for part in stack:
+            node = node.child(part)
+        node.total += float(r.get("dur_ms", 0.0))
+        node.count += 1
+        node.items += int(r.get("items") or 0)
+    # 木の上の段の合計は子の合計以上にしておく（外側の span が記録されていない場合）
+    for p in procs.values():
+        _fill(p["root"])
+    return procs, sends, recvs
+
+
+def _fill(node):
+    s = sum(_fill(c) for c in node.children.values())
+    if node.total < s:
+        node.total = s
+    return node.total
+
+
+def render(procs, sends, recvs, *, min_ms=1.0, width=40, out=sys.stdout):
+    for (sid, role, pid), p in sorted(procs.items(), key=lambda kv: kv[1]["first"] or 0):
+        root = p["root"]
+        total = sum(c.total for c in root.children.values())
+        wall = ((p["last"] or 0) - (p["first"] or 0)) * 1000.0
+        out.write(f"== session {sid}  {role or '?'}  pid {pid}  spans={p['spans']}  traced={total:.1f} ms  wall={wall:.1f} ms\n")
+        _render_node(root, total, 0, min_ms, width, out)
+        out.write("\n")
+
+    if sends or recvs:
+        by_id = {r.get("msg_id"): r for r in recvs if r.get("msg_id")}
+        out.write("== IPC\n")
+        matched = 0
+        for s in sends:
+            r = by_id.get(s.get("msg_id")) if s.get("msg_id") else None
+            if r is None:
+                continue
+            matched += 1
+            lag = (r["ts"] - s["ts"]) * 1000.0
+            out.write(f"  {s.get('cmd') or '(payload)':<18} {s.get('via', ''):<6} {lag:8.1f} ms  {s.get('sid')} -> {r.get('sid')}\n")
+        peers = {}
+        for r in recvs:
+            peers[(r.get("peer"), r.get("sid"))] = peers.get((r.get("peer"), r.get("sid")), 0) + 1
+        for (src, dst), n in sorted(peers.items(), key=lambda kv: -kv[1]):
+            out.write(f"  recv {n:5d}  from session {src} in {dst}\n")
+        out.write(f"  sent={len(sends)} received={len(recvs)} matched={matched}\n")
+
+
+def _render_node(node, total, depth, min_ms, width, out):
+    for c in sorted(node.children.values(), key=lambda n: -n.total):
+        if c.total < min_ms:
+            continue
+        frac = c.total / total if total > 0 else 0.0
+        bar = "#" * max(1, int(round(frac * width))) if frac > 0 else ""
+        items = f" items={c.items}" if c.items else ""
+        out.write(
+            f"{frac * 100:6.1f}% {c.total:10.1f} ms  self {c.self_ms():9.1f} ms  n={c.count:<6d} "
+            f"{'  ' * depth}{c.name}{items}  {bar}\n"
+        )
+        _render_node(c, total, depth + 1, min_ms, width, out)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="ReadableFilenames trace summary")
+    ap.add_argument("paths", nargs="*", help="trace files or folders (default: next to this script)")
+    ap.add_argument("--min-ms", type=float, default=1.0, help="hide nodes below this total")
+    ap.add_argument("--width", type=int, default=40, help="bar width")
+    a = ap.parse_args(argv)
+    paths = a.paths or [os.path.dirname(os.path.abspath(__file__))]
+    procs, sends, recvs = build(read_records(paths))
+    if not procs:
+        sys.stderr.write("no trace records found\n")
+        return 1
+    render(procs, sends, recvs, min_ms=a.min_ms, width=a.width)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
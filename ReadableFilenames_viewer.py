@@ -13,18 +13,26 @@ AIタイトルビューア（検索＋工房モード）
 
 ※ 収集モードは廃案のため、このファイルには存在しません
 """
+import time
+
+_T_IMPORT = time.perf_counter()  # 起動時間の計測（RF_STARTUP_REPORT）の起点
+
 import os
 import sys
 import json
-import time
 import subprocess
+import tempfile
+import threading
 import urllib.parse
 import webbrowser
 import re
+import bisect
+from array import array
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, simpledialog
 import importlib.util
 import traceback
+from collections import OrderedDict
 
 
 # =====================
@@ -115,6 +123,26 @@ class ToolTip:
                 pass
             self._win = None
 
+def _load_local_module(mod_name: str):
+    """Load ReadableFilenames_*.py next to this viewer by path and register it in sys.modules.
+    Avoids CWD issues; sibling modules that `import` each other then share the same instance.
+    """
+    if mod_name in sys.modules:
+        return sys.modules[mod_name]
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), mod_name + ".py")
+    spec = importlib.util.spec_from_file_location(mod_name, path)
+    mod = importlib.util.module_from_spec(spec)
+    assert spec and spec.loader
+    # register so process-pool workers (検証) can pickle module-level functions
+    sys.modules[spec.name] = mod
+    try:
+        spec.loader.exec_module(mod)  # type: ignore
+    except Exception:
+        sys.modules.pop(spec.name, None)
+        raise
+    return mod
+
+
 def _load_workshop_panel():
     """Load WorkshopPanel / StrongSaveWindow from ReadableFilenames_workshop.py next to this viewer.
     Avoids CWD issues and shows the real import error when it fails.
@@ -124,18 +152,43 @@ def _load_workshop_panel():
     if not os.path.exists(ws_path):
         return None, None, f"ReadableFilenames_workshop.py が見つかりません\n{ws_path}"
     try:
-        spec = importlib.util.spec_from_file_location("ReadableFilenames_workshop", ws_path)
-        mod = importlib.util.module_from_spec(spec)
-        assert spec and spec.loader
-        spec.loader.exec_module(mod)  # type: ignore
+        mod = _load_local_module("ReadableFilenames_workshop")
         return getattr(mod, "WorkshopPanel", None), getattr(mod, "StrongSaveWindow", None), None
     except Exception:
         return None, None, traceback.format_exc()
 
 
-WorkshopPanel, StrongSaveWindow, _WORKSHOP_IMPORT_ERROR = _load_workshop_panel()
+rf_metrics = _load_local_module("ReadableFilenames_metrics")
+rf_ipc = _load_local_module("ReadableFilenames_ipc")
+rf_rows = _load_local_module("ReadableFilenames_rowindex")
+RowView = rf_rows.RowView
+RowStore = rf_rows.RowStore
+# 候補生成・割当・走査の中身は Tk なしのモジュールにある（ここでは同じ名前で使う）
+rf_core = _load_local_module("ReadableFilenames_core")
+minimal_clean_for_search = rf_core.minimal_clean_for_search
+compile_genre_patterns = rf_core.compile_genre_patterns
+apply_compiled_patterns = rf_core.apply_compiled_patterns
+apply_patterns_for_genre = rf_core.apply_patterns_for_genre
+key_filter_stats = rf_core.key_filter_stats
+key_digit_ratio = rf_core.key_digit_ratio
+normalize_genre_map = rf_core.normalize_genre_map
+PathTrie = rf_core.PathTrie
+build_genre_trie = rf_core.build_genre_trie
+# 工房モジュールは最初に工房を開くときに読む（_ensure_workshop_module）。検索だけなら読まない
+WorkshopPanel = StrongSaveWindow = _WORKSHOP_IMPORT_ERROR = None
+_WORKSHOP_LOADED = False
+
+
+def _ensure_workshop_module():
+    global WorkshopPanel, StrongSaveWindow, _WORKSHOP_IMPORT_ERROR, _WORKSHOP_LOADED
+    if not _WORKSHOP_LOADED:
+        WorkshopPanel, StrongSaveWindow, _WORKSHOP_IMPORT_ERROR = _load_workshop_panel()
+        _WORKSHOP_LOADED = True
+    return WorkshopPanel is not None
 APP_NAME = "Readable Filenames"
+APP_TITLE = APP_NAME  # 工房から移ってきたダイアログが使う名前
 WORKSHOP_PY = "ReadableFilenames_workshop.py"
+STARTUP_TIMING_JSON = "ReadableFilenames_startup_timing.json"
 
 LOCK_FILE = "_ai_title_workshop_lock.json"
 IPC_INBOX = "_ai_title_workshop_inbox.jsonl"
@@ -147,6 +200,20 @@ STATE_JSON = "ReadableFilenames_last_send.json"
 N_TARGET = 10
 K_TARGET = 10
 
+# 検索候補 key のキャッシュ（ジャンル × 適用状態ごとの列）
+KEY_CACHE_MAX_CELLS = 1_500_000  # 全列の key 数の合計（超えたら古い列から捨てる）
+KEY_CACHE_MAX_COLS = 16
+KEY_BG_CHUNK = 2000  # 裏計算の1回分（after 1回あたりの行数）
+
+# 走査結果の置き場所（設定 "row_store"）: memory / mmap（ファイルに書いて mmap で読む）/ auto
+ROW_STORE_MODES = ("auto", "memory", "mmap")
+ROW_MMAP_AUTO_ROWS = 1_000_000  # auto: 走査中にこの件数を超えたら mmap に切り替える
+ROWS_CACHE_DIR = "_rows_cache"
+
+# 起動直後に出す前回の key 一覧（終了時に書く）
+KEY_SNAPSHOT_JSON = "ReadableFilenames_keys_snapshot.json"
+KEY_SNAPSHOT_MAX_KEYS = 300_000
+
 DEFAULT_ENGINE_DEFS = [
     {"name": "AI", "url": "https://www.perplexity.ai/search?q={q}"},
     {"name": "Google", "url": "https://www.google.com/search?q={q}"},
@@ -164,6 +231,7 @@ def get_app_dir() -> str:
 
 
 
+@rf_metrics.timed("json.load")
 def load_json(path: str, default):
     try:
         with open(path, "r", encoding="utf-8") as f:
@@ -172,6 +240,7 @@ def load_json(path: str, default):
         return default
 
 
+@rf_metrics.timed("json.save")
 def save_json(path: str, obj):
     tmp = path + ".tmp"
     with open(tmp, "w", encoding="utf-8") as f:
@@ -203,6 +272,440 @@ def engine_names(defs):
     return [d["name"] for d in normalize_engine_defs(defs)]
 
 
+# ---------- key filter (数字だらけ・短すぎる候補を隠す) ----------
+FILTER_MAX_MIN_CHARS = 8  # _filter_params の min_chars の上限（長さバケットはここで頭打ち）
+
+
+class PickedKeys:
+    """keys[ids[0]], keys[ids[1]], ... を list のように読む（文字列を並べ直さない）。
+
+    ids は昇順。index(value) は id_of(value) -> id を二分探索するので、全体を dict にしない。
+    """
+
+    lazy = True
+
+    def __init__(self, keys, ids, id_of):
+        self._keys = keys
+        self._ids = ids
+        self._id_of = id_of
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self._keys[j] for j in self._ids[i]]
+        return self._keys[self._ids[i]]
+
+    def __iter__(self):
+        keys = self._keys
+        for j in self._ids:
+            yield keys[j]
+
+    def index(self, value):
+        j = self._id_of(value)
+        if j is not None:
+            p = bisect.bisect_left(self._ids, j)
+            if p < len(self._ids) and self._ids[p] == j:
+                return p
+        raise ValueError(value)
+
+
+class KeyFilterIndex:
+    """候補 key（出現順・重複なし）を 長さバケット × 数字割合 で引けるようにしたもの。
+
+    表示される条件（_is_numeric_dominant_key と同じ）:
+        長さ >= min_chars かつ 数字割合 < ratio_th
+    バケットごとに割合でソートしておけば、スライダー変更は bisect だけ。
+    keys は list でも mmap の列（MmapStrings）でもよい。コピーしない。
+    """
+
+    def __init__(self, keys, stats=None, id_of=None):
+        # stats: key -> key_filter_stats(key) の dict（KeyIndex）か、keys と同じ並びの列（MmapKeyIndex）
+        # id_of: key -> keys の位置（無ければ dict を必要になったときに作る）
+        self.keys = keys if hasattr(keys, "__getitem__") else list(keys)
+        self._id_of = id_of
+        self._ids_by_key = None
+        by_pos = stats is not None and not hasattr(stats, "get")
+        buckets = [[] for _ in range(FILTER_MAX_MIN_CHARS + 1)]
+        for i, k in enumerate(self.keys):
+            if by_pos:
+                st = stats[i]
+            else:
+                st = stats.get(k) if stats is not None else None
+            n, d, a = st if st is not None else key_filter_stats(k)
+            buckets[min(n, FILTER_MAX_MIN_CHARS)].append((key_digit_ratio(d, a), i))
+        self._ratios = []
+        self._ids = []
+        for b in buckets:
+            b.sort()
+            self._ratios.append(array("d", [r for r, _ in b]))
+            self._ids.append(array("I", [i for _, i in b]))
+
+    def visible_ids(self, ratio_th: float, min_chars: int):
+        out = array("I")
+        for b in range(max(0, int(min_chars)), FILTER_MAX_MIN_CHARS + 1):
+            n = bisect.bisect_left(self._ratios[b], ratio_th)
+            out.extend(self._ids[b][:n])
+        return array("I", sorted(out))  # 出現順に戻す
+
+    def id_of(self, key):
+        if self._id_of is not None:
+            return self._id_of(key)
+        if self._ids_by_key is None:
+            self._ids_by_key = {k: i for i, k in enumerate(self.keys)}
+        return self._ids_by_key.get(key)
+
+    def visible(self, ratio_th: float, min_chars: int):
+        return PickedKeys(self.keys, self.visible_ids(ratio_th, min_chars), self.id_of)
+
+
+class KeyIndex:
+    """候補 key の索引（key -> 行・親フォルダ・件数）。行の追加・削除で差分更新する。
+
+    - 行は row_id（_scan の位置）で数える
+    - 親フォルダは (name, path) をソート済みで持つ（選択のたびにソートしない）
+    - key の並びは「最初に出てきた行」の順（従来の一覧と同じ）
+    - key_filter_stats も key を初めて見たときに1回だけ数える
+    """
+
+    def __init__(self):
+        self._rows = {}  # key -> set(row_id)
+        self._first = {}  # key -> 最小の row_id（_stale の key は keys_in_order で数え直す）
+        self._stale = set()  # 最小の行を消した key（消すたびに min を取ると同じ key の行の張り替えが O(n^2)）
+        self._parents = {}  # key -> {(name, path): 行数}
+        self._sorted = {}  # key -> [(name, path), ...]（ソート済み）
+        self.stats = {}  # key -> (長さ, 数字数, 文字数)
+        self.version = 0
+        self._order = None  # (version, [key...])
+
+    def __len__(self):
+        return len(self._rows)
+
+    def add(self, row_id: int, key: str, parent_name: str, parent_path: str):
+        k = (key or "").strip()
+        if not k:
+            return
+        rows = self._rows.get(k)
+        if rows is None:
+            rows = self._rows[k] = set()
+            self._first[k] = row_id
+            self._parents[k] = {}
+            self._sorted[k] = []
+            if k not in self.stats:
+                self.stats[k] = key_filter_stats(k)
+        elif k not in self._stale and row_id < self._first[k]:
+            self._first[k] = row_id
+        rows.add(row_id)
+        pn = (parent_name or "").strip()
+        if pn:
+            pk = (pn, (parent_path or "").strip())
+            ps = self._parents[k]
+            if pk not in ps:
+                ps[pk] = 0
+                bisect.insort(self._sorted[k], pk)
+            ps[pk] += 1
+        self.version += 1
+
+    def remove(self, row_id: int, key: str, parent_name: str, parent_path: str):
+        k = (key or "").strip()
+        rows = self._rows.get(k)
+        if rows is None or row_id not in rows:
+            return
+        rows.discard(row_id)
+        pn = (parent_name or "").strip()
+        if pn:
+            pk = (pn, (parent_path or "").strip())
+            ps = self._parents[k]
+            if pk in ps:
+                ps[pk] -= 1
+                if ps[pk] <= 0:
+                    del ps[pk]
+                    lst = self._sorted[k]
+                    i = bisect.bisect_left(lst, pk)
+                    if i < len(lst) and lst[i] == pk:
+                        lst.pop(i)
+        if not rows:
+            for d in (self._rows, self._first, self._parents, self._sorted, self.stats):
+                d.pop(k, None)
+            self._stale.discard(k)
+        elif self._first[k] == row_id:
+            self._stale.add(k)
+        self.version += 1
+
+    def file_count(self, key: str) -> int:
+        return len(self._rows.get((key or "").strip(), ()))
+
+    def parents(self, key: str):
+        """ソート済みの親フォルダ [{"name", "path"}, ...]"""
+        return [{"name": n, "path": p} for n, p in self._sorted.get((key or "").strip(), [])]
+
+    def keys_in_order(self):
+        if self._order is None or self._order[0] != self.version:
+            for k in self._stale:
+                self._first[k] = min(self._rows[k])
+            self._stale.clear()
+            self._order = (self.version, sorted(self._first, key=self._first.__getitem__))
+        return self._order[1]
+
+
+class VirtualList:
+    """ttk.Treeview（1列）に、見えている範囲の行だけを作る一覧。
+
+    - 中身は items（list[str] か PickedKeys、重複なし。PickedKeys はそのまま持ち、位置は index で引く）。Treeview には窓（first から画面に入る行数）だけを入れる
+    - 縦スクロールバー・ホイール・上下キーは窓を動かす（Treeview 自身はスクロールさせない）
+    - iid は値ごとに固定（f"{prefix}{連番}"）。窓の更新は差分（delete / insert / move）だけ
+    - 選択は値で持ち、窓の外に出ても消えない
+    - set_items で中身を差し替えても、選択と「窓の先頭にあった値」の位置を保つ
+    on_select(value or None) は選択が変わったときだけ呼ぶ。
+    """
+
+    def __init__(self, tree, scrollbar, *, iid_prefix="k", on_select=None, row_height=20):
+        self.tree = tree
+        self.sb = scrollbar
+        self.prefix = iid_prefix
+        self.on_select = on_select
+        self.row_height = int(row_height)
+        self.items = []
+        self._pos = {}  # 値 -> items の位置（PickedKeys のときは None）
+        self.first = 0
+        self.selected = None  # 選択中の値
+        self._iids = {}  # 値 -> iid（固定）
+        self._vals = {}  # iid -> 値
+        self._seq = 0
+        self._shown = []  # 今 Treeview に入っている iid（並び順）
+        self._selecting = False
+        self.render_stats = {"inserted": 0, "deleted": 0, "moved": 0}
+
+        self.sb.configure(command=self._on_scrollbar)
+        self.tree.configure(yscrollcommand="")
+        self.tree.bind("<Configure>", lambda e: self.render(), add="+")
+        self.tree.bind("<<TreeviewSelect>>", self._on_tree_select, add="+")
+        for seq in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.tree.bind(seq, self._on_wheel)
+        for seq, step in (("<Up>", -1), ("<Down>", 1), ("<Prior>", "page-"), ("<Next>", "page+"),
+                          ("<Home>", "home"), ("<End>", "end")):
+            self.tree.bind(seq, lambda e, st=step: self._on_key(st))
+
+    # ---- model ----
+    def set_items(self, items):
+        prev = self.selected_value()
+        top = self.items[self.first] if 0 <= self.first < len(self.items) else None
+        if getattr(items, "lazy", False):
+            self.items = items
+            self._pos = None
+        else:
+            self.items = list(items)
+            self._pos = {v: i for i, v in enumerate(self.items)}
+        if prev is not None and self._index(prev) is None:
+            self.selected = None
+        # 窓の先頭にあった値がまだあれば、そこを先頭に保つ（無ければ位置で）
+        first = self._index(top) if top is not None else None
+        first = self.first if first is None else first
+        self.first = max(0, min(first, len(self.items) - self.page_size()))
+        self._gc_iids()
+        self.render()
+        if prev is not None and self.selected is None and self.on_select:
+            self.on_select(None)
+
+    def _index(self, value):
+        """items の中での value の位置（無ければ None）"""
+        if self._pos is not None:
+            return self._pos.get(value)
+        try:
+            return self.items.index(value)
+        except ValueError:
+            return None
+
+    def _iid(self, value):
+        iid = self._iids.get(value)
+        if iid is None:
+            self._seq += 1
+            iid = f"{self.prefix}{self._seq}"
+            self._iids[value] = iid
+            self._vals[iid] = value
+        return iid
+
+    def _gc_iids(self):
+        # 出てこなくなった値の iid を忘れる（表示中のものは残す）
+        if len(self._iids) <= 4 * max(1000, len(self.items)):
+            return
+        shown = set(self._shown)
+        for v, iid in list(self._iids.items()):
+            if iid not in shown and self._index(v) is None:
+                del self._iids[v]
+                del self._vals[iid]
+
+    def selected_value(self):
+        if self.selected is None or self._index(self.selected) is None:
+            return None
+        return self.selected
+
+    def selected_index(self):
+        v = self.selected_value()
+        return None if v is None else self._index(v)
+
+    def clear_selection(self):
+        had = self.selected_value() is not None
+        self.selected = None
+        self.render()
+        if had and self.on_select:
+            self.on_select(None)
+
+    def select(self, index: int):
+        if not self.items:
+            return
+        index = max(0, min(int(index), len(self.items) - 1))
+        value = self.items[index]
+        changed = value != self.selected
+        self.selected = value
+        self.see(index)
+        if changed and self.on_select:
+            self.on_select(value)
+
+    def see(self, index: int):
+        n = self.page_size()
+        if index < self.first:
+            self.first = index
+        elif index >= self.first + n:
+            self.first = index - n + 1
+        self.first = max(0, min(self.first, max(0, len(self.items) - n)))
+        self.render()
+
+    # ---- view ----
+    def page_size(self) -> int:
+        try:
+            h = int(self.tree.winfo_height())
+        except Exception:
+            h = 0
+        if h <= 1:
+            return 40  # まだ表示されていない
+        head = self.row_height
+        try:
+            kids = self.tree.get_children()
+            if kids:
+                bb = self.tree.bbox(kids[0])
+                if bb:
+                    head = int(bb[1])
+        except Exception:
+            pass
+        return max(1, (h - head) // max(1, self.row_height) + 1)
+
+    def render(self):
+        n = self.page_size()
+        want = [self._iid(v) for v in self.items[self.first:self.first + n]]
+        if want != self._shown:
+            self._sync_window(want)
+        self._selecting = True
+        try:
+            sel_iid = self._iids.get(self.selected) if self.selected_value() is not None else None
+            if sel_iid is not None and sel_iid in self._shown:
+                if tuple(self.tree.selection()) != (sel_iid,):
+                    self.tree.selection_set(sel_iid)
+            elif self.tree.selection():
+                self.tree.selection_remove(self.tree.selection())
+        finally:
+            self._selecting = False
+        total = len(self.items)
+        if total <= 0:
+            self.sb.set(0.0, 1.0)
+        else:
+            self.sb.set(self.first / total, min(1.0, (self.first + n) / total))
+
+    def _sync_window(self, want):
+        """窓の iid 列を want にする（消えたものを delete、新しいものを insert、順序違いだけ move）。"""
+        st = self.render_stats
+        keep = set(want)
+        cur = self._shown
+        gone = [iid for iid in cur if iid not in keep]
+        if gone:
+            self.tree.delete(*gone)
+            st["deleted"] += len(gone)
+        cur = [iid for iid in cur if iid in keep]
+        have = set(cur)
+        for pos, iid in enumerate(want):
+            if iid not in have:
+                self.tree.insert("", pos, iid=iid, values=(self._vals[iid],))
+                cur.insert(pos, iid)
+                st["inserted"] += 1
+            elif cur[pos] != iid:
+                self.tree.move(iid, "", pos)
+                cur.remove(iid)
+                cur.insert(pos, iid)
+                st["moved"] += 1
+        self._shown = cur
+
+    def scroll_to(self, first: int):
+        self.first = max(0, min(int(first), max(0, len(self.items) - self.page_size())))
+        self.render()
+
+    def index_of_iid(self, iid):
+        v = self._vals.get(str(iid)) if iid else None
+        return self._index(v) if v is not None else None
+
+    # ---- events ----
+    def _on_scrollbar(self, *args):
+        if not args:
+            return
+        n = self.page_size()
+        if args[0] == "moveto":
+            try:
+                self.scroll_to(int(float(args[1]) * len(self.items)))
+            except Exception:
+                pass
+        elif args[0] == "scroll":
+            try:
+                k = int(args[1])
+            except Exception:
+                return
+            step = n if (len(args) > 2 and args[2] == "pages") else 1
+            self.scroll_to(self.first + k * step)
+
+    def _on_wheel(self, event):
+        if getattr(event, "num", None) == 4:
+            d = -3
+        elif getattr(event, "num", None) == 5:
+            d = 3
+        else:
+            d = -3 if getattr(event, "delta", 0) > 0 else 3
+        self.scroll_to(self.first + d)
+        return "break"
+
+    def _on_key(self, step):
+        if not self.items:
+            return "break"
+        cur = self.selected_index()
+        if cur is None:
+            cur = self.first
+        n = self.page_size()
+        if step == "home":
+            target = 0
+        elif step == "end":
+            target = len(self.items) - 1
+        elif step == "page-":
+            target = cur - n
+        elif step == "page+":
+            target = cur + n
+        else:
+            target = cur + step
+        self.select(target)
+        return "break"
+
+    def _on_tree_select(self, _evt=None):
+        # render() が出した選択イベント（窓の外へ出て選択が消えた等）は無視する
+        if self._selecting:
+            return
+        sel = self.tree.selection()
+        if not sel:
+            return
+        v = self._vals.get(str(sel[0]))
+        if v is None or v == self.selected or self._index(v) is None:
+            return
+        self.selected = v
+        if self.on_select:
+            self.on_select(v)
+
+
 def open_url(engine: str, text: str, engine_defs):
     q = urllib.parse.quote(text)
     defs = normalize_engine_defs(engine_defs)
@@ -222,14 +725,7 @@ def open_url(engine: str, text: str, engine_defs):
     webbrowser.open_new_tab(url)
 
 
-def minimal_clean_for_search(title: str) -> str:
-    s = (title or "").strip()
-    while "  " in s:
-        s = s.replace("  ", " ")
-    return s
-
-
-
+@rf_metrics.timed("json.load")
 def safe_load_json(path: str, default):
     try:
         with open(path, "r", encoding="utf-8") as f:
@@ -238,6 +734,7 @@ def safe_load_json(path: str, default):
         return default
 
 
+@rf_metrics.timed("json.save")
 def safe_save_json(path: str, data) -> bool:
     try:
         tmp = path + ".tmp"
@@ -254,52 +751,6 @@ def safe_save_json(path: str, data) -> bool:
         return False
 
 
-def apply_patterns_for_genre(raw_title: str, applied_state: dict, genre_name: str) -> str:
-    """保存工房で最後に［適用］した式を、検索モードの候補生成にだけ反映する。
-
-    ルール（確定仕様）:
-    - 検索モードは「最後に適用した状態」だけを見る
-    - ジャンルを選ぶと、そのジャンルに属する式（＋未分類）を混ぜて適用する
-    - 失敗（例: 正規表現エラー）はその式だけ無視する（候補生成を止めない）
-    """
-    s = (raw_title or "")
-    if not applied_state or not isinstance(applied_state, dict):
-        return s
-
-    genres = applied_state.get("genres")
-    if not isinstance(genres, dict):
-        return s
-
-    # mix: 未分類 + 選択ジャンル
-    selected = []
-    for g in ("未分類", genre_name):
-        lst = genres.get(g)
-        if isinstance(lst, list):
-            selected.extend([str(x) for x in lst])
-
-    if not selected:
-        return s
-
-    order = applied_state.get("order")
-    if isinstance(order, list) and order:
-        ordered = [p for p in order if p in selected]
-        # allow patterns present but not in order
-        tail = [p for p in selected if p not in ordered]
-        patterns = ordered + tail
-    else:
-        patterns = selected
-
-    for pat in patterns:
-        try:
-            s = re.sub(pat, " ", s)
-        except Exception:
-            # ignore broken patterns; user responsibility
-            continue
-    # normalize spaces after removals (avoid word-join accidents)
-    s = re.sub(r"\s+", " ", s).strip()
-    return s
-
-
 def process_alive(pid: int) -> bool:
     if not pid or pid <= 0:
         return False
@@ -339,6 +790,10 @@ def reset_workshop_inbox():
         inbox = os.path.join(app_dir(), IPC_INBOX)
         with open(inbox, "w", encoding="utf-8") as f:
             f.write("")
+        # compact で退避した古い inbox も消す（前回分の payload を拾わないように）
+        old = rf_ipc.rotated_inbox_path(inbox)
+        if os.path.exists(old):
+            os.remove(old)
     except Exception:
         pass
     for fn in ("_ai_title_workshop_cursor.json", "_ai_title_workshop_state.json"):
@@ -351,16 +806,21 @@ def reset_workshop_inbox():
 
 
 def append_inbox(msg: dict):
-    path = os.path.join(app_dir(), IPC_INBOX)
+    """工房へ送る。cmd は socket（工房が待ち受けていれば）→ だめなら jsonl inbox。"""
     msg = dict(msg)
-    msg.setdefault("id", f"v_{int(time.time()*1000)}_{os.getpid()}")
-    with open(path, "a", encoding="utf-8") as f:
-        f.write(json.dumps(msg, ensure_ascii=False) + "\n")
+    msg.setdefault("id", rf_ipc.new_message_id("v"))
+    return rf_ipc.send_message(
+        msg,
+        lock_path=os.path.join(app_dir(), LOCK_FILE),
+        inbox_path=os.path.join(app_dir(), IPC_INBOX),
+    )
 
 
 class App(tk.Tk):
     def __init__(self):
+        self._startup_marks = []  # [{"name", "at_ms", "ms"?}]（_T_IMPORT から）
         super().__init__()
+        self._startup_mark("tk_ready")
         self.title(APP_NAME)
         self.geometry("1200x860")
         self.minsize(1040, 760)
@@ -383,9 +843,23 @@ class App(tk.Tk):
         self.genre = tk.StringVar(value=st.get("genre", DEFAULT_GENRES[0] if DEFAULT_GENRES else "その他"))
         self.mode = tk.StringVar(value="SEARCH")
         self.folder = st.get("last_folder", "")
-
-        # data rows: {"raw":..., "key":..., "parent_name":..., "parent_path":...}
-        self.rows = []
+        # フォルダ（prefix）ごとのジャンル割当。割当の無いファイルは選択中のジャンル
+        self.genre_map = normalize_genre_map(st.get("genre_map"))
+        # 走査結果の置き場所（ROW_STORE_MODES）
+        rs = str(st.get("row_store", "auto") or "auto")
+        self.row_store_mode = rs if rs in ROW_STORE_MODES else "auto"
+        self._clear_rows_cache()
+
+        # フォルダの走査結果（RowStore: 親フォルダは表に1回だけ、行は dir_id と raw）
+        # rows は同じもの（keys に今の key 列が入る）
+        self._scan = RowStore()
+        self.rows = self._scan
+        self._scan_folder = None
+        self._rescan = None  # 裏で走査中のジョブ（_load_folder_async）
+        # key 列のキャッシュ: (applied_hash, genre, 割当の版) -> [key, ...]（_scan と同じ並び）
+        # ジャンル切替・戻す/やり直すでは再計算しない。古いものから捨てる（KEY_CACHE_MAX_CELLS）
+        self._key_cols = OrderedDict()
+        self._key_bg = {"queue": [], "partial": None, "job": None}
 
         # workshop tutorial state
         self.tutorial_phase = 0
@@ -395,27 +869,72 @@ class App(tk.Tk):
         self.var_filter_strength = tk.IntVar(value=int(st.get("filter_strength", 60) or 60))
 
         # parent display state
-        self._key_to_parents = {}  # key -> list of dicts {name, path}
+        self._key_index = KeyIndex()  # key -> 行・親フォルダ・件数（差分更新）
+        self._key_index_cols = (None, None)  # 索引に入っている (_scan, key 列)
+        self._key_filter = None
+        self._key_filter_version = None
         self._current_parent_name_for_search = ""
 
         self._build_ui()
+        self._startup_mark("ui_built")
 
         # --- applied snapshot (from 保存工房［適用］) ---
         self.applied_current = None
-        self.applied_prev = None
-        self._applied_mtime = None
-        self.after(400, self._poll_applied_state)
+        self._applied_depth = (0, 0)  # (戻せる段数, やり直せる段数)
+        self._applied_seen = None  # 最後に見た stamp（世代, hash）。旧形式は ("mtime", …)
+        self._applied_hash = None  # 今 key 計算に使っている applied_current の hash
+        # 適用状態の監視：放置中は間隔を伸ばし、操作・フォーカスで 500ms に戻す
+        # 最初の適用状態はここで読む（key の計算・スナップショットの照合に使う）
+        try:
+            self._applied_seen = self._applied_version(self._state_json_path())
+            self._load_applied_state_from_disk()
+        except Exception:
+            pass
+        self._applied_poller = rf_ipc.AdaptivePoller(
+            self, self._poll_applied_state, min_ms=500, max_ms=8000, name="applied_state"
+        ).attach_activity().start(400)
 
-        # initial folder load
+        # initial folder load: 前回の key 一覧（スナップショット）をすぐ出し、走査は裏で行って差し替える
+        # （ライブラリの大きさで起動が待たされないように）
         if self.folder and os.path.isdir(self.folder):
             self.lbl_folder.config(text=self.folder)
-            self._load_folder(self.folder)
+            t0 = time.perf_counter()
+            hit = self._warm_start(self.folder)
+            self._startup_mark("warm_start_hit" if hit else "warm_start_miss", t0)
+            self._load_folder_async(self.folder)
 
         # apply initial mode
         self.set_mode(self.mode.get())
 
         # close handler
         self.protocol("WM_DELETE_WINDOW", self._on_close)
+        self._startup_mark("init_done")
+        self.after_idle(lambda: (self._startup_mark("first_idle"), self._startup_report()))
+        # 隠し機能：Ctrl+Shift+M で計測ウィンドウ / Ctrl+Shift+P（O）で次の操作のプロファイル
+        rf_metrics.bind_metrics_window(self, title="計測（ビューア）")
+        rf_metrics.bind_profile_capture(self, app_dir(), role="viewer")
+
+    # ---------- startup timing ----------
+    def _startup_mark(self, name: str, since=None):
+        now = time.perf_counter()
+        m = {"name": name, "at_ms": round((now - _T_IMPORT) * 1000.0, 1)}
+        if since is not None:
+            m["ms"] = round((now - since) * 1000.0, 1)
+        self._startup_marks.append(m)
+
+    def _startup_report(self):
+        """RF_STARTUP_REPORT=1 のとき、起動の区切りごとの時間を stderr と STARTUP_TIMING_JSON に出す。"""
+        if not os.environ.get("RF_STARTUP_REPORT"):
+            return
+        data = {"workshop_loaded": _WORKSHOP_LOADED, "marks": list(self._startup_marks)}
+        try:
+            sys.stderr.write(json.dumps(data, ensure_ascii=False) + "\n")
+        except Exception:
+            pass
+        try:
+            save_json(os.path.join(app_dir(), STARTUP_TIMING_JSON), data)
+        except Exception:
+            pass
 
     # ---------- UI ----------
     def _build_ui(self):
@@ -494,11 +1013,18 @@ class App(tk.Tk):
             self.frm_search_controls, textvariable=self.genre, values=DEFAULT_GENRES, width=12, state="readonly"
         )
         self.cb_genre.pack(side="left")
-        self.cb_genre.bind("<<ComboboxSelected>>", lambda e: (self._save_settings(), self._refresh_previews()))
+        self.cb_genre.bind("<<ComboboxSelected>>", lambda e: (self._save_settings(), self._on_genre_changed()))
+
+        ttk.Button(self.frm_search_controls, text="フォルダ別…", command=self._open_genre_map_editor).pack(
+            side="left", padx=(4, 0)
+        )
 
         self.btn_undo_apply = ttk.Button(self.frm_search_controls, text="戻す", command=self._undo_applied_state)
         self.btn_undo_apply.pack(side="left", padx=(8, 0))
         self.btn_undo_apply.config(state="disabled")
+        self.btn_redo_apply = ttk.Button(self.frm_search_controls, text="やり直す", command=self._redo_applied_state)
+        self.btn_redo_apply.pack(side="left", padx=(4, 0))
+        self.btn_redo_apply.config(state="disabled")
 
         # content area
         self.stack = ttk.Frame(self)
@@ -510,7 +1036,8 @@ class App(tk.Tk):
             fr.place(relx=0, rely=0, relwidth=1, relheight=1)
 
         self._build_search_frame()
-        self._build_workshop_frame()
+        # 工房の枠は最初に WORKSHOP にしたときに作る（_ensure_workshop_panel）
+        self.workshop_panel = None
 
         # bottom status
         bottom = ttk.Frame(self)
@@ -591,8 +1118,15 @@ class App(tk.Tk):
         self.tree_key.heading("key", text="ダブルクリックで検索")
         self.tree_key.column("key", width=520)
 
-        sb_y = ttk.Scrollbar(left_list, orient="vertical", command=self.tree_key.yview)
-        self.tree_key.configure(yscrollcommand=sb_y.set)
+        sb_y = ttk.Scrollbar(left_list, orient="vertical")
+        # 候補は数十万件になりうるので、見えている行だけ Treeview に入れる
+        try:
+            rh = int(ttk.Style().lookup("RF.Treeview", "rowheight") or 26)
+        except Exception:
+            rh = 26
+        self._vl_key = VirtualList(
+            self.tree_key, sb_y, iid_prefix="k", on_select=lambda _v: self._on_key_select(), row_height=rh
+        )
 
         self.tree_key.pack(side="left", fill="both", expand=True)
         sb_y.pack(side="right", fill="y")
@@ -641,11 +1175,21 @@ class App(tk.Tk):
         # events
         self.tree_key.bind("<Double-1>", lambda e: self._search_from_tree(self.tree_key))
         self.tree_key.bind("<Button-3>", lambda e: self._popup_search_menu(e, self.tree_key))
-        self.tree_key.bind("<<TreeviewSelect>>", lambda e: self._on_key_select())
 
         # right click menu (dynamic)
         self.menu_search = tk.Menu(self, tearoff=0)
         # filled in _rebuild_search_menu()
+    def _ensure_workshop_panel(self):
+        """工房モジュールの読み込みと WorkshopPanel の構築を最初の1回だけ行う。"""
+        if self.workshop_panel is not None or getattr(self, "_workshop_built", False):
+            return self.workshop_panel
+        t0 = time.perf_counter()
+        _ensure_workshop_module()
+        self._build_workshop_frame()
+        self._workshop_built = True
+        self._startup_mark("workshop_built", t0)
+        return self.workshop_panel
+
     def _build_workshop_frame(self):
         """作業工房（統合版）: 準備画面は廃止し、この枠に工房UIを移植する。"""
         # このフレーム自体は set_mode() で lift される
@@ -685,9 +1229,11 @@ class App(tk.Tk):
     def _load_applied_state_from_disk(self):
         st = safe_load_json(self._state_json_path(), {})
         cur = st.get("applied_current") if isinstance(st, dict) else None
-        prev = st.get("applied_prev") if isinstance(st, dict) else None
         self.applied_current = cur if isinstance(cur, dict) else None
-        self.applied_prev = prev if isinstance(prev, dict) else None
+        h = st.get("applied_hash") if isinstance(st, dict) else None
+        self._applied_hash = h if isinstance(h, str) and h else rf_ipc.applied_hash(self.applied_current)
+        self._applied_depth = rf_ipc.applied_history_depth(st)
+        self._update_history_buttons()
 
         # ジャンル一覧を更新（自動適用はしない。表示値だけ同期）
         try:
@@ -698,55 +1244,111 @@ class App(tk.Tk):
         except Exception:
             pass
 
-    def _poll_applied_state(self):
-        """STATE_JSONの更新だけ監視して、検索候補表示に必要な 'applied_current' を読み直す。"""
+    def _applied_version(self, p: str):
+        """STATE_JSON の版。stamp（世代, hash）があればそれ、無ければ旧形式として mtime。"""
+        stamp = rf_ipc.read_applied_stamp(p)
+        if stamp is not None:
+            return stamp
         try:
-            p = self._state_json_path()
-            mt = os.path.getmtime(p) if os.path.exists(p) else None
-            if mt != self._applied_mtime:
-                self._applied_mtime = mt
-                self._load_applied_state_from_disk()
-                # 検索候補表示を更新（keyは適用状態で変わるのでフォルダを再読込）
-                try:
-                    if getattr(self, "folder", None) and os.path.isdir(self.folder):
-                        self._load_folder(self.folder)
-                    else:
-                        self._refresh_previews()
-                except Exception:
-                    pass
-        finally:
+            return ("mtime", os.stat(p).st_mtime_ns)
+        except Exception:
+            return None
+
+    def _update_history_buttons(self):
+        n_undo, n_redo = self._applied_depth
+        for name, n in (("btn_undo_apply", n_undo), ("btn_redo_apply", n_redo)):
+            b = getattr(self, name, None)
+            if b is None:
+                continue
             try:
-                self.after(500, self._poll_applied_state)
+                b.config(state=("normal" if n > 0 else "disabled"))
             except Exception:
                 pass
 
-    def _undo_applied_state(self):
-        """検索モード：ひとつ前の適用状態に戻す（確定仕様）。"""
+    def _reload_for_applied(self):
+        # 検索候補表示を更新（keyは適用状態で変わる）
+        # 走査済みのフォルダなら歩き直さず key 列だけ差し替える（計算済みの状態ならキャッシュから）
+        try:
+            if getattr(self, "folder", None) and os.path.isdir(self.folder):
+                if self._scan_folder != self.folder:
+                    if self._rescan is not None and self._rescan["folder"] == self.folder:
+                        return  # 裏の走査が終われば今の状態の key 列で表示される
+                    self._load_folder(self.folder)
+                    return
+                self._apply_key_column()
+            else:
+                self._refresh_previews()
+        except Exception:
+            pass
+
+    def _poll_applied_state(self) -> bool:
+        """applied の stamp だけ監視して、世代が進んだら 'applied_current' を読み直す。
+        内容（hash）が同じなら key の再計算はしない。再スケジュールは _applied_poller。
+        Returns: 読み直したら True"""
+        try:
+            p = self._state_json_path()
+            ver = self._applied_version(p)
+            if ver == self._applied_seen:
+                return False
+            self._applied_seen = ver
+            h_before = self._applied_hash
+            self._load_applied_state_from_disk()
+            if self._applied_hash != h_before:
+                self._reload_for_applied()
+            return True
+        except Exception:
+            return False
+
+    def _step_applied_state(self, redo=False):
         p = self._state_json_path()
-        st = safe_load_json(p, {})
-        if not isinstance(st, dict):
-            st = {}
-
-        cur = st.get("applied_current")
-        prev = st.get("applied_prev")
-        if not isinstance(prev, dict):
-            # 戻せるものがない
+        try:
+            ver = rf_ipc.step_applied_state(p, redo=redo)
+        except rf_ipc.AppliedHistoryMismatch as e:
+            # 履歴は捨て直されている：ボタンの段数を合わせて、理由をそのまま出す
+            if e.version is not None:
+                self._applied_seen = e.version
+            try:
+                self._load_applied_state_from_disk()
+            except Exception:
+                pass
             try:
-                messagebox.showinfo(APP_TITLE, "戻せる適用状態がありません。")
+                messagebox.showwarning(APP_NAME, str(e), parent=self)
             except Exception:
                 pass
             return
-
-        st["applied_current"], st["applied_prev"] = prev, (cur if isinstance(cur, dict) else None)
-        safe_save_json(p, st)
+        except Exception as e:
+            try:
+                messagebox.showerror(APP_NAME, f"適用状態の読み書きに失敗しました: {e}", parent=self)
+            except Exception:
+                pass
+            return
+        if ver is None:
+            # 戻せる / やり直せるものがない
+            try:
+                messagebox.showinfo(APP_NAME, "やり直せる適用状態がありません。" if redo else "戻せる適用状態がありません。", parent=self)
+            except Exception:
+                pass
+            return
+        self._applied_seen = ver
 
         # すぐ反映（ポーリングを待たない）
-        self._applied_mtime = None
+        h_before = self._applied_hash
         self._load_applied_state_from_disk()
-        try:
-            self._refresh_previews()
-        except Exception:
-            pass
+        if self._applied_hash != h_before:
+            self._reload_for_applied()
+        else:
+            try:
+                self._refresh_previews()
+            except Exception:
+                pass
+
+    def _undo_applied_state(self):
+        """検索モード：ひとつ前の適用状態に戻す（確定仕様）。履歴があれば何段でも戻せる。"""
+        self._step_applied_state(redo=False)
+
+    def _redo_applied_state(self):
+        """検索モード：戻した適用状態をやり直す。"""
+        self._step_applied_state(redo=True)
 
 
 
@@ -806,6 +1408,7 @@ class App(tk.Tk):
             self.frm_search_controls.pack(side="right")
             self._refresh_previews()
         else:
+            self._ensure_workshop_panel()
             self.frame_work.lift()
             self.lbl_purpose.config(text="作業工房：AIの回答を貼り付けて式を適用し、プレビューで確認します")
             self.lbl_status.config(text="工房：貼り付け→適用→ON/OFF→プレビュー")
@@ -825,28 +1428,51 @@ class App(tk.Tk):
         self._load_folder(d)
         self._save_settings()
 
+    @rf_metrics.timed("viewer.load_folder")
     def _load_folder(self, folder: str):
-        self.rows.clear()
+        self._cancel_rescan()
+        default_genre = self.genre.get()
+        ck = self._key_col_id(default_genre)
         try:
-            for root, _dirs, files in os.walk(folder):
-                for name in files:
-                    p = os.path.join(root, name)
-                    if not os.path.isfile(p):
-                        continue
-                    raw = os.path.splitext(name)[0]
-                    raw2 = apply_patterns_for_genre(raw, self.applied_current, self.genre.get())
-                    key = minimal_clean_for_search(raw2)
-                    parent_path = os.path.dirname(p)
-                    parent_name = os.path.basename(parent_path) or ""
-                    self.rows.append(
-                        {"raw": raw, "key": key, "parent_name": parent_name, "parent_path": parent_path}
-                    )
+            scan, keys = self._scan_rows(folder, self._scan_args(default_genre))
         except Exception as e:
             messagebox.showerror("読み込み失敗", f"フォルダ読み込みに失敗しました: {e}", parent=self)
             return
+        self._install_scan(folder, scan, keys, ck)
+
+    def _scan_args(self, default_genre: str):
+        return {
+            "genre_map": list(getattr(self, "genre_map", [])),
+            "genre": default_genre,
+            "applied": self.applied_current,
+            "mode": getattr(self, "row_store_mode", "auto"),
+        }
 
-        self._refresh_previews()
-        self._refresh_ws_tree()
+    @rf_metrics.timed("viewer.scan_rows", items=lambda r: len(r[0]))
+    def _scan_rows(self, folder: str, args: dict):
+        """フォルダを1回歩いて (RowStore か MmapRowStore, key 列) を返す。Tk には触らない（裏スレッドでも呼ぶ）。
+
+        中身は rf_core.scan_folder。件数が多ければ（row_store 設定）途中から raw・key をファイルに流して mmap で読む。
+        """
+        return rf_core.scan_folder(
+            folder,
+            args,
+            open_writers=self._open_row_writers,
+            discard=self._remove_cache_file,
+            auto_rows=ROW_MMAP_AUTO_ROWS,
+        )
+
+    def _install_scan(self, folder: str, scan, keys, ck):
+        # 走査し直したら key 列は全部作り直し（並びが変わる）
+        old_scan, old_cols = self._scan, list(self._key_cols.values())
+        self._scan = scan
+        self._scan_folder = folder
+        self._key_cols.clear()
+        self._key_bg_reset()
+        self._store_key_column(ck, keys)
+        self._apply_key_column()
+        # 前の走査のファイルは表示を差し替えてから閉じる
+        self._release_rows(old_scan, old_cols)
         # --- Stage1: always refresh samples file for workshop (no UI change) ---
         try:
             self._write_samples_json(max_items=5000)
@@ -861,14 +1487,301 @@ class App(tk.Tk):
         except Exception:
             pass
 
+    # ---------- warm start (前回の key 一覧をすぐ出し、裏で走査し直す) ----------
+    def _warm_start(self, folder: str) -> bool:
+        """前回終了時のスナップショットが今の状態（フォルダ・ジャンル・適用 hash・割当）と同じなら表示する。"""
+        snap = rf_rows.read_key_snapshot(os.path.join(app_dir(), KEY_SNAPSHOT_JSON))
+        if snap is None:
+            return False
+        meta, idx = snap
+        ck = self._key_col_id()
+        if meta.get("folder") != folder or meta.get("col") != [ck[0], ck[1], [list(x) for x in ck[2]]]:
+            return False
+        self._key_index = idx
+        self._key_index_cols = (None, None)
+        self._refresh_previews()
+        return True
+
+    def _save_key_snapshot(self):
+        # 走査済みの一覧だけ書く（走査し直す前に閉じたら前回のものを残す）
+        if not self.folder or self._scan_folder != self.folder:
+            return
+        keys = getattr(self._scan, "keys", None)
+        if keys is None or keys is not self._key_index_cols[1]:
+            return
+        ck = self._key_col_id()
+        meta = {"folder": self.folder, "col": [ck[0], ck[1], [list(x) for x in ck[2]]], "saved_at": time.time()}
+        rf_rows.write_key_snapshot(os.path.join(app_dir(), KEY_SNAPSHOT_JSON), meta, self._key_index, KEY_SNAPSHOT_MAX_KEYS)
+
+    def _load_folder_async(self, folder: str):
+        """走査を裏スレッドで行い、終わったら（after で見に行って）差し替える。"""
+        self._cancel_rescan()
+        default_genre = self.genre.get()
+        job = {
+            "folder": folder,
+            "ck": self._key_col_id(default_genre),
+            "done": threading.Event(),
+            "cancelled": False,
+        }
+        args = self._scan_args(default_genre)
+
+        def work():
+            try:
+                job["result"] = self._scan_rows(folder, args)
+            except Exception as e:
+                job["error"] = e
+            job["done"].set()
+            if job["cancelled"]:
+                self._discard_rescan(job)
+
+        self._rescan = job
+        self._set_folder_label(folder, busy=True)
+        threading.Thread(target=work, name="rf-rescan", daemon=True).start()
+        self.after(100, self._poll_rescan)
+
+    def _poll_rescan(self):
+        job = self._rescan
+        if job is None:
+            return
+        if not job["done"].is_set():
+            self.after(100, self._poll_rescan)
+            return
+        self._rescan = None
+        self._set_folder_label(job["folder"])
+        err = job.get("error")
+        if err is not None:
+            messagebox.showerror("読み込み失敗", f"フォルダ読み込みに失敗しました: {err}", parent=self)
+            return
+        res = job.pop("result", None)
+        if res is not None:
+            t0 = time.perf_counter()
+            self._install_scan(job["folder"], res[0], res[1], job["ck"])
+            if not any(m["name"] == "rescan_done" for m in self._startup_marks):
+                self._startup_mark("rescan_done", t0)
+                self._startup_report()
+
+    def _cancel_rescan(self):
+        job = self._rescan
+        if job is None:
+            return
+        self._rescan = None
+        job["cancelled"] = True
+        if job["done"].is_set():
+            self._discard_rescan(job)
+        self._set_folder_label(self.folder)
+
+    def _discard_rescan(self, job):
+        res = job.pop("result", None)
+        if res is not None:
+            self._release_rows(res[0], [res[1]])
+
+    def _set_folder_label(self, folder: str, busy=False):
+        try:
+            self.lbl_folder.config(text=f"{folder}（確認中…）" if busy else folder)
+        except Exception:
+            pass
+
+    # ---------- key columns (per applied state x genre) ----------
+    def _key_col_id(self, genre=None):
+        sig = tuple((d["prefix"], d["genre"]) for d in getattr(self, "genre_map", []))
+        return (self._applied_hash, genre if genre is not None else self.genre.get(), sig)
+
+    # ---------- on-disk rows (row_store = mmap / auto) ----------
+    def _rows_cache_dir(self) -> str:
+        d = os.path.join(app_dir(), ROWS_CACHE_DIR)
+        os.makedirs(d, exist_ok=True)
+        return d
+
+    def _new_cache_path(self, prefix: str) -> str:
+        fd, path = tempfile.mkstemp(prefix=prefix, suffix=".rfidx", dir=self._rows_cache_dir())
+        os.close(fd)
+        return path
+
+    def _open_row_writers(self):
+        return (
+            rf_rows.RowIndexWriter(self._new_cache_path("rows_")),
+            rf_rows.KeyColumnWriter(self._new_cache_path("keys_"), key_filter_stats),
+        )
+
+    def _remove_cache_file(self, path):
+        if not path:
+            return
+        try:
+            os.remove(path)
+        except Exception:
+            pass
+
+    def _clear_rows_cache(self):
+        # 前回の終了で残ったファイル（mmap 中は消せない OS もあるので起動時に掃除）
+        d = os.path.join(app_dir(), ROWS_CACHE_DIR)
+        try:
+            for name in os.listdir(d):
+                self._remove_cache_file(os.path.join(d, name))
+        except Exception:
+            pass
+
+    def _drop_key_column(self, keys):
+        if isinstance(keys, rf_rows.MmapKeyColumn):
+            if keys is getattr(self._scan, "keys", None) or keys is self._key_index_cols[1]:
+                return  # 表示中の列は残す
+            keys.remove_file()
+
+    def _release_rows(self, scan, cols):
+        for keys in cols:
+            self._drop_key_column(keys)
+        if isinstance(scan, rf_rows.MmapRowStore):
+            scan.close()
+            self._remove_cache_file(scan.path)
+
+    def _genre_pipeline(self, pipes: dict, genre: str):
+        if genre not in pipes:
+            pipes[genre] = compile_genre_patterns(self.applied_current, genre)
+        return pipes[genre]
+
+    @rf_metrics.timed("keys.batch")
+    def _compute_keys(self, genre, pipes: dict, start: int, end: int, out: list):
+        # 割当のあるファイルはそのジャンル、無いファイルは genre の式
+        scan = self._scan
+        raws, dir_ids, dirs = scan.raws, scan.dir_ids, scan.dirs
+        for i in range(start, min(end, len(scan))):
+            compiled = self._genre_pipeline(pipes, dirs[dir_ids[i]][2] or genre)
+            out.append(minimal_clean_for_search(apply_compiled_patterns(raws[i], compiled)))
+
+    def _store_key_column(self, ck, keys):
+        self._key_cols[ck] = keys
+        self._key_cols.move_to_end(ck)
+        # 上限を超えたら古い列から捨てる（今使う列は残す）。mmap の列はメモリに数えない
+        def cells(v):
+            return 0 if isinstance(v, rf_rows.MmapKeyColumn) else len(v)
+
+        total = sum(cells(v) for v in self._key_cols.values())
+        while total > KEY_CACHE_MAX_CELLS and len(self._key_cols) > 1:
+            _old, v = self._key_cols.popitem(last=False)
+            total -= cells(v)
+            self._drop_key_column(v)
+        while len(self._key_cols) > KEY_CACHE_MAX_COLS:
+            _old, v = self._key_cols.popitem(last=False)
+            self._drop_key_column(v)
+
+    def _get_key_column(self, ck):
+        keys = self._key_cols.get(ck)
+        if keys is not None:
+            self._key_cols.move_to_end(ck)
+            return keys
+        if isinstance(self._scan, rf_rows.MmapRowStore):
+            keys = self._compute_key_column_on_disk(ck[1])
+            self._store_key_column(ck, keys)
+            return keys
+        part = self._key_bg["partial"]
+        if part is not None and part[0] == ck:
+            # 裏で計算中の列：残りだけここで計算する
+            self._key_bg["partial"] = None
+            _ck, pipes, keys = part
+        else:
+            pipes = {}
+            keys = []
+        self._compute_keys(ck[1], pipes, len(keys), len(self._scan), keys)
+        self._store_key_column(ck, keys)
+        return keys
+
+    @rf_metrics.timed("keys.column_on_disk")
+    def _compute_key_column_on_disk(self, genre):
+        scan = self._scan
+        w = rf_rows.KeyColumnWriter(self._new_cache_path("keys_"), key_filter_stats)
+        try:
+            pipes = {}
+            raws, dir_ids, dirs = scan.raws, scan.dir_ids, scan.dirs
+            for i, raw in enumerate(raws):
+                d = dir_ids[i]
+                compiled = self._genre_pipeline(pipes, dirs[d][2] or genre)
+                w.add(minimal_clean_for_search(apply_compiled_patterns(raw, compiled)), d)
+            return w.finish(dirs)
+        except Exception:
+            w.abort()
+            raise
+
+    @rf_metrics.timed("viewer.apply_key_column")
+    def _apply_key_column(self):
+        """今のジャンル・適用状態の key 列で rows を作り直して表示する。"""
+        keys = self._get_key_column(self._key_col_id())
+        self._scan.keys = keys
+        self.rows = self._scan
+        self._sync_key_index(keys)
+        self._refresh_previews()
+        self._refresh_ws_tree()
+        self._key_bg_schedule()
+
+    def _on_genre_changed(self):
+        if self._scan_folder is not None and self._scan_folder == getattr(self, "folder", None):
+            self._apply_key_column()
+        else:
+            self._refresh_previews()
+
+    def _key_bg_reset(self):
+        bg = self._key_bg
+        if bg["job"] is not None:
+            try:
+                self.after_cancel(bg["job"])
+            except Exception:
+                pass
+        bg["job"] = None
+        bg["queue"] = []
+        bg["partial"] = None
+
+    def _key_bg_schedule(self):
+        """他のジャンルの key 列を裏で（after で少しずつ）計算しておく。"""
+        bg = self._key_bg
+        if isinstance(self._scan, rf_rows.MmapRowStore):
+            return  # ファイルに書く列は必要になったときだけ作る
+        try:
+            genres = list(self.cb_genre["values"])
+        except Exception:
+            genres = []
+        want = [self._key_col_id(g) for g in genres]
+        bg["queue"] = [ck for ck in want if ck not in self._key_cols]
+        if bg["partial"] is not None and bg["partial"][0] not in bg["queue"]:
+            bg["partial"] = None
+        # 全部入りきらない量なら裏計算しない（追い出し合いになる）
+        if len(self._scan) * (len(self._key_cols) + len(bg["queue"])) > KEY_CACHE_MAX_CELLS:
+            bg["queue"] = []
+            bg["partial"] = None
+        if bg["queue"] and bg["job"] is None:
+            bg["job"] = self.after(50, self._key_bg_step)
+
+    def _key_bg_step(self):
+        bg = self._key_bg
+        bg["job"] = None
+        try:
+            part = bg["partial"]
+            if part is None:
+                while bg["queue"] and bg["queue"][0] in self._key_cols:
+                    bg["queue"].pop(0)
+                if not bg["queue"]:
+                    return
+                ck = bg["queue"][0]
+                part = (ck, {}, [])
+                bg["partial"] = part
+            ck, pipes, keys = part
+            self._compute_keys(ck[1], pipes, len(keys), len(keys) + KEY_BG_CHUNK, keys)
+            if len(keys) >= len(self._scan):
+                bg["partial"] = None
+                if ck in bg["queue"]:
+                    bg["queue"].remove(ck)
+                self._store_key_column(ck, keys)
+        except Exception:
+            bg["partial"] = None
+            return
+        if bg["queue"] or bg["partial"] is not None:
+            bg["job"] = self.after(1, self._key_bg_step)
+
     def _write_samples_json(self, max_items: int = 5000):
         """Write current folder-derived samples for workshop.
         No UI change. Used only as material; filenames are not sent to AI.
         """
         ad = app_dir()
         samples = []
-        for r in getattr(self, "rows", []):
-            s = str(r.get("raw", "") or "").strip()
+        for s in self.rows.raws:
+            s = (s or "").strip()
             if s:
                 samples.append(s)
             if len(samples) >= int(max_items):
@@ -899,27 +1812,12 @@ class App(tk.Tk):
         return ratio_threshold, min_chars
 
     def _is_numeric_dominant_key(self, s: str) -> bool:
-        t = (s or "").strip()
-        if not t:
-            return True
-        t2 = re.sub(r"[\s\-_.()\[\]{}<>【】『』「」]+", "", t)
-        if not t2:
-            return True
-
+        # 一覧の絞り込みは KeyFilterIndex（同じ条件をまとめて引く）
+        n, digits, letters = key_filter_stats(s)
         ratio_th, min_chars = self._filter_params()
-        if len(t2) < min_chars:
+        if n < min_chars:
             return True
-
-        digits = sum(ch.isdigit() for ch in t2)
-        letters = sum(ch.isalpha() for ch in t2)
-
-        if digits == 0:
-            return False
-        if letters == 0 and digits >= 3:
-            return True
-        if digits / max(1, digits + letters) >= ratio_th:
-            return True
-        return False
+        return key_digit_ratio(digits, letters) >= ratio_th
 
     def _short_parent_sub(self, folder_path: str) -> str:
         try:
@@ -934,43 +1832,51 @@ class App(tk.Tk):
         return ""
 
     # ---------- refresh ----------
+    def _sync_key_index(self, keys):
+        """KeyIndex を今の key 列に合わせる。
+
+        同じ走査結果で key 列だけ替わった（ジャンル切替・適用・戻す）なら、key が変わった行だけ差し替える。
+        走査し直したときは作り直す。
+        """
+        scan = self._scan
+        if isinstance(keys, rf_rows.MmapKeyColumn):
+            # ファイルの列は索引も一緒に書いてある
+            self._key_index = keys.index
+            self._key_index_cols = (scan, keys)
+            return
+        old_scan, old_keys = self._key_index_cols
+        idx = self._key_index
+        if old_scan is scan and old_keys is not None and len(old_keys) == len(keys):
+            if old_keys is not keys:
+                for i, (k_old, k_new) in enumerate(zip(old_keys, keys)):
+                    if k_old != k_new:
+                        pn, pp = scan.parent(i)
+                        idx.remove(i, k_old, pn, pp)
+                        idx.add(i, k_new, pn, pp)
+        else:
+            idx = self._key_index = KeyIndex()
+            dirs, dir_ids = scan.dirs, scan.dir_ids
+            for i, k in enumerate(keys):
+                pn, pp, _m = dirs[dir_ids[i]]
+                idx.add(i, k, pn, pp)
+        self._key_index_cols = (scan, keys)
+
+    @rf_metrics.timed("viewer.refresh_previews")
     def _refresh_previews(self):
         if not hasattr(self, "tree_key"):
             return
 
-        # rebuild mapping key -> parents
-        self._key_to_parents = {}
-        for r in self.rows:
-            k = str(r.get("key", "")).strip()
-            pn = str(r.get("parent_name", "")).strip()
-            pp = str(r.get("parent_path", "")).strip()
-            if not k or not pn:
-                continue
-            self._key_to_parents.setdefault(k, [])
-            # unique by (pn, pp)
-            if not any(x["name"] == pn and x["path"] == pp for x in self._key_to_parents[k]):
-                self._key_to_parents[k].append({"name": pn, "path": pp})
-
-        # left keys
-        self.tree_key.delete(*self.tree_key.get_children())
-        seen = set()
-        i = 0
-        for r in self.rows:
-            k = str(r.get("key", "")).strip()
-            if not k:
-                continue
-            if self._is_numeric_dominant_key(k):
-                continue
-            if k in seen:
-                continue
-            seen.add(k)
-            self.tree_key.insert("", "end", iid=f"k{i}", values=(k,))
-            i += 1
+        # 絞り込み用の索引は key の顔ぶれが変わったときだけ作る（スライダーでは作らない）
+        idx = self._key_index
+        if self._key_filter is None or self._key_filter_version != (id(idx), idx.version):
+            self._key_filter = KeyFilterIndex(idx.keys_in_order(), stats=idx.stats, id_of=getattr(idx, "id_of", None))
+            self._key_filter_version = (id(idx), idx.version)
 
-        # clear parent display
-        self.var_parent_disp.set("（左でタイトルを選ぶと、ここに親フォルダが出ます）")
-        self.var_parent_sub.set("")
-        self._current_parent_name_for_search = ""
+        # left keys（スライダーの条件は索引の範囲検索だけ。Treeview には見えている行だけ）
+        self._vl_key.set_items(self._key_filter.visible(*self._filter_params()))
+
+        # parent display follows the (kept) selection
+        self._on_key_select()
 
         # rebuild right click menu to reflect current engines
         self._rebuild_search_menu()
@@ -985,14 +1891,13 @@ class App(tk.Tk):
             self.menu_search.add_command(label=f"{name}で検索", command=lambda n=name: self._search_selected(n))
 
     def _on_key_select(self):
-        sel = self.tree_key.selection()
+        key = self._vl_key.selected_value()
+        sel = key is not None
         # selected query display (search-mode hero)
         try:
             if hasattr(self, "var_selected_query"):
                 if sel:
-                    v = self.tree_key.item(sel[0], "values")
-                    q = (v[0] if v else "")
-                    self.var_selected_query.set(q if q else "（候補を選択）")
+                    self.var_selected_query.set(key if key else "（候補を選択）")
                 else:
                     self.var_selected_query.set("（候補を選択）")
         except Exception:
@@ -1003,17 +1908,14 @@ class App(tk.Tk):
             self._current_parent_name_for_search = ""
             return
 
-        iid = sel[0]
-        v = self.tree_key.item(iid, "values")
-        key = str(v[0]).strip() if v else ""
-        items = self._key_to_parents.get(key, [])
+        key = str(key).strip()
+        items = self._key_index.parents(key)  # ソート済み
         if not items:
             self.var_parent_disp.set("（親フォルダなし）")
             self.var_parent_sub.set("")
             self._current_parent_name_for_search = ""
             return
 
-        items = sorted(items, key=lambda x: (x["name"], x["path"]))
         first = items[0]
         name = first["name"]
         path = first["path"]
@@ -1028,6 +1930,10 @@ class App(tk.Tk):
 
     # ---------- selection ----------
     def clear_selection(self):
+        try:
+            self._vl_key.clear_selection()
+        except Exception:
+            pass
         for tname in ("tree_key", "tree_ws"):
             t = getattr(self, tname, None)
             if t:
@@ -1042,6 +1948,10 @@ class App(tk.Tk):
 
     # ---------- search actions ----------
     def _tree_selected_texts(self, tree):
+        if tree is getattr(self, "tree_key", None):
+            # 窓の外へスクロールしても選択は VirtualList が持っている
+            v = self._vl_key.selected_value()
+            return [v] if v else []
         out = []
         for iid in tree.selection():
             vals = tree.item(iid, "values")
@@ -1148,7 +2058,7 @@ class App(tk.Tk):
         # この viewer は「作業工房」を同一プロセスに埋め込んでいる前提なので、
         # 可能なら外部プロセスを起動せず、ローカルに StrongSaveWindow を開く。
         try:
-            wp = getattr(self, "workshop_panel", None)
+            wp = self._ensure_workshop_panel()
             if StrongSaveWindow is not None and wp is not None:
                 win = getattr(self, "_strong_save_win", None)
                 if win is not None and win.winfo_exists():
@@ -1199,8 +2109,8 @@ class App(tk.Tk):
         if not hasattr(self, "tree_ws"):
             return
         self.tree_ws.delete(*self.tree_ws.get_children())
-        for i, r in enumerate(self.rows):
-            self.tree_ws.insert("", "end", iid=f"ws{i}", values=(str(r.get("key", "")),))
+        for i, k in enumerate(self.rows.keys):
+            self.tree_ws.insert("", "end", iid=f"ws{i}", values=(k,))
 
     def start_tutorial(self):
         if self.mode.get() != "WORKSHOP":
@@ -1311,6 +2221,8 @@ class App(tk.Tk):
             "last_folder": self.folder,
             "engine_defs": getattr(self, "engine_defs", None),
             "filter_strength": int(self.var_filter_strength.get()),
+            "genre_map": getattr(self, "genre_map", []),
+            "row_store": getattr(self, "row_store_mode", "auto"),
         }
         save_json(self._settings_path, st)
 
@@ -1319,8 +2231,64 @@ class App(tk.Tk):
             self._save_settings()
         except Exception:
             pass
+        try:
+            self._save_key_snapshot()
+        except Exception:
+            pass
+        try:
+            self._cancel_rescan()
+            self._scan.keys = []
+            self._key_index_cols = (None, None)
+            self._release_rows(self._scan, list(self._key_cols.values()))
+        except Exception:
+            pass
         self.destroy()
 
+    # ---------- Genre map editor ----------
+    def _open_genre_map_editor(self):
+        """フォルダ（prefix）→ ジャンルの割当を編集する。1行1件「prefix = ジャンル」。"""
+        win = tk.Toplevel(self)
+        win.title("フォルダ別ジャンル")
+        win.geometry("560x380")
+        win.transient(self)
+        win.grab_set()
+
+        frm = ttk.Frame(win, padding=10)
+        frm.pack(fill="both", expand=True)
+
+        help_txt = (
+            "1行1件：フォルダ = ジャンル\n"
+            "例）anime = アニメ　／　music = 音楽　／　D:\\Library\\drama = ドラマ\n"
+            "相対パスは読み込んだフォルダからの相対。深い割当が優先。割当の無いファイルは選択中のジャンル。"
+        )
+        ttk.Label(frm, text=help_txt, justify="left").pack(anchor="w", pady=(0, 6))
+        txt = tk.Text(frm, height=12, wrap="none")
+        txt.pack(fill="both", expand=True)
+        txt.insert("1.0", "\n".join(f'{d["prefix"]} = {d["genre"]}' for d in getattr(self, "genre_map", [])))
+
+        bottom = ttk.Frame(win, padding=(10, 0, 10, 10))
+        bottom.pack(fill="x")
+
+        def save_and_close():
+            entries = []
+            for line in txt.get("1.0", "end").splitlines():
+                if "=" not in line:
+                    continue
+                prefix, genre = line.rsplit("=", 1)
+                entries.append({"prefix": prefix, "genre": genre})
+            self.genre_map = normalize_genre_map(entries)
+            self._save_settings()
+            win.destroy()
+            # 割当が変わったら key を作り直す
+            try:
+                if getattr(self, "folder", None) and os.path.isdir(self.folder):
+                    self._load_folder(self.folder)
+            except Exception:
+                pass
+
+        ttk.Button(bottom, text="保存", command=save_and_close).pack(side="right")
+        ttk.Button(bottom, text="キャンセル", command=win.destroy).pack(side="right", padx=(0, 8))
+
     # ---------- Engine Editor ----------
     def _open_engine_editor(self):
         win = tk.Toplevel(self)
@@ -1608,11 +2576,9 @@ class App(tk.Tk):
                 self.var_ws_hint.set("単語はクリックで☑/☐を切替。必要なら移動ボタンで往復できます。")
     def _ws_extract_words(self):
         """Return (non_bracket_words, bracket_words) as sorted unique lists."""
-        texts = []
-        for r in getattr(self, "rows", []):
-            k = str(r.get("key", "")).strip()
-            if k:
-                texts.append(k)
+        # 重複なしの key で足りる（語は set に集める）
+        # list にしない：mmap の索引なら2回とも mmap から順に読むだけ（key 全部をメモリに並べない）
+        texts = self._key_index.keys_in_order()
 
         bracketed = set()
         plain = set()
@@ -1708,8 +2674,8 @@ class App(tk.Tk):
             ad = get_app_dir()
             # samples: use current folder rows (raw titles). keep it lightweight.
             samples = []
-            for r in getattr(self, "rows", []):
-                s = str(r.get("raw", "") or "").strip()
+            for s in self.rows.raws:
+                s = (s or "").strip()
                 if s:
                     samples.append(s)
                 if len(samples) >= 5000:
@@ -1718,8 +2684,8 @@ class App(tk.Tk):
                 json.dump({"samples": samples}, f, ensure_ascii=False, indent=2)
 
             # last_send: workshop reads this first (more reliable than jsonl timing)
-            with open(os.path.join(ad, STATE_JSON), "w", encoding="utf-8") as f:
-                json.dump(payload, f, ensure_ascii=False, indent=2)
+            # applied_* は残し、stamp の世代も進める（直書きすると stamp が古いまま）
+            rf_ipc.write_state_keep_applied(os.path.join(ad, STATE_JSON), payload)
         except Exception as e:
             messagebox.showerror("送信失敗", f"サンプル/状態の保存に失敗しました: {e}", parent=self)
             return
@@ -1750,6 +2716,7 @@ class App(tk.Tk):
 
 
 def main():
+    rf_metrics.init_trace(sys.argv[1:], role="viewer")
     App().mainloop()
 
 
@@ -19,9 +19,27 @@ import re
 import sys
 import datetime
 import time
+import queue
+import difflib
 import tkinter as tk
 from tkinter import ttk, messagebox, simpledialog
 
+import ReadableFilenames_metrics as rf_metrics
+import ReadableFilenames_ipc as rf_ipc
+# 式の取り込み・適用・強の合成/検証は Tk なしのモジュールにある（ここでは同じ名前で使う）
+# 検証のプロセスプールの子は ReadableFilenames_core だけを読む（tkinter を読まない）
+from ReadableFilenames_core import (
+    DEFAULT_BRACKET_PAIRS,
+    extract_bracket_tokens,
+    parse_ai_blocks,
+    compile_rule,
+    apply_rules_trace,
+    merge_literal_materials,
+    diff_pattern_outputs,
+    verify_merged_patterns,
+    scan_raw_names,
+)
+
 # =====================
 # UI helpers: Text with both scrollbars + right-click copy/paste
 # =====================
@@ -98,63 +116,6 @@ INTERNAL_FIXED_TERMS = [
 ]
 
 
-# =====================
-# Bracket pairs (Stage1: bracket token observation)
-# =====================
-DEFAULT_BRACKET_PAIRS = [
-    ("(", ")"),
-    ("[", "]"),
-    ("{", "}"),
-    ("<", ">"),
-    ("（", "）"),
-    ("［", "］"),
-    ("｛", "｝"),
-    ("＜", "＞"),
-    ("【", "】"),
-    ("〔", "〕"),
-    ("〈", "〉"),
-    ("《", "》"),
-    ("「", "」"),
-    ("『", "』"),
-    ("〝", "〟"),
-    ("｢", "｣"),
-    ("‹", "›"),
-    ("«", "»"),
-]
-
-def extract_bracket_tokens(lines, bracket_pairs=None):
-    """Mechanical observation only.
-
-    - Extract 'open + inside + close' as ONE token (no splitting).
-    - No interpretation. No generalization.
-    - Deduplicate by exact string match; also count occurrences.
-
-    Returns: list of dicts: {"token": str, "count": int}
-    """
-    if bracket_pairs is None:
-        bracket_pairs = DEFAULT_BRACKET_PAIRS
-    pairs = [(str(a), str(b)) for a, b in bracket_pairs if str(a) and str(b)]
-    counts = {}
-    for raw in (lines or []):
-        s = str(raw or "")
-        if not s:
-            continue
-        for op, cl in pairs:
-            start = 0
-            while True:
-                i = s.find(op, start)
-                if i < 0:
-                    break
-                j = s.find(cl, i + len(op))
-                if j < 0:
-                    break
-                tok = s[i:j + len(cl)]
-                if tok:
-                    counts[tok] = counts.get(tok, 0) + 1
-                start = j + len(cl)
-    items = [{"token": k, "count": v} for k, v in counts.items()]
-    items.sort(key=lambda d: (-d["count"], d["token"]))
-    return items
 STATE_JSON = "ReadableFilenames_last_send.json"
 SAMPLES_JSON = "ReadableFilenames_samples.json"
 IPC_INBOX = "_ai_title_workshop_inbox.jsonl"  # viewer既存の送信先（互換用）
@@ -196,6 +157,7 @@ def app_dir() -> str:
     return os.path.dirname(os.path.abspath(__file__))
 
 
+@rf_metrics.timed("json.load")
 def safe_load_json(path, default):
     try:
         with open(path, "r", encoding="utf-8") as f:
@@ -204,6 +166,7 @@ def safe_load_json(path, default):
         return default
 
 
+@rf_metrics.timed("json.save")
 def safe_save_json(path, obj):
     os.makedirs(os.path.dirname(path), exist_ok=True)
     tmp = path + ".tmp"
@@ -235,10 +198,11 @@ def _lock_running(lock_path: str, max_age_sec: float = 3600.0) -> bool:
     # If the process is alive, treat lock as valid regardless of timestamp.
     return True
 
-def _write_lock(lock_path: str):
+def _write_lock(lock_path: str, extra=None):
     """Create/update the lock file only when needed.
     We avoid refreshing timestamps periodically to prevent constant file writes.
     The viewer checks process liveness via PID.
+    extra: additional fields (e.g. socket "port" / "token") to publish with the lock.
     """
     my_pid = os.getpid()
     # If the lock already points to this PID, do nothing (no constant writes)
@@ -246,11 +210,14 @@ def _write_lock(lock_path: str):
         cur = safe_load_json(lock_path, {})
         cur_pid = int(cur.get("pid", 0) or 0) if isinstance(cur, dict) else 0
         if cur_pid == my_pid and os.path.exists(lock_path):
-            return
+            if not extra or all(cur.get(k) == v for k, v in extra.items()):
+                return
     except Exception:
         pass
+    d = {"pid": my_pid, "ts": time.time()}
+    d.update(extra or {})
     try:
-        safe_save_json(lock_path, {"pid": my_pid, "ts": time.time()})
+        safe_save_json(lock_path, d)
     except Exception:
         pass
 
@@ -262,12 +229,15 @@ def _remove_lock(lock_path: str):
         pass
 
 def _append_inbox(msg: dict):
+    """既に動いている工房へ送る（socket 優先 → jsonl inbox）。"""
     try:
-        path = os.path.join(app_dir(), IPC_INBOX)
         m = dict(msg or {})
-        m.setdefault("id", f"ws_{int(time.time()*1000)}_{os.getpid()}")
-        with open(path, "a", encoding="utf-8") as f:
-            f.write(json.dumps(m, ensure_ascii=False) + "\n")
+        m.setdefault("id", rf_ipc.new_message_id("ws"))
+        rf_ipc.send_message(
+            m,
+            lock_path=os.path.join(app_dir(), LOCK_FILE),
+            inbox_path=os.path.join(app_dir(), IPC_INBOX),
+        )
     except Exception:
         pass
 
@@ -302,27 +272,20 @@ def _save_cursor(path: str, pos: int):
         pass
 
 def load_latest_prep_state() -> dict:
-    """優先順位: last_send.json -> inbox(jsonl)最後の行 -> 空"""
+    """優先順位: last_send.json -> inbox(jsonl)最後の payload 行 -> 空"""
     p_state = os.path.join(app_dir(), STATE_JSON)
     if os.path.exists(p_state):
         d = safe_load_json(p_state, {})
         if isinstance(d, dict) and d:
             return d
 
+    # 末尾から seek して最後の payload 行だけ読む（compact 直後は inbox.1 側にあることもある）
     p_inbox = os.path.join(app_dir(), IPC_INBOX)
-    if os.path.exists(p_inbox):
-        try:
-            last = ""
-            with open(p_inbox, "r", encoding="utf-8") as f:
-                for line in f:
-                    if line.strip():
-                        last = line
-            if last:
-                d = json.loads(last)
-                if isinstance(d, dict):
-                    return d
-        except Exception:
-            pass
+    for p in (p_inbox, rf_ipc.rotated_inbox_path(p_inbox)):
+        if os.path.exists(p):
+            d = rf_ipc.read_last_message(p, want=rf_ipc.is_payload)
+            if d:
+                return d
 
     return {
         "purpose": "SEARCH_DISPLAY",
@@ -362,128 +325,127 @@ def repo_path_for_genre(genre: str) -> str:
     return os.path.join(app_dir(), REPO_DIR, fn)
 
 
-def parse_ai_blocks(text: str):
-    """ブラウザのAI回答を取り込み。
-
-    Stage1（括弧トークン）では、AIは **pattern: 行のみ** を返す運用がある。
-    そのため、次の2系統を受け入れる。
+class RepoRegistry:
+    """REPO_DIR 内の rules_<genre>.json を解析済みのままメモリに持つ。
 
-    A) 従来ブロック:
-       name: ...
-       pattern: ...
-       注意: ...
+    - ファイルごとに (mtime_ns, size) を覚え、変わったものだけ読み直す
+    - 消えたファイルは忘れる
+    - 有効な式（on=True, 空でない pattern）だけを保持する
+    ③適用のたびに全ジャンルの JSON を読み直さないため。
+    """
 
-    B) 最小ブロック（推奨）:
-       pattern: ...
+    def __init__(self):
+        self._files = {}  # fn -> {"version", "genre", "patterns"}
+        self.parsed = 0  # 実際に JSON を読んだ回数（確認用）
 
-    取り込み時のルール:
-    - 1行=1式（pattern）
-    - name が無い場合は空文字のまま保存する（命名しない方針）
-    - why は無視（保存しない）
-    """
-    lines = text.splitlines()
-    blocks = []
-    cur = {"name": "", "pattern": "", "note": ""}
-    state = None
-
-    def flush():
-        nonlocal cur
-        pat = (cur.get("pattern") or "").strip()
-        if pat:
-            blocks.append({
-                "enabled": True,
-                "tier": "WEAK",
-                "name": (cur.get("name") or "").strip(),
-                "pattern": pat,
-                "note": (cur.get("note") or "").strip(),
-            })
-        cur = {"name": "", "pattern": "", "note": ""}
-
-    for raw in lines:
-        line = raw.rstrip("\n")
-        m = re.match(r"^\s*(name|pattern|why|注意)\s*:\s*(.*)$", line)
-        if m:
-            key = m.group(1)
-            val = m.group(2)
-            if key == "name":
-                if (cur.get("pattern") or "").strip():
-                    flush()
-                state = "name"
-                cur["name"] = val
-            elif key == "pattern":
-                if (cur.get("pattern") or "").strip():
-                    flush()
-                state = "pattern"
-                cur["pattern"] = val
-            elif key == "注意":
-                state = "note"
-                cur["note"] = val
-            else:
-                state = "why"
-            continue
+    @staticmethod
+    def _enabled_patterns(data):
+        rules = data.get("rules") if isinstance(data, dict) else None
+        patterns = []
+        if isinstance(rules, list):
+            for r in rules:
+                if not isinstance(r, dict):
+                    continue
+                if not bool(r.get("on", True)):
+                    continue
+                p = str(r.get("pattern") or "").strip()
+                if p:
+                    patterns.append(p)
+        return patterns
 
-        if state == "pattern":
-            if line.strip():
-                cur["pattern"] = (cur["pattern"] + " " + line.strip()).strip()
-        elif state == "note":
-            if line.strip():
-                cur["note"] = (cur["note"] + "\n" + line.strip()).strip()
-
-    flush()
-    return blocks
-
-def compile_rule(pattern: str):
-    p = (pattern or "").strip()
-    # r"..." / r'...' 形式を剥ぐ
-    if (p.startswith('r"') and p.endswith('"')) or (p.startswith("r'") and p.endswith("'")):
-        p = p[2:-1]
-    # "..." / '...' を剥ぐ
-    if (p.startswith('"') and p.endswith('"')) or (p.startswith("'") and p.endswith("'")):
-        p = p[1:-1]
-    return re.compile(p)
-
-
-def apply_rules_once(s: str, rules):
-    out = s
-    for r in rules:
-        if not r.get("enabled", True):
-            continue
-        pat = (r.get("pattern") or "").strip()
-        if not pat:
-            continue
+    def refresh(self):
+        repo_dir = os.path.join(app_dir(), REPO_DIR)
+        seen = set()
         try:
-            rx = compile_rule(pat)
-            out = rx.sub(" ", out)
+            entries = list(os.scandir(repo_dir))
         except Exception:
-            continue
-    out = re.sub(r"\s+", " ", out).strip()
-    return out
+            entries = []
+        for e in entries:
+            fn = e.name
+            if not (fn.startswith("rules_") and fn.endswith(".json")):
+                continue
+            try:
+                st = e.stat()
+                version = (st.st_mtime_ns, st.st_size)
+            except Exception:
+                continue
+            seen.add(fn)
+            ent = self._files.get(fn)
+            if ent is not None and ent["version"] == version:
+                continue
+            data = safe_load_json(e.path, {})
+            self.parsed += 1
+            self._files[fn] = {
+                "version": version,
+                "genre": normalize_genre(fn[len("rules_"):-len(".json")]),
+                "patterns": self._enabled_patterns(data),
+            }
+        for fn in list(self._files.keys()):
+            if fn not in seen:
+                del self._files[fn]
+
+    def genres(self) -> dict:
+        """{genre: [有効な式...]}（ファイル名順。返す list はコピー）"""
+        self.refresh()
+        out = {}
+        for fn in sorted(self._files.keys()):
+            ent = self._files[fn]
+            out[ent["genre"]] = list(ent["patterns"])
+        return out
+
 
+_REPO_REGISTRY = RepoRegistry()
 
-def apply_rules_trace(s: str, rules):
-    """Apply rules sequentially and return (result, hits).
-    hits is a list of rule labels that actually changed the text.
+
+def _values_key(values):
+    return tuple(str(v) for v in (values or ()))
+
+
+def sync_treeview(tree, rows, parent=""):
+    """Treeview の子を rows = [(iid, values), ...] と同じにする。差分だけ反映する。
+
+    - 無くなった iid は delete、新しい iid はその位置に insert
+    - 並びが変わったものだけ move（動かさない行は difflib の一致ブロックで決める）
+    - values が変わった行だけ item(values=...) で更新
+    全消し→全挿入しないので、選択・スクロール位置はそのまま残る。
+    Returns: {"inserted", "deleted", "moved", "updated"}
     """
-    out = s
-    hits = []
-    for i, r in enumerate(rules):
-        if not r.get("enabled", True):
-            continue
-        pat = (r.get("pattern") or "").strip()
-        if not pat:
+    stats = {"inserted": 0, "deleted": 0, "moved": 0, "updated": 0}
+    want = [iid for iid, _v in rows]
+    keep = set(want)
+    cur = list(tree.get_children(parent))
+    gone = [iid for iid in cur if iid not in keep]
+    if gone:
+        tree.delete(*gone)
+        stats["deleted"] = len(gone)
+        cur = [iid for iid in cur if iid in keep]
+    have = set(cur)
+
+    stay = set()
+    for a, _b, size in difflib.SequenceMatcher(a=cur, b=want, autojunk=False).get_matching_blocks():
+        stay.update(cur[a:a + size])
+
+    # stay 以外は「want で一つ前の行」の直後へ置く。stay の行は一度も動かさない
+    prev = None
+    for iid, values in rows:
+        at = cur.index(prev) + 1 if prev is not None else 0
+        prev = iid
+        if iid not in have:
+            tree.insert(parent, at, iid=iid, values=values)
+            cur.insert(at, iid)
+            stats["inserted"] += 1
             continue
-        try:
-            rx = compile_rule(pat)
-            before = out
-            out = rx.sub(" ", out)
-            if out != before:
-                name = str(r.get("name") or "").strip()
-                label = f"#{i+1} {name}".strip()
-                hits.append(label)
-        except Exception:
-            continue
-    out = re.sub(r"\s+", " ", out).strip()
-    return out, hits
+        if iid not in stay:
+            old = cur.index(iid)
+            if old != at:
+                tree.move(iid, parent, at)
+                del cur[old]
+                cur.insert(at - 1 if old < at else at, iid)
+                stats["moved"] += 1
+        if _values_key(tree.item(iid, "values")) != _values_key(values):
+            tree.item(iid, values=values)
+            stats["updated"] += 1
+    return stats
 
 
 class WorkshopPanel(ttk.Frame):
@@ -509,6 +471,10 @@ class WorkshopPanel(ttk.Frame):
         self.repo_note = str(self.state.get("repo_note") or self.state.get("note") or DEFAULT_REPO_NOTE)
 
         self.rules = []
+        # Treeview の iid は並び位置ではなくルール（dict）ごとに固定する。削除・移動で他の行の iid が変わらない
+        self._rule_iids = {}  # id(rule) -> (rule, iid)。rule を握っておくので id は使い回されない
+        self._iid_index = {}  # iid -> self.rules の位置（_refresh_tree で作り直す）
+        self._next_rule_iid = 0
         self.weakmid_state = None  # saved into repo as JSON
         self.samples = self._load_samples()
         self._samples_mtime = self._get_samples_mtime()
@@ -841,7 +807,8 @@ class WorkshopPanel(ttk.Frame):
             self.state["strength"] = "STRONG"
 
         try:
-            safe_save_json(os.path.join(app_dir(), STATE_JSON), self.state)
+            # applied_* は viewer / 適用側の持ち物。古い self.state で巻き戻さない（stamp は進める）
+            rf_ipc.write_state_keep_applied(os.path.join(app_dir(), STATE_JSON), self.state)
         except Exception:
             pass
 
@@ -1073,14 +1040,7 @@ class WorkshopPanel(ttk.Frame):
 
             # 3) 検索モードへ渡す（適用スナップショット：current / prev）
             try:
-                st_path = os.path.join(app_dir(), STATE_JSON)
-                st = safe_load_json(st_path, {})
-                if not isinstance(st, dict):
-                    st = {}
-                cur = st.get("applied_current")
-                st["applied_prev"] = cur if isinstance(cur, dict) else None
-                st["applied_current"] = payload
-                safe_save_json(st_path, st)
+                rf_ipc.push_applied_state(os.path.join(app_dir(), STATE_JSON), payload)
             except Exception:
                 pass
 
@@ -1206,9 +1166,10 @@ class WorkshopPanel(ttk.Frame):
         except Exception as e:
             messagebox.showerror(APP_TITLE, f"コピーに失敗しました:\n{e}")
 
+    @rf_metrics.timed("workshop.refresh_tree")
     def _refresh_tree(self):
-        self.tree.delete(*self.tree.get_children())
-
+        # 全消し→全挿入ではなく差分で反映する（選択・スクロール位置を保つ）
+        rows = []
         visible_no = 0
 
         # show only rules allowed by current strength (弱/中/強)
@@ -1219,28 +1180,48 @@ class WorkshopPanel(ttk.Frame):
         else:
             allowed = {"WEAK", "MEDIUM", "STRONG"}
 
+        live = {}
+        index = {}
         for i, r in enumerate(self.rules):
+            iid = self._rule_iid(r)
+            if iid in index:
+                # 同じ dict が2回入っている（貼り付け等）。別のルールとして扱う
+                r = self.rules[i] = dict(r)
+                iid = self._rule_iid(r)
+            live[id(r)] = (r, iid)
+            index[iid] = i
             tier = str(r.get("tier", "WEAK") or "WEAK").upper()
             if tier not in allowed:
                 continue
             on = "☑" if r.get("enabled", True) else "☐"
             visible_no += 1
             hit = self._calc_hit_count_for_pattern(r.get("pattern", ""))
-            self.tree.insert("", "end", iid=f"r{i}",
-                             values=(visible_no, on, r.get("name", ""), hit, r.get("pattern", ""), r.get("note", "")))
+            rows.append((iid, (visible_no, on, r.get("name", ""), hit, r.get("pattern", ""), r.get("note", ""))))
+        self._rule_iids = live  # 消えたルールの分は捨てる
+        self._iid_index = index
+        sync_treeview(self.tree, rows)
+
+    def _rule_iid(self, r):
+        ent = self._rule_iids.get(id(r))
+        if ent is not None and ent[0] is r:
+            return ent[1]
+        self._next_rule_iid += 1
+        iid = f"r{self._next_rule_iid}"
+        self._rule_iids[id(r)] = (r, iid)
+        return iid
+
+    def _select_rule(self, idx):
+        """self.rules[idx] の行を選択して見える位置へ（強度で隠れている行なら何もしない）。"""
+        iid = self._rule_iid(self.rules[idx])
+        if self.tree.exists(iid):
+            self.tree.selection_set(iid)
+            self.tree.see(iid)
 
     def _selected_index(self):
         sel = self.tree.selection()
         if not sel:
             return None
-        iid = sel[0]
-        m = re.match(r"^r(\d+)$", iid)
-        if not m:
-            return None
-        idx = int(m.group(1))
-        if 0 <= idx < len(self.rules):
-            return idx
-        return None
+        return self._index_from_iid(sel[0])
 
     def _load_selected_into_editor(self):
         idx = self._selected_index()
@@ -1261,8 +1242,7 @@ class WorkshopPanel(ttk.Frame):
         self.rules[idx]["pattern"] = (self.var_pattern.get() or "").strip()
         self.rules[idx]["note"] = (self.var_note.get() or "").strip()
         self._refresh_tree()
-        self.tree.selection_set(f"r{idx}")
-        self.tree.see(f"r{idx}")
+        self._select_rule(idx)
 
     def on_double_click_toggle(self, _evt):
         idx = self._selected_index()
@@ -1270,7 +1250,7 @@ class WorkshopPanel(ttk.Frame):
             return
         self.rules[idx]["enabled"] = not bool(self.rules[idx].get("enabled", True))
         self._refresh_tree()
-        self.tree.selection_set(f"r{idx}")
+        self._select_rule(idx)
         self.refresh_preview()
         # プレビュー用サンプル欄も最新に置き換え
         try:
@@ -1282,9 +1262,7 @@ class WorkshopPanel(ttk.Frame):
     def add_rule(self):
         self.rules.append({"enabled": True, "tier": "WEAK", "name": "New", "pattern": r"\bWORD\b", "note": ""})
         self._refresh_tree()
-        idx = len(self.rules) - 1
-        self.tree.selection_set(f"r{idx}")
-        self.tree.see(f"r{idx}")
+        self._select_rule(len(self.rules) - 1)
         self._load_selected_into_editor()
 
     def delete_rule(self):
@@ -1305,8 +1283,7 @@ class WorkshopPanel(ttk.Frame):
             return
         self.rules[idx], self.rules[j] = self.rules[j], self.rules[idx]
         self._refresh_tree()
-        self.tree.selection_set(f"r{j}")
-        self.tree.see(f"r{j}")
+        self._select_rule(j)
         self.refresh_preview()
 
     def _build_ai_repo_payload(self):
@@ -1532,28 +1509,8 @@ class WorkshopPanel(ttk.Frame):
         """
         try:
             # 1) Collect all genre rules from repo files (rules_<genre>.json)
-            genres = {}
-            repo_dir = os.path.join(app_dir(), REPO_DIR)
-            if os.path.isdir(repo_dir):
-                for fn in sorted(os.listdir(repo_dir)):
-                    if not (fn.startswith("rules_") and fn.endswith(".json")):
-                        continue
-                    genre = fn[len("rules_"):-len(".json")]
-                    genre = normalize_genre(genre)
-                    path = os.path.join(repo_dir, fn)
-                    data = safe_load_json(path, {})
-                    rules = data.get("rules") if isinstance(data, dict) else None
-                    patterns = []
-                    if isinstance(rules, list):
-                        for r in rules:
-                            if not isinstance(r, dict):
-                                continue
-                            if not bool(r.get("on", True)):
-                                continue
-                            p = str(r.get("pattern") or "").strip()
-                            if p:
-                                patterns.append(p)
-                    genres[genre] = patterns
+            #    変更のあったファイルだけ読み直す（RepoRegistry）
+            genres = _REPO_REGISTRY.genres()
 
             # 2) Ensure default genres exist (so empty boxes still appear)
             for g in DEFAULT_GENRES:
@@ -1578,14 +1535,7 @@ class WorkshopPanel(ttk.Frame):
                 "order": order,
             }
 
-            st_path = os.path.join(app_dir(), STATE_JSON)
-            st = safe_load_json(st_path, {})
-            if not isinstance(st, dict):
-                st = {}
-            cur = st.get("applied_current")
-            st["applied_prev"] = cur if isinstance(cur, dict) else None
-            st["applied_current"] = payload
-            safe_save_json(st_path, st)
+            rf_ipc.push_applied_state(os.path.join(app_dir(), STATE_JSON), payload)
         except Exception:
             pass
 
@@ -1658,8 +1608,9 @@ class WorkshopPanel(ttk.Frame):
             return
         self.txt_samples.insert("end", "\n".join(self.samples))
 
-    def _poll_external_state(self):
-        """viewer が samples.json を更新したら、サンプル欄を追従更新（置き換え表示）。"""
+    def _poll_external_state(self) -> bool:
+        """viewer が samples.json を更新したら、サンプル欄を追従更新（置き換え表示）。
+        再スケジュールは start_external_poll() の AdaptivePoller。"""
         try:
             m = self._get_samples_mtime()
             if m is not None and getattr(self, "_samples_mtime", None) != m:
@@ -1669,12 +1620,18 @@ class WorkshopPanel(ttk.Frame):
                     self._render_samples()
                 except Exception:
                     pass
+                return True
         except Exception:
             pass
-        try:
-            self.after(700, self._poll_external_state)
-        except Exception:
-            pass
+        return False
+
+    def start_external_poll(self):
+        """samples.json の監視を始める（放置中は間隔を伸ばす）。"""
+        if getattr(self, "_external_poller", None) is None:
+            self._external_poller = rf_ipc.AdaptivePoller(
+                self, self._poll_external_state, min_ms=700, max_ms=10000, name="external_state"
+            ).attach_activity().start()
+        return self._external_poller
 
     def open_preview(self):
         if self._preview_win and self._preview_win.winfo_exists():
@@ -1696,6 +1653,7 @@ class WorkshopPanel(ttk.Frame):
         frm_preview.pack(fill="both", expand=True, pady=(6, 0))
         self.refresh_preview()
 
+    @rf_metrics.timed("workshop.refresh_preview")
     def refresh_preview(self):
         if not (self._preview_win and self._preview_win.winfo_exists()):
             return
@@ -1798,17 +1756,22 @@ class WorkshopPanel(ttk.Frame):
             return
         self.rules[idx]["enabled"] = not bool(self.rules[idx].get("enabled", False))
         self._refresh_tree()
-        self.tree.selection_set(f"r{idx}")
-        self.tree.see(f"r{idx}")
+        self._select_rule(idx)
         self._load_selected_into_editor()
         self.refresh_preview()
 
     def _index_from_iid(self, iid):
-        if isinstance(iid, str) and iid.startswith("r"):
-            try:
-                return int(iid[1:])
-            except Exception:
-                return None
+        """行の iid -> self.rules の位置。無くなったルールなら None。"""
+        idx = self._iid_index.get(iid)
+        if idx is not None and 0 <= idx < len(self.rules):
+            ent = self._rule_iids.get(id(self.rules[idx]))
+            if ent is not None and ent[0] is self.rules[idx] and ent[1] == iid:
+                return idx
+        # _refresh_tree より後に self.rules が並び替わった
+        for i, r in enumerate(self.rules):
+            ent = self._rule_iids.get(id(r))
+            if ent is not None and ent[0] is r and ent[1] == iid:
+                return i
         return None
 
 
@@ -1825,6 +1788,11 @@ class WorkshopApp(tk.Tk):
             pass
         self.panel = WorkshopPanel(self)
         self.panel.pack(fill="both", expand=True)
+        # 単体起動時は viewer 側の samples.json 更新に追従する
+        self.panel.start_external_poll()
+        # 隠し機能：Ctrl+Shift+M で計測ウィンドウ / Ctrl+Shift+P（O）で次の操作のプロファイル
+        rf_metrics.bind_metrics_window(self, title="計測（工房）")
+        rf_metrics.bind_profile_capture(self, app_dir(), role="workshop")
 
         # --- メニュー：強の入口はここだけ ---
         try:
@@ -2372,6 +2340,51 @@ class StrongSaveWindow(tk.Toplevel):
         row.pack(fill="x", pady=(8, 0))
         ttk.Button(row, text="AIに渡すテキストをコピー", command=self._copy_pack).pack(side="left")
 
+        # tab: local merge (AIを使わずにリテラル材料を1本へ)
+        tab_local = ttk.Frame(nb, padding=10)
+        nb.add(tab_local, text="ローカル合成")
+
+        ttk.Label(tab_local, text="ローカル合成（リテラル材料 → 1本の式 / AI不要）", font=("Segoe UI", 10, "bold")).pack(anchor="w")
+        local_row = ttk.Frame(tab_local)
+        local_row.pack(fill="x", pady=(4, 6))
+        self.var_local_digits = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            local_row, text="数字だけ違う材料を \\d+ にまとめる", variable=self.var_local_digits
+        ).pack(side="left")
+        ttk.Button(local_row, text="合成＋検証", command=self._local_merge).pack(side="left", padx=(10, 0))
+        ttk.Button(local_row, text="結果をコピー", command=self._copy_local_merge).pack(side="left", padx=(6, 0))
+
+        self.txt_local = tk.Text(tab_local, wrap="none")
+        l_y = ttk.Scrollbar(tab_local, orient="vertical", command=self.txt_local.yview)
+        self.txt_local.configure(yscrollcommand=l_y.set)
+        self.txt_local.pack(side="left", fill="both", expand=True)
+        l_y.pack(side="left", fill="y", padx=(6, 0))
+        self._local_merged = []
+
+        # tab: verify (合成済みの式 ≡ 材料 か、ライブラリ全件で確認)
+        tab_verify = ttk.Frame(nb, padding=10)
+        nb.add(tab_verify, text="検証")
+
+        ttk.Label(tab_verify, text="合成済みの式（pattern: 行を貼り付け）", font=("Segoe UI", 10, "bold")).pack(anchor="w")
+        self.txt_verify_in = tk.Text(tab_verify, wrap="none", height=5)
+        self.txt_verify_in.pack(fill="x", pady=(4, 6))
+
+        verify_row = ttk.Frame(tab_verify)
+        verify_row.pack(fill="x", pady=(0, 6))
+        self.btn_verify = ttk.Button(verify_row, text="検証（全件）", command=self._start_verify)
+        self.btn_verify.pack(side="left")
+        self.var_verify_status = tk.StringVar(value="材料と同じ結果になるか、適用先フォルダの全ファイル名で確認します。")
+        ttk.Label(verify_row, textvariable=self.var_verify_status, foreground="#666").pack(side="left", padx=(10, 0))
+
+        verify_out = ttk.Frame(tab_verify)
+        verify_out.pack(fill="both", expand=True)
+        self.txt_verify_out = tk.Text(verify_out, wrap="none")
+        v_y = ttk.Scrollbar(verify_out, orient="vertical", command=self.txt_verify_out.yview)
+        self.txt_verify_out.configure(yscrollcommand=v_y.set)
+        self.txt_verify_out.pack(side="left", fill="both", expand=True)
+        v_y.pack(side="left", fill="y", padx=(6, 0))
+        self._verify_job = None
+
         self._update_available_genres()
         # 初期表示では合成しない（生成ボタンで更新）
         self.txt_pack.delete('1.0', 'end')
@@ -2421,6 +2434,69 @@ class StrongSaveWindow(tk.Toplevel):
         except Exception:
             pass
 
+    def _genre_index(self, gs):
+        """genres dict -> (表示順のジャンル名, [(正規化ジャンル, 材料リスト), ...] キーの並び順)
+
+        正規化で同じジャンルになるキー（"アニメ" と " アニメ " など）もまとめない。
+        まとめると材料の並び（= 重複を除いた後の順）がキーの並びとずれる。
+        """
+        names = []
+        mats = []
+        if isinstance(gs, dict):
+            for g, lst in gs.items():
+                name = str(g).strip()
+                if name:
+                    names.append(name)
+                bucket = []
+                if isinstance(lst, list):
+                    for p in lst:
+                        p2 = str(p).strip()
+                        if p2:
+                            bucket.append(p2)
+                mats.append((normalize_genre(g), bucket))
+        return names, mats
+
+    def _state_cache(self):
+        """last_send.json の applied_current を1回だけ解析して保持する。
+
+        ファイルの版（applied の世代 + mtime_ns, size）が変わったときだけ読み直す。
+        ジャンル選択・セット切替・生成のたびにディスクを読まないため。
+        """
+        p = os.path.join(app_dir(), STATE_JSON)
+        try:
+            st = os.stat(p)
+            version = (rf_ipc.read_applied_stamp(p), st.st_mtime_ns, st.st_size)
+        except Exception:
+            version = None
+        cache = getattr(self, "_applied_cache", None)
+        if cache is not None and cache["version"] == version:
+            return cache
+
+        gs = None
+        if version is not None:
+            try:
+                d = safe_load_json(p, {})
+                cur = d.get("applied_current") if isinstance(d, dict) else None
+                gs = cur.get("genres") if isinstance(cur, dict) else None
+            except Exception:
+                gs = None
+        names, mats = self._genre_index(gs)
+        cache = {"version": version, "genres": names, "materials": mats}
+        self._applied_cache = cache
+        return cache
+
+    def _weakmid_cache(self):
+        """workshop_panel.weakmid_state（画面内状態）の索引。dict が差し替わったときだけ作り直す。"""
+        st = getattr(self.workshop_panel, "weakmid_state", None)
+        gs = st.get("genres") if isinstance(st, dict) else None
+        cache = getattr(self, "_weakmid_index", None)
+        if cache is not None and cache["source"] is gs:
+            return cache
+        names, mats = self._genre_index(gs)
+        cache = {"source": gs, "genres": names, "materials": mats}
+        self._weakmid_index = cache
+        return cache
+
     def _get_available_genres(self):
         """材料ソースの優先順位:
         1) last_send.json の applied_current（検索モードと同じ成果物）
@@ -2429,24 +2505,12 @@ class StrongSaveWindow(tk.Toplevel):
         """
         genres = []
         try:
-            st = safe_load_json(os.path.join(app_dir(), STATE_JSON), {})
-            cur = st.get("applied_current") if isinstance(st, dict) else None
-            gs = cur.get("genres") if isinstance(cur, dict) else None
-            if isinstance(gs, dict):
-                for g in gs.keys():
-                    if str(g).strip():
-                        genres.append(str(g).strip())
+            genres = list(self._state_cache()["genres"])
         except Exception:
-            pass
+            genres = []
 
         if not genres:
-            st = getattr(self.workshop_panel, "weakmid_state", None)
-            if isinstance(st, dict):
-                gs = st.get("genres")
-                if isinstance(gs, dict):
-                    for g in gs.keys():
-                        if str(g).strip():
-                            genres.append(str(g).strip())
+            genres = list(self._weakmid_cache()["genres"])
 
         if not genres:
             genres = list(DEFAULT_GENRES)
@@ -2457,40 +2521,25 @@ class StrongSaveWindow(tk.Toplevel):
         """選択ジャンルから材料（pattern 行）を集める。
         材料ソースは applied_current.genres（優先）→ workshop_panel.weakmid_state.genres。
         """
-        selected = []
         selected_set = set([normalize_genre(g) for g in (selected_genres or []) if str(g).strip()])
 
-        def _collect_from_genres_dict(gs: dict):
+        def _collect(cache):
             out = []
             # keep stable order: keys insertion order
-            for g, lst in gs.items():
-                g2 = normalize_genre(g)
-                if g2 not in selected_set:
-                    continue
-                if isinstance(lst, list):
-                    for p in lst:
-                        p2 = str(p).strip()
-                        if p2:
-                            out.append(p2)
+            for g2, lst in cache["materials"]:
+                if g2 in selected_set:
+                    out.extend(lst)
             return out
 
         # 1) from applied_current on disk
         try:
-            st = safe_load_json(os.path.join(app_dir(), STATE_JSON), {})
-            cur = st.get("applied_current") if isinstance(st, dict) else None
-            gs = cur.get("genres") if isinstance(cur, dict) else None
-            if isinstance(gs, dict):
-                selected = _collect_from_genres_dict(gs)
+            selected = _collect(self._state_cache())
         except Exception:
             selected = []
 
         # 2) fallback: weakmid_state in memory
         if not selected:
-            st2 = getattr(self.workshop_panel, "weakmid_state", None)
-            if isinstance(st2, dict):
-                gs2 = st2.get("genres")
-                if isinstance(gs2, dict):
-                    selected = _collect_from_genres_dict(gs2)
+            selected = _collect(self._weakmid_cache())
 
         # unique, preserve order
         seen=set()
@@ -2622,17 +2671,16 @@ class StrongSaveWindow(tk.Toplevel):
                 s = self._sets[idx]
                 patterns = self._materials_from_selected_genres(s.get("genres") or [])
         patterns = self._included_patterns(patterns)
-        self.txt_pack.delete("1.0", "end")
         repo_txt = self._repo_text
         if hasattr(self, 'txt_repo'):
             try:
                 repo_txt = self.txt_repo.get('1.0', 'end-1c')
             except Exception:
                 repo_txt = self._repo_text
-        self.txt_pack.insert('1.0', repo_txt)
-        self.txt_pack.insert("end", "\n")
-        for p in patterns:
-            self.txt_pack.insert("end", f"pattern: {p}\n")
+        # 1回の insert で入れる（材料が数千行でも待たない）
+        pack = repo_txt + "\n" + "".join(f"pattern: {p}\n" for p in patterns)
+        self.txt_pack.delete("1.0", "end")
+        self.txt_pack.insert("1.0", pack)
     def _generate_ai_payload(self):
         """材料（チェック状態含む）からAIに渡すテキストを再生成する（明示トリガ）"""
         try:
@@ -2665,6 +2713,161 @@ class StrongSaveWindow(tk.Toplevel):
         except Exception:
             pass
 
+    # ---------------- local merge ----------------
+    def _current_materials(self):
+        """ジャンル選択＋チェック状態（☑のみ）から、いま見えている材料を返す。"""
+        sels = list(self.list_genres.curselection())
+        all_g = self._get_available_genres()
+        chosen = [all_g[sels[0]]] if (sels and 0 <= sels[0] < len(all_g)) else []
+        return self._included_patterns(self._materials_from_selected_genres(chosen))
+
+    def _local_merge(self):
+        """リテラル材料を trie 式1本にまとめ、サンプルで元の材料と同じ結果になるか確認する。"""
+        try:
+            mats = self._current_materials()
+        except Exception:
+            mats = []
+        merged, n_lit = merge_literal_materials(mats, generalize_digits=bool(self.var_local_digits.get()))
+        self._local_merged = list(merged)
+        # 検証タブにも渡しておく（全件検証はそちらで）
+        try:
+            self.txt_verify_in.delete("1.0", "end")
+            self.txt_verify_in.insert("1.0", "\n".join(f"pattern: {p}" for p in merged))
+        except Exception:
+            pass
+
+        samples = list(getattr(self.workshop_panel, "samples", None) or [])
+        diffs = diff_pattern_outputs(mats, merged, samples)
+
+        lines = [f"pattern: {p}" for p in merged]
+        lines.append("")
+        lines.append(f"# 材料 {len(mats)} 本（リテラル {n_lit} 本を合成）→ {len(merged)} 本")
+        if not samples:
+            lines.append("# 検証: サンプルがありません（viewerでフォルダを読み込んでください）")
+        elif not diffs:
+            lines.append(f"# 検証: サンプル {len(samples)} 件すべて材料と同じ結果です")
+        else:
+            lines.append(f"# 検証: サンプル {len(samples)} 件中 {len(diffs)} 件で結果が違います")
+            for s, a, b in diffs[:40]:
+                lines.append(f"#   元: {s}")
+                lines.append(f"#   材料→ {a}")
+                lines.append(f"#   合成→ {b}")
+        try:
+            self.txt_local.delete("1.0", "end")
+            self.txt_local.insert("1.0", "\n".join(lines) + "\n")
+        except Exception:
+            pass
+
+    def _copy_local_merge(self):
+        if not self._local_merged:
+            return
+        try:
+            self.clipboard_clear()
+            self.clipboard_append("\n".join(f"pattern: {p}" for p in self._local_merged))
+            self.update_idletasks()
+        except Exception:
+            pass
+
+    # ---------------- verify (materials vs merged) ----------------
+    def _verify_source(self):
+        """検証に使う raw 名の出どころ: 適用先フォルダ → viewer の読み込み済み rows → samples。
+
+        Returns: (label, folder_or_None, names_or_None)
+        フォルダの走査は重いので、ここでは決めるだけ（走査はワーカースレッドで行う）。
+        """
+        idx = self._current_set_index()
+        if idx is not None and 0 <= idx < len(self._sets):
+            folder = str(self._sets[idx].get("folder_path") or "")
+            if folder and os.path.isdir(folder):
+                return folder, folder, None
+        w = self.master
+        while w is not None:
+            rows = getattr(w, "rows", None)
+            if rows:
+                return "viewer", None, [str(r.get("raw", "") or "") for r in rows]
+            w = getattr(w, "master", None)
+        return "samples", None, list(getattr(self.workshop_panel, "samples", None) or [])
+
+    def _start_verify(self):
+        if self._verify_job is not None:
+            return
+        try:
+            blocks = parse_ai_blocks(self.txt_verify_in.get("1.0", "end-1c"))
+        except Exception:
+            blocks = []
+        merged = [b["pattern"] for b in blocks]
+        if not merged:
+            messagebox.showinfo(APP_TITLE, "合成済みの式（pattern: 行）を貼り付けてください。", parent=self)
+            return
+        try:
+            mats = self._current_materials()
+        except Exception:
+            mats = []
+        if not mats:
+            messagebox.showinfo(APP_TITLE, "材料がありません（ジャンルを選択してください）。", parent=self)
+            return
+
+        import threading
+
+        label, folder, names = self._verify_source()
+        job = {"done": False, "result": None, "error": None, "source": label}
+
+        def _run():
+            try:
+                src = scan_raw_names(folder) if folder else names
+                job["result"] = verify_merged_patterns(mats, merged, src)
+            except Exception as e:
+                job["error"] = e
+            finally:
+                job["done"] = True
+
+        self._verify_job = job
+        self.btn_verify.configure(state="disabled")
+        self.var_verify_status.set(f"検証中…（{label}）")
+        threading.Thread(target=_run, daemon=True).start()
+        self.after(150, self._poll_verify)
+
+    def _poll_verify(self):
+        job = self._verify_job
+        if job is None:
+            return
+        if not job["done"]:
+            self.after(150, self._poll_verify)
+            return
+        self._verify_job = None
+        try:
+            self.btn_verify.configure(state="normal")
+        except Exception:
+            return
+        if job["error"] is not None:
+            self.var_verify_status.set(f"検証に失敗しました: {job['error']}")
+            return
+        self._render_verify_result(job["result"], job["source"])
+
+    def _render_verify_result(self, res, source):
+        total = res["total"]
+        diffs = res["diffs"]
+        speedup = (res["materials_sec"] / res["merged_sec"]) if res["merged_sec"] > 0 else 0.0
+        lines = [
+            f"対象: {total} 件（{source}） / 並列: {res['workers']} / 経過: {res['elapsed']:.2f} 秒",
+            f"材料: {res['materials_sec']:.3f} 秒（{res['materials_rate']:.0f} 件/秒）",
+            f"合成: {res['merged_sec']:.3f} 秒（{res['merged_rate']:.0f} 件/秒）  速度比 x{speedup:.2f}",
+            "",
+        ]
+        if not diffs:
+            lines.append("食い違いはありません。合成済みの式は材料と同じ結果になります。")
+        else:
+            lines.append(f"食い違い: {len(diffs)} 件")
+            lines.append("")
+            for s, a, b in diffs:
+                lines.append(f"元: {s}")
+                lines.append(f"材料→ {a}")
+                lines.append(f"合成→ {b}")
+                lines.append("")
+        self.var_verify_status.set("一致しました。" if not diffs else f"{len(diffs)} 件で結果が違います。")
+        self.txt_verify_out.delete("1.0", "end")
+        self.txt_verify_out.insert("1.0", "\n".join(lines))
+
     # ---------------- set operations ----------------
     def _prompt_text(self, title, prompt, initial=""):
         try:
@@ -2815,11 +3018,60 @@ class StrongSaveWindow(tk.Toplevel):
 
 
 
+def _dispatch_message(app, msg: dict):
+    """IPC メッセージ（socket / inbox 共通の cmd 語彙）を処理する。"""
+    cmd = msg.get("cmd")
+    rf_metrics.event("ipc.recv", cmd=cmd, peer=msg.get("trace_session"), msg_id=msg.get("id"))
+    if cmd == "SHOW":
+        try:
+            app.deiconify()
+        except Exception:
+            pass
+        try:
+            app.lift()
+            app.focus_force()
+        except Exception:
+            pass
+
+    elif cmd == "OPEN_STRONG_SAVE":
+        try:
+            # 既存の強ウインドウがあれば前面へ
+            win = getattr(app, "_strong_save_win", None)
+            if win is not None and win.winfo_exists():
+                try:
+                    win.deiconify()
+                except Exception:
+                    pass
+                try:
+                    win.lift()
+                    win.focus_force()
+                except Exception:
+                    pass
+            else:
+                # ない場合は新規で開く
+                try:
+                    app.deiconify()
+                    app.iconify()
+                except Exception:
+                    pass
+                win = StrongSaveWindow(app, workshop_panel=app.panel)
+                app._strong_save_win = win
+                try:
+                    win.deiconify()
+                    win.lift()
+                    win.focus_force()
+                except Exception:
+                    pass
+        except Exception:
+            pass
+
+
 def main():
     import sys
 
     # args
     args = list(sys.argv[1:])
+    rf_metrics.init_trace(args, role="workshop")
     single = ("--single" in args)
     hidden = ("--hidden" in args)
     open_strong = any(a in ("--open-strong-save", "--strong-save", "--strong") for a in args)
@@ -2876,18 +3128,63 @@ def main():
         except Exception:
             pass
 
-    # IPC: watch inbox for SHOW (bring to front)
+    # IPC (socket): 届いたメッセージはサーバスレッド → queue → Tk スレッドで処理
+    msg_queue = queue.Queue()
+
+    def _drain_messages(_evt=None):
+        n = 0
+        while True:
+            try:
+                msg = msg_queue.get_nowait()
+            except queue.Empty:
+                break
+            _dispatch_message(app, msg)
+            n += 1
+        return n
+
+    def _on_socket_message(msg):
+        msg_queue.put(msg)
+        try:
+            # Tk スレッドを起こす（失敗しても inbox ポーリング時に drain される）
+            app.event_generate("<<RFMessage>>", when="tail")
+        except Exception:
+            pass
+
+    app.bind("<<RFMessage>>", _drain_messages)
+    server = None
+    try:
+        server = rf_ipc.MessageServer(_on_socket_message)
+        port = server.start()
+        _write_lock(lock_path, extra={"port": port, "token": server.token})
+    except Exception:
+        server = None
+
+    # socket が使えるときは inbox はフォールバック分だけ（間隔を広げ、放置中はさらに伸ばす）
+    # socket が無いときは inbox が唯一の経路。送り手は工房を起こせないので伸ばさない
+    # （空振りは getsize 1回だけ。従来の固定 600ms と同じ遅れで SHOW / payload を拾う）
+    inbox_interval = 2000 if server is not None else 600
+    inbox_max = 15000 if server is not None else inbox_interval
+
+    # IPC (inbox): watch inbox for SHOW (bring to front)
+    # 読み位置はメモリで持つ（毎回 cursor ファイルから読むと、保存前の位置から読み直してしまう）
+    cursor = {"pos": _load_cursor(cursor_path)}
+
     def _poll_inbox():
+        """Returns: メッセージを処理したら True（AdaptivePoller 用）"""
+        n = _drain_messages()
         try:
             if os.path.exists(inbox_path):
-                pos = _load_cursor(cursor_path)
+                pos = cursor["pos"]
                 # If inbox was rotated/truncated, cursor may point past EOF; clamp it.
+                sz = None
                 try:
                     sz = os.path.getsize(inbox_path)
                     if pos > sz:
                         pos = 0
                 except Exception:
                     pass
+                if sz is not None and pos == sz:
+                    return n > 0  # 追記なし（開かない）
                 with open(inbox_path, "r", encoding="utf-8") as f:
                     try:
                         f.seek(pos)
@@ -2905,88 +3202,52 @@ def main():
                         except Exception:
                             continue
                         if isinstance(msg, dict):
-                            cmd = msg.get("cmd")
-                            if cmd == "SHOW":
-                                try:
-                                    app.deiconify()
-                                except Exception:
-                                    pass
-                                try:
-                                    app.lift()
-                                    app.focus_force()
-                                except Exception:
-                                    pass
-
-                            elif cmd == "OPEN_STRONG_SAVE":
-                                try:
-                                    # 既存の強ウインドウがあれば前面へ
-                                    win = getattr(app, "_strong_save_win", None)
-                                    if win is not None and win.winfo_exists():
-                                        try:
-                                            win.deiconify()
-                                        except Exception:
-                                            pass
-                                        try:
-                                            win.lift()
-                                            win.focus_force()
-                                        except Exception:
-                                            pass
-                                    else:
-                                        # ない場合は新規で開く
-                                        try:
-                                            app.deiconify()
-                                            app.iconify()
-                                        except Exception:
-                                            pass
-                                        win = StrongSaveWindow(app, workshop_panel=app.panel)
-                                        app._strong_save_win = win
-                                        try:
-                                            win.deiconify()
-                                            win.lift()
-                                            win.focus_force()
-                                        except Exception:
-                                            pass
-                                except Exception:
-                                    pass
+                            _dispatch_message(app, msg)
+                            n += 1
                     try:
                         pos2 = f.tell()
                     except Exception:
                         pos2 = 0
-                try:
-                    global _LAST_CURSOR_POS
-                    _LAST_CURSOR_POS = int(pos2)
-                except Exception:
-                    pass
+                cursor["pos"] = int(pos2)
+
+                # 読み切った inbox が大きくなったら退避して作り直す（読むのは常に小さいファイル）
+                if pos2 > rf_ipc.INBOX_MAX_BYTES:
+                    leftover = rf_ipc.compact_inbox(inbox_path, pos2)
+                    if leftover is not None:
+                        for msg in leftover:
+                            _dispatch_message(app, msg)
+                            n += 1
+                        cursor["pos"] = 0
+                        _save_cursor(cursor_path, 0)
         except Exception:
             pass
 
         # lock file is not refreshed periodically (write-once)
+        return n > 0
 
+    inbox_poller = rf_ipc.AdaptivePoller(
+        app, _poll_inbox, min_ms=inbox_interval, max_ms=inbox_max, name="inbox"
+    ).attach_activity().start(600)
+
+    # ensure lock cleaned up on exit
+    def _on_close():
         try:
-            app.after(600, _poll_inbox)
+            # save cursor once on exit (avoid constant writes)
+            try:
+                _save_cursor(cursor_path, cursor["pos"])
+            except Exception:
+                pass
         except Exception:
             pass
 
-    try:
-        app.after(600, _poll_inbox)
-    except Exception:
-        pass
-# ensure lock cleaned up on exit
-def _on_close():
-    try:
-        # save cursor once on exit (avoid constant writes)
+        inbox_poller.stop()
+        if server is not None:
+            server.stop()
+        _remove_lock(lock_path)
         try:
-            _save_cursor(cursor_path, _LAST_CURSOR_POS if _LAST_CURSOR_POS is not None else 0)
+            app.destroy()
         except Exception:
             pass
-    except Exception:
-        pass
-
-    _remove_lock(lock_path)
-    try:
-        app.destroy()
-    except Exception:
-        pass
 
     try:
         app.protocol("WM_DELETE_WINDOW", _on_close)
@@ -2996,6 +3257,8 @@ def _on_close():
     try:
         app.mainloop()
     finally:
+        if server is not None:
+            server.stop()
         _remove_lock(lock_path)
 
 if __name__ == "__main__":
@@ -0,0 +1,323 @@
+# -*- coding: utf-8 -*-
+"""
+Corpus: 合成したファイル名（アニメ / 音楽 / ドラマ）で、候補生成まわりの処理を件数ごとに測る
+
+- 名前は seed から決まる（同じ引数なら毎回同じ名前・同じ順序）
+  [グループ] タグ・解像度・話数・CRC・全角括弧（【】「」『』（））・日本語タイトル・S01E02 形式などを混ぜる
+- 測るもの（件数はそれぞれ n 件の名前）:
+  apply_rules_once / apply_rules_trace（工房の弱ルール）
+  apply_patterns_for_genre（検索モードの候補生成。1件ずつ呼ぶ = 毎回コンパイル）と
+  compile_genre_patterns + apply_compiled_patterns（フォルダ読み込みと同じ使い回し）
+  extract_bracket_tokens（全件まとめて1回）/ parse_ai_blocks（n 行の AI 回答）
+  数字だらけの key の判定（_is_numeric_dominant_key と同じ key_filter_stats + key_digit_ratio）と
+  KeyFilterIndex（作成 + スライダー 11 段の visible）
+  強い保存の材料集め（StrongSaveWindow の索引 + _materials_from_selected_genres）。
+  正規化すると同じジャンルになるキー（"アニメ" / " アニメ "、"" / "その他"）も混ぜる
+  （結果の順序の確認は ReadableFilenames_check_materials.py）
+- 各処理は --repeat 回測って最小を使う
+
+使い方:
+    python benchmarks/bench_corpus.py                         # 1k / 100k / 1M
+    python benchmarks/bench_corpus.py --sizes 1000,10000 --repeat 3 --out corpus.json
+    python benchmarks/bench_corpus.py --sample 20             # 生成した名前を見るだけ
+結果は JSON で標準出力に出す（--out で保存も可）。
+"""
+import os
+import sys
+import gc
+import json
+import time
+import random
+import argparse
+import platform
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ReadableFilenames_core as C  # noqa: E402
+import ReadableFilenames_viewer as V  # noqa: E402（KeyFilterIndex だけ）
+import ReadableFilenames_workshop as W  # noqa: E402（StrongSaveWindow の材料集めだけ。Tk は作らない）
+
+DEFAULT_SIZES = (1000, 100000, 1000000)
+
+GROUPS = ["SubsPlease", "Erai-raws", "Judas", "ASW", "NC-Raws", "Ohys-Raws", "LoliHouse", "VCB-Studio"]
+ANIME_TITLES = [
+    "呪術廻戦", "葬送のフリーレン", "【推しの子】", "薬屋のひとりごと", "ぼっち・ざ・ろっく！", "SPY×FAMILY",
+    "Jujutsu Kaisen", "Sousou no Frieren", "One Piece", "Kusuriya no Hitorigoto", "Dungeon Meshi",
+    "進撃の巨人 The Final Season", "鬼滅の刃 刀鍛冶の里編", "チェンソーマン", "Re:ゼロから始める異世界生活",
+]
+EP_TITLES = ["旅立ち", "約束", "決戦前夜", "魔法の本", "The Journey", "ひとりぼっち", "再会", "最終話"]
+RESOLUTIONS = ["1080p", "720p", "2160p", "480p", "1920x1080", "1280x720"]
+SOURCES = ["WEB-DL", "WEBRip", "BDRip", "HDTV", "BD", "AT-X", "TBS"]
+CODECS = ["x264", "x265", "HEVC", "AVC", "AAC", "FLAC", "10bit", "Hi10P"]
+VIDEO_EXT = [".mkv", ".mp4", ".ts", ".avi"]
+
+ARTISTS = ["米津玄師", "YOASOBI", "Aimer", "LiSA", "Official髭男dism", "King Gnu", "Ado", "宇多田ヒカル", "Mrs. GREEN APPLE", "Daft Punk"]
+SONGS = ["Lemon", "アイドル", "残響散歌", "紅蓮華", "Pretender", "白日", "うっせぇわ", "First Love", "ケセラセラ", "One More Time", "夜に駆ける"]
+AUDIO = ["FLAC 24bit-96kHz", "FLAC", "MP3 320K", "AAC 256K", "ALAC", "Hi-Res", "WAV"]
+AUDIO_EXT = [".flac", ".mp3", ".m4a", ".wav"]
+
+DRAMAS = ["VIVANT", "silent", "半沢直樹", "逃げるは恥だが役に立つ", "Breaking Bad", "The Crown", "相棒 season22", "孤独のグルメ Season10"]
+CHANNELS = ["NHK", "TBS", "フジテレビ", "日テレ", "テレ朝", "Netflix"]
+
+# 工房の弱ルール（よくある候補: 括弧タグ・解像度・コーデック・CRC・拡張子）
+RULES = [
+    {"enabled": True, "tier": "WEAK", "name": "拡張子", "pattern": r"\.(?:mkv|mp4|ts|avi|flac|mp3|m4a|wav)$"},
+    {"enabled": True, "tier": "WEAK", "name": "CRC", "pattern": r"\[[0-9A-F]{8}\]"},
+    {"enabled": True, "tier": "WEAK", "name": "グループ", "pattern": r"^\[[^\]]+\]\s*"},
+    {"enabled": True, "tier": "WEAK", "name": "解像度", "pattern": r"[\[\(（]?(?:\d{3,4}p|\d{3,4}x\d{3,4})[\]\)）]?"},
+    {"enabled": True, "tier": "WEAK", "name": "ソース", "pattern": r"\b(?:WEB-DL|WEBRip|BDRip|HDTV|BD)\b"},
+    {"enabled": True, "tier": "WEAK", "name": "コーデック", "pattern": r"\b(?:x26[45]|HEVC|AVC|AAC|FLAC|10bit|Hi10P)\b"},
+    {"enabled": True, "tier": "WEAK", "name": "音質", "pattern": r"[\(\[（](?:FLAC|MP3|AAC|ALAC|WAV|Hi-Res)[^\)\]）]*[\)\]）]"},
+    {"enabled": False, "tier": "WEAK", "name": "無効（数えない）", "pattern": r"\d+"},
+    {"enabled": True, "tier": "WEAK", "name": "放送局", "pattern": r"【(?:NHK|TBS|フジテレビ|日テレ|テレ朝|Netflix)】"},
+    {"enabled": True, "tier": "WEAK", "name": "区切り", "pattern": r"[._]+"},
+]
+
+# 検索モードの「最後に適用した状態」（未分類 + ジャンル）
+APPLIED_STATE = {
+    "genres": {
+        "未分類": [RULES[0]["pattern"], RULES[1]["pattern"], RULES[9]["pattern"]],
+        "アニメ": [RULES[2]["pattern"], RULES[3]["pattern"], RULES[4]["pattern"], RULES[5]["pattern"]],
+        "音楽": [RULES[6]["pattern"], r"^\d{1,3}\s*[.\-]\s*"],
+        "ドラマ": [RULES[8]["pattern"], RULES[3]["pattern"], r"[\(（]\d{4}[\)）]"],
+    },
+    "order": [r["pattern"] for r in RULES],
+}
+GENRES = ("アニメ", "音楽", "ドラマ")
+
+# 強い保存の材料集め：正規化で衝突するキーを含むジャンル（値は bench_size で埋める）
+STRONG_GENRE_KEYS = ("アニメ", "音楽", " アニメ ", "", "ドラマ", "その他", "未分類")
+STRONG_SELECTIONS = (["アニメ"], ["その他"], ["音楽", "アニメ"], list(GENRES) + ["その他", "未分類"])
+
+
+def _anime(rnd: random.Random) -> str:
+    t = rnd.choice(ANIME_TITLES)
+    ep = rnd.randint(1, 1100 if t == "One Piece" else 26)
+    crc = f"{rnd.getrandbits(32):08X}"
+    res = rnd.choice(RESOLUTIONS)
+    ext = rnd.choice(VIDEO_EXT)
+    k = rnd.randrange(5)
+    if k == 0:
+        return f"[{rnd.choice(GROUPS)}] {t} - {ep:02d} ({res}) [{crc}]{ext}"
+    if k == 1:
+        return f"【{rnd.choice(GROUPS)}】{t} 第{ep:02d}話「{rnd.choice(EP_TITLES)}」[{res}][{rnd.choice(SOURCES)}]{ext}"
+    if k == 2:
+        s = t.replace(" ", ".")
+        return f"{s}.S{rnd.randint(1, 4):02d}E{ep:02d}.{res}.{rnd.choice(SOURCES)}.{rnd.choice(CODECS)}-{rnd.choice(GROUPS)}{ext}"
+    if k == 3:
+        return f"[{rnd.choice(GROUPS)}] {t} 第{ep}話 [{rnd.choice(CODECS)} {res}]『{rnd.choice(EP_TITLES)}』{ext}"
+    return f"{t} #{ep:02d} （{res} {rnd.choice(CODECS)}）{ext}"
+
+
+def _music(rnd: random.Random) -> str:
+    a = rnd.choice(ARTISTS)
+    s = rnd.choice(SONGS)
+    tr = rnd.randint(1, 18)
+    ext = rnd.choice(AUDIO_EXT)
+    k = rnd.randrange(4)
+    if k == 0:
+        return f"{tr:02d}. {a} - {s} ({rnd.choice(AUDIO)}){ext}"
+    if k == 1:
+        return f"[{rnd.randint(1990, 2024)}.{rnd.randint(1, 12):02d}.{rnd.randint(1, 28):02d}] {a}「{s}」[{rnd.choice(AUDIO)}]{ext}"
+    if k == 2:
+        return f"{a} - {s} (Live at 日本武道館 {rnd.randint(2000, 2024)}) 【{rnd.choice(AUDIO)}】{ext}"
+    return f"{tr:03d}_{a}_{s}{ext}"
+
+
+def _drama(rnd: random.Random) -> str:
+    d = rnd.choice(DRAMAS)
+    ep = rnd.randint(1, 12)
+    ext = rnd.choice(VIDEO_EXT)
+    k = rnd.randrange(4)
+    if k == 0:
+        return f"【{rnd.choice(CHANNELS)}】{d} 第{ep}話 ({rnd.randint(2010, 2024)}) [{rnd.choice(SOURCES)} {rnd.choice(RESOLUTIONS)}]{ext}"
+    if k == 1:
+        return f"{d.replace(' ', '.')}.S{rnd.randint(1, 5):02d}E{ep:02d}.{rnd.choice(RESOLUTIONS)}.{rnd.choice(SOURCES)}{ext}"
+    if k == 2:
+        return f"{d} ＃{ep:02d}「{rnd.choice(EP_TITLES)}」（{rnd.choice(CHANNELS)} {rnd.choice(RESOLUTIONS)}）{ext}"
+    return f"{rnd.randint(20100101, 20241231)}_{rnd.randint(0, 2359):04d}_{rnd.choice(CHANNELS)}{ext}"  # 数字だらけ
+
+
+_MAKERS = (_anime, _music, _drama)
+
+
+def make_corpus(n: int, seed: int = 0):
+    """[(genre, name), ...] を n 件。アニメ 5 : 音楽 3 : ドラマ 2。"""
+    rnd = random.Random(seed)
+    weights = (5, 3, 2)
+    out = []
+    for _ in range(n):
+        g = rnd.choices((0, 1, 2), weights)[0]
+        out.append((GENRES[g], _MAKERS[g](rnd)))
+    return out
+
+
+def make_ai_answer(n_lines: int, seed: int = 0) -> str:
+    """parse_ai_blocks 用の AI 回答（従来ブロックと pattern 行だけのブロックを混ぜる）。"""
+    rnd = random.Random(seed)
+    lines = []
+    i = 0
+    while len(lines) < n_lines:
+        r = RULES[i % len(RULES)]
+        if rnd.random() < 0.5:
+            lines.append(f"pattern: {r['pattern']}")
+        else:
+            lines.append(f"name: {r['name']} {i}")
+            lines.append(f"pattern: {r['pattern']}")
+            lines.append(f"why: よく出る {r['name']}")
+            lines.append("注意: タイトルの核は消さない")
+            lines.append("")
+        i += 1
+    return "\n".join(lines[:n_lines])
+
+
+def _best(fn, repeat: int):
+    best = None
+    out = None
+    for _ in range(max(1, repeat)):
+        gc.collect()
+        t0 = time.perf_counter()
+        out = fn()
+        dt = time.perf_counter() - t0
+        best = dt if best is None else min(best, dt)
+    return best, out
+
+
+def _row(seconds: float, items: int, **extra):
+    d = {
+        "s": round(seconds, 4),
+        "items": items,
+        "us_per_item": round(seconds * 1e6 / max(1, items), 3),
+        "items_per_s": round(items / seconds) if seconds > 0 else None,
+    }
+    d.update(extra)
+    return d
+
+
+def _strong_genres(names):
+    # 名前を材料に見立ててキーへ振り分ける。隣のキーにも同じ材料を少し重ねる（重複除去も測る）
+    keys = STRONG_GENRE_KEYS
+    gs = {k: [] for k in keys}
+    for i, s in enumerate(names):
+        gs[keys[i % len(keys)]].append(s)
+        if i % 7 == 0:
+            gs[keys[(i + 1) % len(keys)]].append(s)
+    return gs
+
+
+def bench_size(n: int, repeat: int, seed: int):
+    corpus = make_corpus(n, seed)
+    names = [s for _g, s in corpus]
+    res = {}
+
+    t, _ = _best(lambda: [C.apply_rules_once(s, RULES) for s in names], repeat)
+    res["apply_rules_once"] = _row(t, n)
+
+    def _trace():
+        hits = 0
+        for s in names:
+            hits += len(C.apply_rules_trace(s, RULES)[1])
+        return hits
+
+    t, hits = _best(_trace, repeat)
+    res["apply_rules_trace"] = _row(t, n, hits=hits)
+
+    t, _ = _best(lambda: [C.apply_patterns_for_genre(s, APPLIED_STATE, g) for g, s in corpus], repeat)
+    res["apply_patterns_for_genre"] = _row(t, n)
+
+    def _compiled():
+        cache = {g: C.compile_genre_patterns(APPLIED_STATE, g) for g in GENRES}
+        return [C.apply_compiled_patterns(s, cache[g]) for g, s in corpus]
+
+    t, keys = _best(_compiled, repeat)
+    res["apply_compiled_patterns"] = _row(t, n)
+
+    t, toks = _best(lambda: C.extract_bracket_tokens(names), repeat)
+    res["extract_bracket_tokens"] = _row(t, n, tokens=len(toks))
+
+    text = make_ai_answer(n, seed)
+    t, blocks = _best(lambda: C.parse_ai_blocks(text), repeat)
+    res["parse_ai_blocks"] = _row(t, n, blocks=len(blocks), chars=len(text))
+
+    # 候補 key（重複なし・出現順）で数字だらけの判定
+    uniq = list(dict.fromkeys(k for k in keys if k))
+    ratio_th, min_chars = 0.95 - 0.35 * 0.6, int(1 + 7 * 0.6)  # _filter_params の既定（強さ 60）
+
+    def _numeric():
+        hidden = 0
+        for k in uniq:
+            c, d, a = C.key_filter_stats(k)
+            if c < min_chars or C.key_digit_ratio(d, a) >= ratio_th:
+                hidden += 1
+        return hidden
+
+    t, hidden = _best(_numeric, repeat)
+    res["numeric_dominant_key"] = _row(t, len(uniq), hidden=hidden)
+
+    t, idx = _best(lambda: V.KeyFilterIndex(uniq), repeat)
+    res["key_filter_index.build"] = _row(t, len(uniq))
+
+    def _sweep():
+        shown = 0
+        for step in range(11):
+            st = step / 10.0
+            shown += len(idx.visible(0.95 - 0.35 * st, int(1 + 7 * st)))
+        return shown
+
+    t, shown = _best(_sweep, repeat)
+    res["key_filter_index.visible_x11"] = _row(t, len(uniq) * 11, shown=shown)
+
+    gs = _strong_genres(names[:20000])
+    n_mats = sum(len(v) for v in gs.values())
+    empty = {"genres": [], "materials": []}
+
+    def _strong():
+        names_, mats = W.StrongSaveWindow._genre_index(None, gs)
+        cache = {"genres": names_, "materials": mats}
+        host = SimpleNamespace(_state_cache=lambda: cache, _weakmid_cache=lambda: empty)
+        return [W.StrongSaveWindow._materials_from_selected_genres(host, sel) for sel in STRONG_SELECTIONS]
+
+    t, _got = _best(_strong, repeat)
+    res["strong_materials"] = _row(t, n_mats * len(STRONG_SELECTIONS), selections=len(STRONG_SELECTIONS), materials=n_mats)
+    return {"n": n, "unique_keys": len(uniq), "results": res}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--sizes", default=",".join(str(x) for x in DEFAULT_SIZES), help="comma separated corpus sizes")
+    ap.add_argument("--repeat", type=int, default=1, help="runs per measurement (best is reported)")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--sample", type=int, default=0, help="print N generated names and exit")
+    ap.add_argument("--out", default="", help="write JSON result to this path")
+    a = ap.parse_args(argv)
+
+    if a.sample:
+        for g, s in make_corpus(a.sample, a.seed):
+            print(f"{g}\t{s}")
+        return None
+
+    sizes = [int(x) for x in a.sizes.split(",") if x.strip()]
+    runs = []
+    for n in sizes:
+        runs.append(bench_size(n, a.repeat, a.seed))
+        sys.stderr.write(f"done n={n}\n")
+    result = {
+        "bench": "corpus",
+        "sizes": sizes,
+        "repeat": a.repeat,
+        "seed": a.seed,
+        "python": platform.python_version(),
+        "runs": runs,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    s = json.dumps(result, ensure_ascii=False, indent=2)
+    print(s)
+    if a.out:
+        with open(a.out, "w", encoding="utf-8") as f:
+            f.write(s + "\n")
+    return result
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+IPC latency: jsonl inbox（ポーリング） vs localhost socket
+
+送信してから受け手の処理関数に届くまでの時間を測る。
+- inbox: 送信＝1行追記。受け手は poll-ms ごとに cursor 位置から読む（工房の _poll_inbox と同じ読み方）
+- socket: ReadableFilenames_ipc.send_socket → MessageServer（ack まで含む）
+
+使い方:
+    python benchmarks/bench_ipc.py --n 200 --poll-ms 600
+結果は JSON で標準出力に出す（--out で保存も可）。
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ReadableFilenames_ipc as rf_ipc  # noqa: E402
+
+
+def _summary(samples_ms):
+    xs = sorted(samples_ms)
+    if not xs:
+        return {"n": 0}
+
+    def pct(p):
+        return xs[min(len(xs) - 1, int(round(p * (len(xs) - 1))))]
+
+    return {
+        "n": len(xs),
+        "p50_ms": round(pct(0.50), 3),
+        "p95_ms": round(pct(0.95), 3),
+        "max_ms": round(xs[-1], 3),
+        "mean_ms": round(sum(xs) / len(xs), 3),
+    }
+
+
+def bench_inbox(n: int, poll_ms: int, gap_ms: int):
+    latencies = []
+    rnd = random.Random(0)  # 送信タイミングをポーリング周期からずらす（位相固定を避ける）
+    got = threading.Event()
+    stop = threading.Event()
+    with tempfile.TemporaryDirectory() as td:
+        inbox = os.path.join(td, "inbox.jsonl")
+        open(inbox, "w", encoding="utf-8").close()
+
+        def reader():
+            pos = 0
+            while not stop.is_set():
+                with open(inbox, "r", encoding="utf-8") as f:
+                    f.seek(pos)
+                    while True:
+                        line = f.readline()
+                        if not line:
+                            break
+                        msg = json.loads(line)
+                        latencies.append((time.perf_counter() - msg["t"]) * 1000.0)
+                        got.set()
+                    pos = f.tell()
+                stop.wait(poll_ms / 1000.0)
+
+        th = threading.Thread(target=reader, daemon=True)
+        th.start()
+        for _ in range(n):
+            got.clear()
+            rf_ipc.append_inbox_line(inbox, {"cmd": "SHOW", "t": time.perf_counter()})
+            got.wait(5.0)
+            time.sleep((gap_ms + rnd.uniform(0, poll_ms)) / 1000.0)
+        stop.set()
+        th.join(2.0)
+    return latencies
+
+
+def bench_socket(n: int, gap_ms: int):
+    latencies = []
+    got = threading.Event()
+
+    def on_message(msg):
+        latencies.append((time.perf_counter() - msg["t"]) * 1000.0)
+        got.set()
+
+    srv = rf_ipc.MessageServer(on_message)
+    port = srv.start()
+    failed = 0
+    try:
+        for _ in range(n):
+            got.clear()
+            if not rf_ipc.send_socket(port, srv.token, {"cmd": "SHOW", "t": time.perf_counter()}):
+                failed += 1
+            got.wait(5.0)
+            time.sleep(gap_ms / 1000.0)
+    finally:
+        srv.stop()
+    return latencies, failed
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--n", type=int, default=50, help="messages per transport")
+    ap.add_argument("--poll-ms", type=int, default=600, help="inbox poll interval (workshop default: 600)")
+    ap.add_argument("--gap-ms", type=int, default=5, help="pause between messages")
+    ap.add_argument("--out", default="", help="write JSON result to this path")
+    a = ap.parse_args(argv)
+
+    inbox_lat = bench_inbox(a.n, a.poll_ms, a.gap_ms)
+    sock_lat, failed = bench_socket(a.n, a.gap_ms)
+    result = {
+        "bench": "ipc_latency",
+        "n": a.n,
+        "poll_ms": a.poll_ms,
+        "inbox": _summary(inbox_lat),
+        "socket": dict(_summary(sock_lat), failed=failed),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    s = json.dumps(result, ensure_ascii=False, indent=2)
+    print(s)
+    if a.out:
+        with open(a.out, "w", encoding="utf-8") as f:
+            f.write(s + "\n")
+    return result
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+Row memory: 1ファイル1 dict（旧 rows）vs RowStore（親フォルダを表に1回、行は dir_id + raw）
+
+フォルダを歩く代わりに合成したファイル名で、ビューアが走査後に持つものを作って tracemalloc で測る。
+- dict: _scan [(raw, parent_name, parent_path, mapped), ...] + key 列 + rows [{"raw","key","parent_name","parent_path"}, ...]
+- store: RowStore（dirs / dir_ids / raws）+ key 列
+key 列はどちらにもあるので両方に含める。ファイル名（raw）の文字列は測る前に作るので含まない。
+
+使い方:
+    python benchmarks/bench_rowstore.py --n 200000 --per-dir 50
+結果は JSON で標準出力に出す（--out で保存も可）。
+"""
+import os
+import sys
+import gc
+import json
+import time
+import random
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ReadableFilenames_viewer import RowStore  # noqa: E402
+
+
+def _names(n: int, per_dir: int, seed: int = 0):
+    """[(parent_path, [raw, ...]), ...] を作る（os.walk の root と同じく親パスはフォルダごとに1つ）"""
+    rnd = random.Random(seed)
+    words = ["Show", "Movie", "Live", "Special", "Episode", "Final", "Extra", "Part"]
+    out = []
+    d = 0
+    left = n
+    while left > 0:
+        k = min(left, per_dir)
+        root = os.path.join("/media", f"Series{d // 100:04d}", f"Season{d:06d} {rnd.choice(words)}")
+        raws = [f"[Group] {rnd.choice(words)} {d:06d} - {i:03d} (1080p) [{rnd.getrandbits(32):08X}]" for i in range(k)]
+        out.append((root, raws))
+        left -= k
+        d += 1
+    return out
+
+
+def _key(raw: str) -> str:
+    return raw.split(" (")[0].replace("[Group] ", "")
+
+
+def build_dict_rows(tree):
+    scan = []
+    keys = []
+    for root, raws in tree:
+        pn = os.path.basename(root)
+        for raw in raws:
+            scan.append((raw, pn, root, None))
+            keys.append(_key(raw))
+    rows = [
+        {"raw": raw, "key": k, "parent_name": pn, "parent_path": pp}
+        for (raw, pn, pp, _m), k in zip(scan, keys)
+    ]
+    return scan, keys, rows
+
+
+def build_row_store(tree):
+    store = RowStore()
+    keys = []
+    for root, raws in tree:
+        dir_id = store.add_dir(os.path.basename(root), root, None)
+        for raw in raws:
+            store.append(raw, dir_id)
+            keys.append(_key(raw))
+    store.keys = keys
+    return store
+
+
+def _measure(build, tree):
+    gc.collect()
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    obj = build(tree)
+    dt = time.perf_counter() - t0
+    cur, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del obj
+    gc.collect()
+    return {"bytes": cur, "peak_bytes": peak, "mb": round(cur / 1e6, 2), "build_s": round(dt, 3)}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--n", type=int, default=200000, help="number of files")
+    ap.add_argument("--per-dir", type=int, default=50, help="files per folder")
+    ap.add_argument("--out", default="", help="write JSON result to this path")
+    a = ap.parse_args(argv)
+
+    tree = _names(a.n, a.per_dir)
+    before = _measure(build_dict_rows, tree)
+    after = _measure(build_row_store, tree)
+    result = {
+        "bench": "row_memory",
+        "n": a.n,
+        "per_dir": a.per_dir,
+        "dict_rows": before,
+        "row_store": after,
+        "bytes_per_row": {
+            "dict_rows": round(before["bytes"] / max(1, a.n), 1),
+            "row_store": round(after["bytes"] / max(1, a.n), 1),
+        },
+        "ratio": round(after["bytes"] / max(1, before["bytes"]), 3),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    s = json.dumps(result, ensure_ascii=False, indent=2)
+    print(s)
+    if a.out:
+        with open(a.out, "w", encoding="utf-8") as f:
+            f.write(s + "\n")
+    return result
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+"""
+Scan: 合成したフォルダ木を作り、フォルダ読み込み（_load_folder と同じ処理）を端から端まで測る
+
+- 木: <dir>/{anime,music,drama}/d0/d1/... を fan-out × depth で作り、各フォルダに --files 個の空ファイル
+  ファイル名は bench_corpus と同じ生成器（seed で決まる）。anime / music / drama にはジャンルの割当を付ける
+  --dir /dev/shm などで tmpfs に作れる（既定は一時フォルダ。--keep で残す）
+- 測るもの（ビューアの App のメソッドをそのまま使う。Tk は作らない）:
+  scan     : _scan_rows（os.walk + 割当の引き当て + 式で key まで）。--repeat 回の 1回目と最小
+  samples  : _write_samples_json（工房へ渡す samples.json）
+  index    : _sync_key_index（key -> 行・親フォルダの索引。mmap の列はファイルの索引をつなぐだけ）
+  rekey    : ジャンル切替と同じ key 列の作り直し（_compute_keys / _compute_key_column_on_disk）
+- files/s と、各段階のあとのピーク RSS（プロセス全体の最大値なので単調に増える）
+  --mode auto / memory / mmap（設定の row_store と同じ）で置き場所を選ぶ。比べるときは別々に実行する
+
+使い方:
+    python benchmarks/bench_scan.py --fanout 10 --depth 2 --files 100
+    python benchmarks/bench_scan.py --dir /dev/shm --fanout 20 --depth 2 --files 500 --mode mmap --out scan.json
+結果は JSON で標準出力に出す（--out で保存も可）。
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import platform
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+import ReadableFilenames_viewer as V  # noqa: E402
+from bench_corpus import APPLIED_STATE, GENRES, make_corpus  # noqa: E402
+
+GENRE_DIRS = {"アニメ": "anime", "音楽": "music", "ドラマ": "drama"}
+GENRE_MAP = [{"prefix": d, "genre": g} for g, d in GENRE_DIRS.items()]
+
+
+def peak_rss_mb():
+    """このプロセスのピーク RSS（MB）。resource が無い OS では None。"""
+    try:
+        import resource
+
+        r = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(r / (1024.0 * 1024.0) if sys.platform == "darwin" else r / 1024.0, 1)
+    except Exception:
+        return None
+
+
+def _leaf_dirs(base: str, fanout: int, depth: int):
+    out = [base]
+    for lv in range(depth):
+        out = [os.path.join(p, f"d{lv}_{i:03d}") for p in out for i in range(fanout)]
+    return out
+
+
+def build_tree(root: str, fanout: int, depth: int, files: int, seed: int = 0):
+    """Returns: (ファイル数, フォルダ数)"""
+    leaves = {g: _leaf_dirs(os.path.join(root, d), fanout, depth) for g, d in GENRE_DIRS.items()}
+    total = files * sum(len(v) for v in leaves.values())
+    pos = {g: 0 for g in GENRES}
+    seen = set()
+    made = 0
+    for g, name in make_corpus(total, seed):
+        dirs = leaves[g]
+        if pos[g] >= len(dirs) * files:
+            g = min(GENRES, key=lambda x: pos[x] / len(leaves[x]))  # 割合の都合で余ったら空いている側へ
+            dirs = leaves[g]
+        d = dirs[pos[g] // files]
+        pos[g] += 1
+        if pos[g] % files == 1 or files == 1:
+            os.makedirs(d, exist_ok=True)
+        p = os.path.join(d, name)
+        if p in seen:
+            stem, ext = os.path.splitext(name)
+            p = os.path.join(d, f"{stem} v{pos[g]}{ext}")
+        seen.add(p)
+        with open(p, "wb"):
+            pass
+        made += 1
+    ndirs = sum(len(v) for v in leaves.values())
+    return made, ndirs
+
+
+class _Host:
+    """App の Tk に触らないメソッドだけを借りる入れ物（_load_folder / _apply_key_column の中身と同じ仕事）。"""
+
+    _scan_rows = V.App._scan_rows
+    _open_row_writers = V.App._open_row_writers
+    _new_cache_path = V.App._new_cache_path
+    _rows_cache_dir = V.App._rows_cache_dir
+    _remove_cache_file = V.App._remove_cache_file
+    _genre_pipeline = V.App._genre_pipeline
+    _compute_keys = V.App._compute_keys
+    _compute_key_column_on_disk = V.App._compute_key_column_on_disk
+    _sync_key_index = V.App._sync_key_index
+    _write_samples_json = V.App._write_samples_json
+
+    def __init__(self, mode: str):
+        self.row_store_mode = mode
+        self.genre_map = V.normalize_genre_map(GENRE_MAP)
+        self.applied_current = APPLIED_STATE
+        self._scan = V.RowStore()
+        self.rows = self._scan
+        self._key_index = V.KeyIndex()
+        self._key_index_cols = (None, None)
+
+    def args(self, genre: str):
+        return {"genre_map": list(self.genre_map), "genre": genre, "applied": self.applied_current, "mode": self.row_store_mode}
+
+    def release(self, scan, keys):
+        for x in (keys, scan):
+            if isinstance(x, (V.rf_rows.MmapKeyColumn, V.rf_rows.MmapRowStore)):
+                x.close()
+                self._remove_cache_file(x.path)
+
+
+def _timed(fn):
+    t0 = time.perf_counter()
+    r = fn()
+    return time.perf_counter() - t0, r
+
+
+def run(folder: str, mode: str, repeat: int):
+    h = _Host(mode)
+    res = {}
+    times = []
+    scan = keys = None
+    for _ in range(max(1, repeat)):
+        if scan is not None:
+            h.release(scan, keys)
+        dt, (scan, keys) = _timed(lambda: h._scan_rows(folder, h.args("未分類")))
+        times.append(dt)
+    n = len(scan)
+    res["scan"] = {
+        "first_s": round(times[0], 4),
+        "best_s": round(min(times), 4),
+        "files_per_s": round(n / min(times)) if min(times) > 0 else None,
+        "store": type(scan).__name__,
+        "dirs": len(scan.dirs),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    h._scan = h.rows = scan
+    scan.keys = keys
+
+    dt, _ = _timed(lambda: h._write_samples_json(max_items=5000))
+    res["samples"] = {"s": round(dt, 4), "peak_rss_mb": peak_rss_mb()}
+
+    dt, _ = _timed(lambda: h._sync_key_index(keys))
+    res["index"] = {"s": round(dt, 4), "keys": len(h._key_index), "peak_rss_mb": peak_rss_mb()}
+
+    if isinstance(scan, V.rf_rows.MmapRowStore):
+        dt, col = _timed(lambda: h._compute_key_column_on_disk("ドラマ"))
+        h.release(None, col)
+    else:
+        out = []
+        dt, _ = _timed(lambda: h._compute_keys("ドラマ", {}, 0, n, out))
+    res["rekey"] = {"s": round(dt, 4), "files_per_s": round(n / dt) if dt > 0 else None, "peak_rss_mb": peak_rss_mb()}
+
+    total = times[0] + res["samples"]["s"] + res["index"]["s"]
+    res["load_folder"] = {"s": round(total, 4), "files_per_s": round(n / total) if total > 0 else None}
+    h.release(scan, keys)
+    return n, res
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--fanout", type=int, default=10, help="subfolders per folder")
+    ap.add_argument("--depth", type=int, default=2, help="folder levels under each genre folder")
+    ap.add_argument("--files", type=int, default=100, help="files per leaf folder")
+    ap.add_argument("--mode", choices=V.ROW_STORE_MODES, default="auto", help="row store (same as the row_store setting)")
+    ap.add_argument("--repeat", type=int, default=3, help="scan runs (first and best are reported)")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--dir", default="", help="where to build the tree (e.g. /dev/shm); default: a temp folder")
+    ap.add_argument("--keep", action="store_true", help="keep the generated tree")
+    ap.add_argument("--out", default="", help="write JSON result to this path")
+    a = ap.parse_args(argv)
+
+    base = tempfile.mkdtemp(prefix="rf_scan_", dir=a.dir or None)
+    tree = os.path.join(base, "tree")
+    work = os.path.join(base, "app")  # samples.json と mmap の置き場所（app_dir の代わり）
+    os.makedirs(work, exist_ok=True)
+    V.app_dir = lambda: work
+    try:
+        rss0 = peak_rss_mb()
+        dt, (files, dirs) = _timed(lambda: build_tree(tree, a.fanout, a.depth, a.files, a.seed))
+        sys.stderr.write(f"built {files} files in {dirs} folders ({dt:.1f}s)\n")
+        n, res = run(tree, a.mode, a.repeat)
+        result = {
+            "bench": "scan",
+            "fanout": a.fanout,
+            "depth": a.depth,
+            "files_per_dir": a.files,
+            "files": n,
+            "folders": dirs,
+            "mode": a.mode,
+            "repeat": a.repeat,
+            "build_tree_s": round(dt, 3),
+            "tree": tree if a.keep else None,
+            "rss_at_start_mb": rss0,
+            **res,
+            "python": platform.python_version(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+    finally:
+        if not a.keep:
+            shutil.rmtree(base, ignore_errors=True)
+    s = json.dumps(result, ensure_ascii=False, indent=2)
+    print(s)
+    if a.out:
+        with open(a.out, "w", encoding="utf-8") as f:
+            f.write(s + "\n")
+    return result
+
+
+if __name__ == "__main__":
+    main()
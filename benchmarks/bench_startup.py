@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+Startup: 工房を遅延読み込みした起動 vs 起動時に工房も読む（旧来の順序）
+
+各回を別プロセスで測る（モジュールのキャッシュを持ち越さない）。
+- import: ビューアのモジュールを読むまで（lazy = 工房なし / eager = 工房モジュールも読む）
+- app: 表示できる環境（DISPLAY など）があれば App() を作って最初の idle まで。
+  eager は作った直後に工房の枠も作る（旧来の __init__ と同じ仕事）。RF_STARTUP_REPORT の区切りも出す
+
+使い方:
+    python benchmarks/bench_startup.py --n 5
+結果は JSON で標準出力に出す（--out で保存も可）。
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_IMPORT = r"""
+import sys, time, json
+t0 = time.perf_counter()
+sys.path.insert(0, {root!r})
+import ReadableFilenames_viewer as V
+if {eager!r}:
+    V._ensure_workshop_module()
+print(json.dumps({{"ms": (time.perf_counter() - t0) * 1000.0}}))
+"""
+
+_APP = r"""
+import sys, time, json
+t0 = time.perf_counter()
+sys.path.insert(0, {root!r})
+import ReadableFilenames_viewer as V
+app = V.App()
+if {eager!r}:
+    app._ensure_workshop_panel()
+app.update()
+ms = (time.perf_counter() - t0) * 1000.0
+marks = list(app._startup_marks)
+app.destroy()
+print(json.dumps({{"ms": ms, "marks": marks}}))
+"""
+
+
+def _run(code: str):
+    env = dict(os.environ, RF_STARTUP_REPORT="")
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=env, cwd=ROOT)
+    if out.returncode != 0:
+        raise RuntimeError(out.stderr.strip().splitlines()[-1] if out.stderr.strip() else "failed")
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def _summary(xs):
+    xs = sorted(xs)
+    if not xs:
+        return {"n": 0}
+    return {
+        "n": len(xs),
+        "p50_ms": round(xs[len(xs) // 2], 1),
+        "min_ms": round(xs[0], 1),
+        "max_ms": round(xs[-1], 1),
+    }
+
+
+def _has_display() -> bool:
+    if sys.platform.startswith("win") or sys.platform == "darwin":
+        return True
+    return bool(os.environ.get("DISPLAY") or os.environ.get("WAYLAND_DISPLAY"))
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--n", type=int, default=5, help="runs per variant")
+    ap.add_argument("--out", default="", help="write JSON result to this path")
+    a = ap.parse_args(argv)
+
+    result = {"bench": "startup", "n": a.n}
+    for kind, tmpl in (("import", _IMPORT), ("app", _APP)):
+        if kind == "app" and not _has_display():
+            result[kind] = {"skipped": "no display"}
+            continue
+        row = {}
+        for eager in (False, True):
+            runs = [_run(tmpl.format(root=ROOT, eager=eager)) for _ in range(a.n)]
+            row["eager" if eager else "lazy"] = _summary([r["ms"] for r in runs])
+            if "marks" in runs[-1]:
+                row[("eager" if eager else "lazy") + "_marks"] = runs[-1]["marks"]
+        row["saved_ms"] = round(row["eager"]["p50_ms"] - row["lazy"]["p50_ms"], 1)
+        result[kind] = row
+    result["timestamp"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+    s = json.dumps(result, ensure_ascii=False, indent=2)
+    print(s)
+    if a.out:
+        with open(a.out, "w", encoding="utf-8") as f:
+            f.write(s + "\n")
+    return result
+
+
+if __name__ == "__main__":
+    main()